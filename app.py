@@ -1,461 +1,500 @@
+import contextlib
 import logging
 import queue
 import random
 import sqlite3
 import threading
 import time
+from typing import Iterable, Iterator
 
 import pytz
 import requests
 import yaml
 
-from webcrawler import dcard, facebook, plurk, ptt
-from webcrawler.webdriver import ChromeProcess
+from webcrawler import database, dcard, dedup, facebook, http2, pipeline, plurk, ptt
+from webcrawler.httpcache import HTTPCache
+from webcrawler.pool import BrowserPool
+from webcrawler.ratelimit import AdaptiveTokenBucket, HostLimiter, TokenBucket
+from webcrawler.webdriver import ChromeProcess, ResourceBlocker
 
 
-class dcard_crawler:
-    _logger = logging.getLogger('Dcard crawler')
+class crawler:
+    _logger = logging.getLogger('Crawler')
+    name = ''
+    discover_workers = 1
+    fetch_workers = 1
 
-    def __init__(self, browser: ChromeProcess = None, chromeprocess_kwargs: dict = None, do_forum_get: bool = True, do_post_get: bool = True, notifier: Notifier = None):
-        chromeprocess_kwargs = chromeprocess_kwargs or {}
-        self._stop_browser_atexit = False if browser else True
-        self.browser = browser or ChromeProcess(**chromeprocess_kwargs)
-        self.do_forum_get = do_forum_get
+    def __init__(self, do_post_get: bool = True, notifier: Notifier = None):
         self.do_post_get = do_post_get
         self.notifier = notifier
-        self.queue_posts = queue.Queue()
-        self.queue_comments = queue.Queue()
+        self.posts_db_path = ''
+        self.comments_db_path = ''
         self.used_posts = set()
+        self._used_posts_lock = threading.Lock()
+        self.pipeline: pipeline.Pipeline = None
 
     def exit(self):
-        if self._stop_browser_atexit:
-            self.browser.stop()
-        self.queue_posts.shutdown()
-        self.queue_comments.shutdown()
+        if isinstance(self.used_posts, dedup.SeenIndex):
+            self._logger.info(f'Seen posts: {self.used_posts.stats}')
+            self.used_posts.close()
+        if self.pipeline: self._logger.info(f'Pipeline: {self.pipeline.stats}')
 
-    def start_thread(self, forums: list[str | dcard.Forum], forum_get_kwargs: dict = None, post_get_kwargs: dict = None, posts_db_path: str = '', comments_db_path: str = '', get_repeated_posts: bool = True):
-        forum_get_kwargs = forum_get_kwargs or {}
+    def start_thread(self, targets: list, target_get_kwargs: dict = None, post_get_kwargs: dict = None, posts_db_path: str = '', comments_db_path: str = '', get_repeated_posts: bool = True):
+        target_get_kwargs = target_get_kwargs or {}
         post_get_kwargs = post_get_kwargs or {}
-        self._logger.info('Start dcard crawler')
-        self.stop_thread = False
-        if (not get_repeated_posts) and posts_db_path:
-            with sqlite3.connect(posts_db_path) as db:
-                tables = {row[0] for row in db.execute('SELECT name FROM sqlite_master WHERE type="table";').fetchall()}
-                for table in tables:
-                    self.used_posts.update({row[0] for row in db.execute(f'SELECT id from `{table}`;').fetchall()})
-        threading.Thread(target=self.run_crawler, args=[forums, forum_get_kwargs, post_get_kwargs]).start()
+        self._logger.info(f'Start {self.name} crawler')
+        self.posts_db_path = posts_db_path
+        self.comments_db_path = comments_db_path
         try:
-            while (not self.stop_thread) or len(self.queue_posts.queue) or len(self.queue_comments.queue):
-                time.sleep(0.01)
-                if len(self.queue_posts.queue):
-                    posts = self.queue_posts.get()
-                    if posts_db_path: self.write_posts_db(posts, posts_db_path)
-                    if self.notifier: self.notify(posts)
-                if len(self.queue_comments.queue):
-                    comments = self.queue_comments.get()
-                    if comments_db_path: self.write_comments_db(comments, comments_db_path)
+            if (not get_repeated_posts) and posts_db_path:
+                self.used_posts = dedup.SeenIndex(posts_db_path, **dedup.index_kwargs)
+                self._logger.info(f'Seen posts: {self.used_posts.stats}')
+            with self.open():
+                self.pipeline = pipeline.Pipeline(*self.stages(target_get_kwargs, post_get_kwargs))
+                self._logger.debug(f'Run {self.pipeline.__repr__()}')
+                self.pipeline.run(targets)
         finally:
+            database.flush_writers()
             self.exit()
-            self._logger.info('Finish dcard crawler')
+            self._logger.info(f'Finish {self.name} crawler')
 
-    def run_crawler(self, forums: list[str | dcard.Forum], forum_get_kwargs: dict = None, post_get_kwargs: dict = None):
-        forum_get_kwargs = forum_get_kwargs or {}
-        post_get_kwargs = post_get_kwargs or {}
-        try:
-            self.browser.clear_cache()
-            self.browser.get('https://www.dcard.tw/f', referrer='https://www.google.com/', blocking=True, timeout=10)
-            time.sleep(10)
-            for forum in forums:
-                if isinstance(forum, str): forum = dcard.Forum(alias=forum)
-                if self.do_forum_get:
-                    try:
-                        self._logger.info(f'Get {forum.__repr__()}')
-                        forum.get(self.browser, **forum_get_kwargs)
-                        time.sleep(8)
-                    except Exception as E:
-                        self._logger.warning(f'Get forum failed: {type(E)}:{E.args}: {forum.__repr__()}')
-                        continue
-                if self.do_post_get:
-                    for post in forum.posts[::-1]:
-                        if post.id in self.used_posts:
-                            continue
-                        else:
-                            self.used_posts.add(post.id)
-                        try:
-                            self._logger.info(f'Get {post.__repr__()}')
-                            post.get(self.browser, **post_get_kwargs)
-                            self.queue_posts.put([post])
-                            self.queue_comments.put(post.comments)
-                            time.sleep(8)
-                        except Exception as E:
-                            self._logger.warning(f'Get post failed: {type(E)}:{E.args}: {post.__repr__()}')
-                            continue
-                else:
-                    self.queue_posts.put(forum.posts[::-1])
-        finally:
-            self.stop_thread = True
+    @contextlib.contextmanager
+    def open(self):
+        yield
 
-    def notify(self, posts: list[dcard.Post]):
-        for post in posts:
-            self.notifier.send(tag=['default', 'dcard', f'dcard/{post.forum.alias}'], title=f'[Dcard] {post.forum.name or post.forum.alias}', body=f'{post.author.school} {post.author.department}\n---\n{post.title}\n{post.content}\n---\n{post.created_time.astimezone(self.notifier.tz).strftime("%Y/%m/%d %H:%M:%S %:z")}\n{post.url}')
+    def stages(self, target_get_kwargs: dict, post_get_kwargs: dict) -> list[pipeline.Stage]:
+        stages = [pipeline.Stage('discover', lambda target: self.discover(target, target_get_kwargs), self.discover_workers)]
+        if self.do_post_get: stages.append(pipeline.Stage('fetch', lambda post: self.fetch(post, post_get_kwargs), self.fetch_workers))
+        stages.append(self.persist_stage('persist'))
+        if self.notifier: stages.append(pipeline.Stage('notify', self.notify_post))
+        return stages
 
-    def write_posts_db(self, posts: list[dcard.Post], db_path: str):
-        with sqlite3.connect(db_path) as db:
+    def persist_stage(self, name: str, posts: bool = True) -> pipeline.Stage:
+        return pipeline.Stage(name, lambda post: self.persist(post, posts), idle_timeout=database.flush_timeout, on_idle=lambda: database.flush_writers(force=False))
+
+    def discover(self, target, target_get_kwargs: dict) -> Iterable:
+        raise NotImplementedError
+
+    def fetch(self, post, post_get_kwargs: dict) -> Iterable:
+        raise NotImplementedError
+
+    def new_posts(self, posts: list) -> list:
+        if not self.do_post_get: return posts
+        new_posts = []
+        with self._used_posts_lock:
             for post in posts:
-                try:
-                    db.execute(f'CREATE TABLE IF NOT EXISTS `{post.forum.alias}` ("id" INTEGER UNIQUE, "created_time" INTEGER, "author_school" TEXT, "author_department" TEXT, "title" TEXT, "content" TEXT);')
-                    cursor = db.execute(f'SELECT id FROM `{post.forum.alias}` WHERE id=?;', [post.id])
-                    if not cursor.fetchall():
-                        db.execute(f'INSERT INTO `{post.forum.alias}` VALUES (?,?,?,?,?,?);', [post.id, int(post.created_time.timestamp()), post.author.school, post.author.department, post.title, post.content])
-                        self._logger.debug(f'Write db: {post.__repr__()}')
-                except Exception as E:
-                    self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {post.__repr__()}')
+                if post.id in self.used_posts:
                     continue
+                else:
+                    self.used_posts.add(post.id)
+                    new_posts.append(post)
+        return new_posts
 
-    def write_comments_db(self, comments: list[dcard.Comment], db_path: str):
-        with sqlite3.connect(db_path) as db:
-            for comment in comments:
-                try:
-                    db.execute(f'CREATE TABLE IF NOT EXISTS `{comment.post.id}` ("floor" INTEGER UNIQUE, "created_time" INTEGER, "author_school" TEXT, "author_department" TEXT, "content" TEXT);')
-                    cursor = db.execute(f'SELECT floor FROM `{comment.post.id}` WHERE floor=?;', [comment.floor])
-                    if not cursor.fetchall():
-                        db.execute(f'INSERT INTO `{comment.post.id}` VALUES (?,?,?,?,?);', [comment.floor, int(comment.created_time.timestamp()), comment.author.school, comment.author.department, comment.content])
-                        self._logger.debug(f'Write db: {comment.__repr__()}')
-                except Exception as E:
-                    self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {comment.__repr__()}')
-                    continue
+    def is_new(self, post) -> bool:
+        return True
 
+    def persist(self, post, posts: bool = True) -> list:
+        if posts and self.posts_db_path and self.is_new(post): self.write_posts_db([post], self.posts_db_path)
+        if self.comments_db_path and post.comments: self.write_comments_db(post.comments, self.comments_db_path)
+        return [post]
 
-class facebook_crawler:
-    _logger = logging.getLogger('Facebook crawler')
+    def notify_post(self, post) -> list:
+        if self.is_new(post): self.notify([post])
+        return [post]
+
+    def notify(self, posts: list):
+        raise NotImplementedError
+
+    def write_posts_db(self, posts: list, db_path: str):
+        raise NotImplementedError
+
+    def write_comments_db(self, comments: list, db_path: str):
+        raise NotImplementedError
 
-    def __init__(self, browser: ChromeProcess = None, chromeprocess_kwargs: dict = None, do_page_get: bool = True, do_post_get: bool = True, notifier: Notifier = None):
+
+class browser_crawler(crawler):
+    home_url = ''
+    target_class: type = None
+    delay = 8
+    lease_timeout = 300
+
+    def __init__(self, browser: ChromeProcess = None, chromeprocess_kwargs: dict = None, do_target_get: bool = True, do_post_get: bool = True, notifier: Notifier = None, tabs: int = 1, post_rate_limit: float = None, pool: BrowserPool = None, profile: str = '', block: dict = None):
+        super().__init__(do_post_get, notifier)
         chromeprocess_kwargs = chromeprocess_kwargs or {}
-        self._stop_browser_atexit = False if browser else True
-        self.browser = browser or ChromeProcess(**chromeprocess_kwargs)
-        self.do_page_get = do_page_get
-        self.do_post_get = do_post_get
-        self.notifier = notifier
-        self.queue_posts = queue.Queue()
-        self.queue_comments = queue.Queue()
-        self.used_posts = set()
+        self._stop_browser_atexit = False if browser or pool else True
+        self.browser = browser or (None if pool else ChromeProcess(**chromeprocess_kwargs))
+        self.pool = pool
+        self.profile = profile or self.name
+        self.block = block
+        self.do_target_get = do_target_get
+        self.tabs = tabs
+        self.post_rate = TokenBucket(post_rate_limit / 60 if post_rate_limit else float('inf'))
+        self.idle_tabs = queue.Queue()
+        self.blockers: list[ResourceBlocker] = []
 
     def exit(self):
         if self._stop_browser_atexit:
             self.browser.stop()
-        self.queue_posts.shutdown()
-        self.queue_comments.shutdown()
-        self.used_posts = set()
+        super().exit()
+
+    @contextlib.contextmanager
+    def open(self):
+        with contextlib.ExitStack() as stack:
+            if not self.pool:
+                for tab in stack.enter_context(self.open_tabs()):
+                    self.idle_tabs.put(tab)
+            elif self.block:
+                stack.callback(self.log_blocked)
+            with self.lease_tab() as tab:
+                if tab is None: raise TimeoutError(f'No browser tab for {self.name}')
+                tab.clear_cache()
+                tab.get(self.home_url, referrer='https://www.google.com/', blocking=True, timeout=10)
+            time.sleep(10)
+            self.fetch_workers = self.tabs if self.do_post_get else 1
+            yield
+
+    @contextlib.contextmanager
+    def open_tabs(self):
+        count = self.tabs if self.do_post_get else 1
+        with contextlib.ExitStack() as stack:
+            tabs = [self.browser, *self.browser.open_tabs(count - 1)]
+            stack.callback(lambda: [self.browser.close_tab(tab) for tab in tabs[1:]])
+            stack.callback(lambda: self._logger.debug(f'Network stats: {[tab.cdp.network_stats(group_by="operation", resource_type="XHR") for tab in tabs]}'))
+            if self.block:
+                blockers = [tab.block_resources(**self.block) for tab in tabs]
+                stack.callback(lambda: self._logger.info(f'Blocked resources: {ResourceBlocker.sum_stats(blockers)}'))
+                stack.callback(lambda: [blocker.stop() for blocker in blockers])
+            yield tabs
+
+    def log_blocked(self):
+        blockers, self.blockers = self.blockers, []
+        self._logger.info(f'Blocked resources: {ResourceBlocker.sum_stats(blockers)}')
+
+    @contextlib.contextmanager
+    def lease_tab(self):
+        if not self.pool:
+            tab = self.idle_tabs.get()
+            try:
+                yield tab
+            finally:
+                self.idle_tabs.put(tab)
+            return
+        with contextlib.ExitStack() as stack:
+            try:
+                tab = stack.enter_context(self.pool.lease(self.profile, timeout=self.lease_timeout))
+            except TimeoutError:
+                self._logger.warning(f'No browser tab within {self.lease_timeout}s: {self.pool.__repr__()}')
+                yield None
+                return
+            if self.block:
+                blocker = tab.block_resources(**self.block)
+                self.blockers.append(blocker)
+                stack.callback(blocker.stop)
+            yield tab
+
+    def discover(self, target, target_get_kwargs: dict) -> Iterator:
+        if isinstance(target, str): target = self.target_class(alias=target)
+        if self.do_target_get:
+            with self.lease_tab() as tab:
+                if tab is None: return
+                self._logger.info(f'Get {target.__repr__()}')
+                target.get(tab, **target_get_kwargs)
+        yield from self.new_posts(target.posts[::-1])
+        if self.do_target_get: time.sleep(self.delay)
+
+    def fetch(self, post, post_get_kwargs: dict) -> Iterator:
+        with self.lease_tab() as tab:
+            if tab is None: return
+            self.post_rate.acquire()
+            self._logger.info(f'Get {post.__repr__()}')
+            post.get(tab, **post_get_kwargs)
+        yield post
+        time.sleep(self.delay)
+
+
+class dcard_crawler(browser_crawler):
+    _logger = logging.getLogger('Dcard crawler')
+    name = 'dcard'
+    home_url = 'https://www.dcard.tw/f'
+    target_class = dcard.Forum
+    delay = 8
 
-    def start_thread(self, pages: list[str | facebook.Page], page_get_kwargs: dict = None, post_get_kwargs: dict = None, posts_db_path: str = '', comments_db_path: str = '', get_repeated_posts: bool = True):
-        page_get_kwargs = page_get_kwargs or {}
-        post_get_kwargs = post_get_kwargs or {}
-        self._logger.info('Start facebook crawler')
-        self.stop_thread = False
-        if (not get_repeated_posts) and posts_db_path:
-            with sqlite3.connect(posts_db_path) as db:
-                tables = {row[0] for row in db.execute('SELECT name FROM sqlite_master WHERE type="table";').fetchall()}
-                for table in tables:
-                    self.used_posts.update({row[0] for row in db.execute(f'SELECT id from `{table}`;').fetchall()})
-        threading.Thread(target=self.run_crawler, args=[pages, page_get_kwargs, post_get_kwargs]).start()
-        try:
-            while (not self.stop_thread) or len(self.queue_posts.queue) or len(self.queue_comments.queue):
-                time.sleep(0.01)
-                if len(self.queue_posts.queue):
-                    posts = self.queue_posts.get()
-                    if posts_db_path: self.write_posts_db(posts, posts_db_path)
-                    if self.notifier: self.notify(posts)
-                if len(self.queue_comments.queue):
-                    comments = self.queue_comments.get()
-                    if comments_db_path: self.write_comments_db(comments, comments_db_path)
-        finally:
-            self.exit()
-            self._logger.info('Finish facebook crawler')
+    def __init__(self, browser: ChromeProcess = None, chromeprocess_kwargs: dict = None, do_forum_get: bool = True, do_post_get: bool = True, notifier: Notifier = None, tabs: int = 1, post_rate_limit: float = None, pool: BrowserPool = None, profile: str = 'dcard', block: dict = None):
+        super().__init__(browser, chromeprocess_kwargs, do_forum_get, do_post_get, notifier, tabs, post_rate_limit, pool, profile, block)
 
-    def run_crawler(self, pages: list[str | facebook.Page], page_get_kwargs: dict = None, post_get_kwargs: dict = None):
-        page_get_kwargs = page_get_kwargs or {}
-        post_get_kwargs = post_get_kwargs or {}
-        try:
-            self.browser.clear_cache()
-            self.browser.get('https://www.facebook.com/', referrer='https://www.google.com/', blocking=True, timeout=10)
-            time.sleep(10)
-            for page in pages:
-                if isinstance(page, str): page = facebook.Page(alias=page)
-                if self.do_page_get:
-                    try:
-                        self._logger.info(f'Get {page.__repr__()}')
-                        page.get(self.browser, **page_get_kwargs)
-                        time.sleep(5)
-                    except Exception as E:
-                        self._logger.warning(f'Get page failed: {type(E)}:{E.args}: {page.__repr__()}')
-                        continue
-                if self.do_post_get:
-                    for post in page.posts[::-1]:
-                        if post.id in self.used_posts:
-                            continue
-                        else:
-                            self.used_posts.add(post.id)
-                        try:
-                            self._logger.info(f'Get {post.__repr__()}')
-                            post.get(self.browser, **post_get_kwargs)
-                            self.queue_posts.put([post])
-                            self.queue_comments.put(post.comments)
-                            time.sleep(5)
-                        except Exception as E:
-                            self._logger.warning(f'Get post failed: {type(E)}:{E.args}: {post.__repr__()}')
-                            continue
-                else:
-                    self.queue_posts.put(page.posts[::-1])
-        finally:
-            self.stop_thread = True
+    def notify(self, posts: list[dcard.Post]):
+        for post in posts:
+            self.notifier.send(tag=['default', 'dcard', f'dcard/{post.forum.alias}'], title=f'[Dcard] {post.forum.name or post.forum.alias}', body=f'{post.author.school} {post.author.department}\n---\n{post.title}\n{post.content}\n---\n{post.created_time.astimezone(self.notifier.tz).strftime("%Y/%m/%d %H:%M:%S %:z")}\n{post.url}')
+
+    def write_posts_db(self, posts: list[dcard.Post], db_path: str):
+        db = database.get_writer(db_path)
+        for post in posts:
+            try:
+                db.create_table(f'{post.forum.alias}', '"id" INTEGER UNIQUE, "created_time" INTEGER, "author_school" TEXT, "author_department" TEXT, "title" TEXT, "content" TEXT')
+                db.insert(f'{post.forum.alias}', [post.id, int(post.created_time.timestamp()), post.author.school, post.author.department, post.title, post.content])
+                self._logger.debug(f'Write db: {post.__repr__()}')
+            except Exception as E:
+                self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {post.__repr__()}')
+                continue
+
+    def write_comments_db(self, comments: list[dcard.Comment], db_path: str):
+        db = database.get_writer(db_path)
+        for comment in comments:
+            try:
+                database.create_comments_table(db, 'dcard')
+                db.insert('comments', [comment.post.id, comment.floor, int(comment.created_time.timestamp()), comment.author.school, comment.author.department, comment.content])
+                self._logger.debug(f'Write db: {comment.__repr__()}')
+            except Exception as E:
+                self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {comment.__repr__()}')
+                continue
+
+
+class facebook_crawler(browser_crawler):
+    _logger = logging.getLogger('Facebook crawler')
+    name = 'facebook'
+    home_url = 'https://www.facebook.com/'
+    target_class = facebook.Page
+    delay = 5
+
+    def __init__(self, browser: ChromeProcess = None, chromeprocess_kwargs: dict = None, do_page_get: bool = True, do_post_get: bool = True, notifier: Notifier = None, tabs: int = 1, post_rate_limit: float = None, pool: BrowserPool = None, profile: str = 'facebook', block: dict = None):
+        super().__init__(browser, chromeprocess_kwargs, do_page_get, do_post_get, notifier, tabs, post_rate_limit, pool, profile, block)
 
     def notify(self, posts: list[facebook.Post]):
         for post in posts:
             self.notifier.send(tag=['default', 'facebook', f'facebook/{post.page.id}', f'facebook/{post.page.alias}'], title=f'[Facebook] {post.page.name or post.page.alias}', body=f'{post.title}\n{post.content}\n---\n{post.created_time.astimezone(self.notifier.tz).strftime("%Y/%m/%d %H:%M:%S %:z")}\n{post.url}')
 
     def write_posts_db(self, posts: list[facebook.Post], db_path: str):
-        with sqlite3.connect(db_path) as db:
-            for post in posts:
-                try:
-                    db.execute(f'CREATE TABLE IF NOT EXISTS `{post.page.id}` ("id" INTEGER UNIQUE, "pfbid" TEXT, "created_time" INTEGER, "title" TEXT, "content" TEXT);')
-                    cursor = db.execute(f'SELECT id FROM `{post.page.id}` WHERE id=?;', [post.id])
-                    if not cursor.fetchall():
-                        db.execute(f'INSERT INTO `{post.page.id}` VALUES (?,?,?,?,?);', [post.id, post.pfbid, int(post.created_time.timestamp()), post.title, post.content])
-                        self._logger.debug(f'Write db: {post.__repr__()}')
-                except Exception as E:
-                    self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {post.__repr__()}')
-                    continue
+        db = database.get_writer(db_path)
+        for post in posts:
+            try:
+                db.create_table(f'{post.page.id}', '"id" INTEGER UNIQUE, "pfbid" TEXT, "created_time" INTEGER, "title" TEXT, "content" TEXT')
+                db.insert(f'{post.page.id}', [post.id, post.pfbid, int(post.created_time.timestamp()), post.title, post.content])
+                self._logger.debug(f'Write db: {post.__repr__()}')
+            except Exception as E:
+                self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {post.__repr__()}')
+                continue
 
     def write_comments_db(self, comments: list[facebook.Comment], db_path: str):
-        with sqlite3.connect(db_path) as db:
-            for comment in comments:
-                try:
-                    db.execute(f'CREATE TABLE IF NOT EXISTS `{comment.post.id}` ("id" INTEGER UNIQUE, "created_time" INTEGER, "author_id" INTEGER, "author_alias" TEXT, "author_name" TEXT, "content" TEXT);')
-                    cursor = db.execute(f'SELECT id FROM `{comment.post.id}` WHERE id=?;', [comment.id])
-                    if not cursor.fetchall():
-                        db.execute(f'INSERT INTO `{comment.post.id}` VALUES (?,?,?,?,?,?);', [comment.id, int(comment.created_time.timestamp()), comment.author.id, comment.author.alias, comment.author.name, comment.content])
-                        self._logger.debug(f'Write db: {comment.__repr__()}')
-                except Exception as E:
-                    self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {comment.__repr__()}')
-                    continue
-
-
-class plurk_crawler:
+        db = database.get_writer(db_path)
+        for comment in comments:
+            try:
+                database.create_comments_table(db, 'facebook')
+                db.insert('comments', [comment.post.id, comment.id, int(comment.created_time.timestamp()), comment.author.id, comment.author.alias, comment.author.name, comment.content])
+                self._logger.debug(f'Write db: {comment.__repr__()}')
+            except Exception as E:
+                self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {comment.__repr__()}')
+                continue
+
+
+class plurk_crawler(crawler):
     _logger = logging.getLogger('Plurk crawler')
+    name = 'plurk'
 
-    def __init__(self, browser: requests.Session = None, do_search_get: bool = True, do_post_get: bool = False, notifier: Notifier = None):
+    def __init__(self, browser: requests.Session = None, do_search_get: bool = True, do_post_get: bool = False, notifier: Notifier = None, http_cache: HTTPCache = None, workers: int = 1, rate_limit: dict = None, post_workers: int = 4, use_http2: bool = False):
         self._stop_browser_atexit = False if browser else True
-        self.browser = browser or requests.Session()
+        self.browser = browser or (http2.new_session(max(workers, post_workers)) if use_http2 else requests.Session())
+        self.http_cache = http_cache
+        if http_cache: http_cache.wrap(self.browser)
         self.do_search_get = do_search_get
-        self.do_post_get = do_post_get
-        self.notifier = notifier
-        self.queue_posts = queue.Queue()
-        self.queue_comments = queue.Queue()
-        self.used_posts = set()
+        super().__init__(do_post_get, notifier)
+        self.workers = workers
+        self.post_workers = post_workers
+        rate_limit = {'search': 3.75, 'responses': 3.75, 'min_backoff': 16, 'max_backoff': 600} | (rate_limit or {})
+        self.search_bucket = AdaptiveTokenBucket(rate_limit['search'] / 60 if rate_limit['search'] else float('inf'), min_backoff=rate_limit['min_backoff'], max_backoff=rate_limit['max_backoff'])
+        self.responses_bucket = AdaptiveTokenBucket(rate_limit['responses'] / 60 if rate_limit['responses'] else float('inf'), min_backoff=rate_limit['min_backoff'], max_backoff=rate_limit['max_backoff'])
+        self.response_counts: dict[int, int] = {}
 
     def exit(self):
         if self._stop_browser_atexit:
             self.browser.close()
-        self.queue_posts.shutdown()
-        self.queue_comments.shutdown()
+        if self.http_cache: self._logger.info(f'HTTP cache: {self.http_cache.stats}')
+        self._logger.info(f'User cache: {plurk.user_cache.stats}')
+        super().exit()
+
+    @contextlib.contextmanager
+    def open(self):
+        http_versions = http2.warm_up(self.browser, 'https://www.plurk.com/')
+        if http_versions: self._logger.info(f'Warm up: {http_versions}')
+        if self.do_post_get and self.comments_db_path:
+            db = database.get_writer(self.comments_db_path)
+            db.create_table('responses', '"id" INTEGER UNIQUE, "response_count" INTEGER')
+            self.response_counts = dict(db.query('SELECT id, response_count FROM `responses`;'))
+        yield
+
+    def stages(self, search_get_kwargs: dict, post_get_kwargs: dict) -> list[pipeline.Stage]:
+        stages = [pipeline.Stage('discover', lambda search: self.discover(search, search_get_kwargs), self.workers), self.persist_stage('persist')]
+        if self.notifier: stages.append(pipeline.Stage('notify', self.notify_post))
+        if self.do_post_get:
+            stages.append(pipeline.Stage('fetch', lambda post: self.fetch(post, post_get_kwargs), self.post_workers, priority=lambda post: -post.response_count))
+            stages.append(self.persist_stage('persist comments', posts=False))
+        return stages
+
+    def discover(self, search: str | plurk.Search, search_get_kwargs: dict) -> Iterator[plurk.Post]:
+        if isinstance(search, str): search = plurk.Search(query=search)
+        if not self.do_search_get:
+            posts = search.posts[::-1]
+        else:
+            self._logger.info(f'Get {search.__repr__()}')
+            posts = search.stream(self.browser, stop_event=self.pipeline.stop_event, bucket=self.search_bucket, **search_get_kwargs)
+        for post in posts:
+            yield from self.new_posts([post])
 
-    def start_thread(self, searches: list[str | plurk.Search], search_get_kwargs: dict = None, post_get_kwargs: dict = None, posts_db_path: str = '', comments_db_path: str = '', get_repeated_posts: bool = True):
-        search_get_kwargs = search_get_kwargs or {}
-        post_get_kwargs = post_get_kwargs or {}
-        self.stop_thread = False
-        self._logger.info('Start plurk crawler')
-        if (not get_repeated_posts) and posts_db_path:
-            with sqlite3.connect(posts_db_path) as db:
-                tables = {row[0] for row in db.execute('SELECT name FROM sqlite_master WHERE type="table";').fetchall()}
-                for table in tables:
-                    self.used_posts.update({row[0] for row in db.execute(f'SELECT id from `{table}`;').fetchall()})
-        threading.Thread(target=self.run_crawler, args=[searches, search_get_kwargs, post_get_kwargs]).start()
-        try:
-            while (not self.stop_thread) or len(self.queue_posts.queue) or len(self.queue_comments.queue):
-                time.sleep(0.01)
-                if len(self.queue_posts.queue):
-                    posts = self.queue_posts.get()
-                    if posts_db_path: self.write_posts_db(posts, posts_db_path)
-                    if self.notifier: self.notify(posts)
-                if len(self.queue_comments.queue):
-                    comments = self.queue_comments.get()
-                    if comments_db_path: self.write_comments_db(comments, comments_db_path)
-        finally:
-            self.exit()
-            self._logger.info('Finish plurk crawler')
-
-    def run_crawler(self, searches: list[str | plurk.Search], search_get_kwargs: dict = None, post_get_kwargs: dict = None):
-        search_get_kwargs = search_get_kwargs or {}
-        post_get_kwargs = post_get_kwargs or {}
-        try:
-            for search in searches:
-                if isinstance(search, str): search = plurk.Search(query=search)
-                if self.do_search_get:
-                    try:
-                        self._logger.info(f'Get {search.__repr__()}')
-                        search.get(self.browser, **search_get_kwargs)
-                        time.sleep(16)
-                    except Exception as E:
-                        self._logger.warning(f'Get search failed: {type(E)}:{E.args}: {search.__repr__()}')
-                        continue
-                if self.do_post_get:
-                    for post in search.posts[::-1]:
-                        if post.id in self.used_posts:
-                            continue
-                        else:
-                            self.used_posts.add(post.id)
-                        try:
-                            self._logger.info(f'Get {post.__repr__()}')
-                            post.get(self.browser, **post_get_kwargs)
-                            self.queue_posts.put([post])
-                            self.queue_comments.put(post.comments)
-                            time.sleep(16)
-                        except Exception as E:
-                            self._logger.warning(f'Get post failed: {type(E)}:{E.args}: {post.__repr__()}')
-                            continue
-                else:
-                    self.queue_posts.put(search.posts[::-1])
-        finally:
-            self.stop_thread = True
+    def fetch(self, post: plurk.Post, post_get_kwargs: dict) -> list[plurk.Post]:
+        if not post.response_count or self.response_counts.get(post.id) == post.response_count:
+            self._logger.debug(f'Skip unchanged: {post.__repr__()}: {post.response_count} responses')
+            return []
+        post.get(self.browser, stop_event=self.pipeline.stop_event, bucket=self.responses_bucket, **post_get_kwargs)
+        self._logger.debug(f'Got {post.__repr__()}: {len(post.comments)} comments')
+        return [post]
 
     def notify(self, posts: list[plurk.Post]):
         for post in posts:
             self.notifier.send(tag=['default', 'plurk', f'plurk/{post.query}'], title=f'[Plurk] {post.query}', body=f'{post.author.display_name}\n---\n{post.content_raw}\n---\n{post.created_time.astimezone(self.notifier.tz).strftime("%Y/%m/%d %H:%M:%S %:z")}\n{post.url}')
 
     def write_posts_db(self, posts: list[plurk.Post], db_path: str):
-        with sqlite3.connect(db_path) as db:
-            for post in posts:
-                try:
-                    db.execute(f'CREATE TABLE IF NOT EXISTS `{post.query}` ("id" INTEGER UNIQUE, "time" INTEGER, "author_id" INTEGER, "author_nickname" TEXT, "author_displayname" TEXT, "content" TEXT);')
-                    cursor = db.execute(f'SELECT id FROM `{post.query}` WHERE id=?;', [post.id])
-                    if not cursor.fetchall():
-                        db.execute(f'INSERT INTO `{post.query}` VALUES (?,?,?,?,?,?);', [post.id, int(post.created_time.timestamp()), post.author.id, post.author.nickname, post.author.display_name, post.content_raw])
-                        self._logger.debug(f'Write db: {post.__repr__()}')
-                except Exception as E:
-                    self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {post.__repr__()}')
-                    continue
+        db = database.get_writer(db_path)
+        for post in posts:
+            try:
+                db.create_table(f'{post.query}', '"id" INTEGER UNIQUE, "time" INTEGER, "author_id" INTEGER, "author_nickname" TEXT, "author_displayname" TEXT, "content" TEXT')
+                db.insert(f'{post.query}', [post.id, int(post.created_time.timestamp()), post.author.id, post.author.nickname, post.author.display_name, post.content_raw])
+                self._logger.debug(f'Write db: {post.__repr__()}')
+            except Exception as E:
+                self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {post.__repr__()}')
+                continue
 
     def write_comments_db(self, comments: list[plurk.Comment], db_path: str):
-        with sqlite3.connect(db_path) as db:
-            for comment in comments:
-                try:
-                    db.execute(f'CREATE TABLE IF NOT EXISTS `{comment.post.id}` ("floor" INTEGER UNIQUE, "id" INTEGER, "time" INTEGER, "author_id" INTEGER, "author_nickname" TEXT, "author_displayname" TEXT, "content" TEXT);')
-                    cursor = db.execute(f'SELECT floor FROM `{comment.post.id}` WHERE floor=?;', [comment.floor])
-                    if not cursor.fetchall():
-                        db.execute(f'INSERT INTO `{comment.post.id}` VALUES (?,?,?,?,?,?,?);', [comment.floor, comment.id, int(comment.created_time.timestamp()), comment.author.id, comment.author.nickname, comment.author.display_name, comment.content_raw])
-                        self._logger.debug(f'Write db: {comment.__repr__()}')
-                except Exception as E:
-                    self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {comment.__repr__()}')
-                    continue
-
-
-class ptt_crawler:
+        db = database.get_writer(db_path)
+        for comment in comments:
+            try:
+                database.create_comments_table(db, 'plurk')
+                db.insert('comments', [comment.post.id, comment.floor, comment.id, int(comment.created_time.timestamp()), comment.author.id, comment.author.nickname, comment.author.display_name, comment.content_raw])
+                self._logger.debug(f'Write db: {comment.__repr__()}')
+            except Exception as E:
+                self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {comment.__repr__()}')
+                continue
+        for post in {comment.post.id: comment.post for comment in comments}.values():
+            try:
+                db.create_table('responses', '"id" INTEGER UNIQUE, "response_count" INTEGER')
+                db.insert('responses', [post.id, post.response_count], conflict='REPLACE')
+            except Exception as E:
+                self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {post.__repr__()}')
+                continue
+
+
+class ptt_crawler(crawler):
     _logger = logging.getLogger('PTT crawler')
+    name = 'ptt'
 
-    def __init__(self, browser: requests.Session = None, do_forum_get: bool = True, do_post_get: bool = True, notifier: Notifier = None):
+    def __init__(self, browser: requests.Session = None, do_forum_get: bool = True, do_post_get: bool = True, notifier: Notifier = None, workers: int = 1, post_rate_limit: float = 12, refresh_comments: bool = False, http_cache: HTTPCache = None, use_http2: bool = False):
         self._stop_browser_atexit = False if browser else True
-        self.browser = browser or requests.Session()
+        self.browser = browser or ptt.new_session(workers, http2=use_http2)
+        self.http_cache = http_cache
+        if http_cache: http_cache.wrap(self.browser)
         self.do_forum_get = do_forum_get
-        self.do_post_get = do_post_get
-        self.notifier = notifier
-        self.queue_posts = queue.Queue()
-        self.queue_comments = queue.Queue()
-        self.used_posts = set()
+        super().__init__(do_post_get, notifier)
+        self.refresh_comments = refresh_comments
+        self.refreshed: set[str] = set()
+        self.unseen: set[str] = set()
+        self.workers = workers
+        self.fetch_workers = workers
+        self.post_limiter = HostLimiter(workers, post_rate_limit / 60 if post_rate_limit else float('inf'))
 
     def exit(self):
         if self._stop_browser_atexit:
             self.browser.close()
-        self.queue_posts.shutdown()
-        self.queue_comments.shutdown()
+        if self.http_cache: self._logger.info(f'HTTP cache: {self.http_cache.stats}')
+        super().exit()
+
+    @contextlib.contextmanager
+    def open(self):
+        http_versions = http2.warm_up(self.browser, 'https://www.ptt.cc/')
+        if http_versions: self._logger.info(f'Warm up: {http_versions}')
+        yield
+
+    def discover(self, forum: str | ptt.Forum, forum_get_kwargs: dict) -> Iterator[ptt.Post]:
+        if isinstance(forum, str): forum = ptt.Forum(name=forum)
+        if self.do_forum_get:
+            self._logger.info(f'Get {forum.__repr__()}')
+            forum.get(self.browser, workers=self.workers, limiter=self.post_limiter, **forum_get_kwargs)
+        posts = self.new_posts(forum.posts[::-1])
+        if self.do_post_get:
+            refreshed = self.read_refresh_db(posts, self.comments_db_path) if self.refresh_comments and self.comments_db_path else set()
+            self.refreshed.update(refreshed)
+            self._logger.info(f'Get {len(posts) - len(refreshed)} posts, refresh {len(refreshed)} posts of {forum.__repr__()}')
+        yield from posts
+        if self.do_forum_get: time.sleep(5)
+
+    def fetch(self, post: ptt.Post, post_get_kwargs: dict) -> list[ptt.Post]:
+        with self.post_limiter.limit(post.url, stop_event=self.pipeline.stop_event):
+            post.get(self.browser, **post_get_kwargs)
+        self._logger.debug(f'Got {post.__repr__()}')
+        return [post]
+
+    def new_posts(self, posts: list[ptt.Post]) -> list[ptt.Post]:
+        if not (self.do_post_get and self.refresh_comments): return super().new_posts(posts)
+        with self._used_posts_lock:
+            for post in posts:
+                if post.id in self.used_posts: continue
+                self.used_posts.add(post.id)
+                self.unseen.add(post.id)
+        return posts
 
-    def start_thread(self, forums: list[str | ptt.Forum], forum_get_kwargs: dict = None, post_get_kwargs: dict = None, posts_db_path: str = '', comments_db_path: str = '', get_repeated_posts: bool = True):
-        forum_get_kwargs = forum_get_kwargs or {}
-        post_get_kwargs = post_get_kwargs or {}
-        self.stop_thread = False
-        self._logger.info('Start ptt crawler')
-        if (not get_repeated_posts) and posts_db_path:
-            with sqlite3.connect(posts_db_path) as db:
-                tables = {row[0] for row in db.execute('SELECT name FROM sqlite_master WHERE type="table";').fetchall()}
-                for table in tables:
-                    self.used_posts.update({row[0] for row in db.execute(f'SELECT id from `{table}`;').fetchall()})
-        threading.Thread(target=self.run_crawler, args=[forums, forum_get_kwargs, post_get_kwargs]).start()
-        try:
-            while (not self.stop_thread) or len(self.queue_posts.queue) or len(self.queue_comments.queue):
-                time.sleep(0.01)
-                if len(self.queue_posts.queue):
-                    posts = self.queue_posts.get()
-                    if posts_db_path: self.write_posts_db(posts, posts_db_path)
-                    if self.notifier: self.notify(posts)
-                if len(self.queue_comments.queue):
-                    comments = self.queue_comments.get()
-                    if comments_db_path: self.write_comments_db(comments, comments_db_path)
-        finally:
-            self.exit()
-            self._logger.info('Finish ptt crawler')
+    def is_new(self, post: ptt.Post) -> bool:
+        if not (self.do_post_get and self.refresh_comments): return True
+        return post.id in self.unseen and post.id not in self.refreshed
 
-    def run_crawler(self, forums: list[str | ptt.Forum], forum_get_kwargs: dict = None, post_get_kwargs: dict = None):
-        forum_get_kwargs = forum_get_kwargs or {}
-        post_get_kwargs = post_get_kwargs or {}
-        try:
-            for forum in forums:
-                if isinstance(forum, str): forum = ptt.Forum(name=forum)
-                if self.do_forum_get:
-                    try:
-                        self._logger.info(f'Get {forum.__repr__()}')
-                        forum.get(self.browser, **forum_get_kwargs)
-                        time.sleep(5)
-                    except Exception as E:
-                        self._logger.warning(f'Get forum failed: {type(E)}:{E.args}: {forum.__repr__()}')
-                        continue
-                if self.do_post_get:
-                    for post in forum.posts[::-1]:
-                        if post.id in self.used_posts:
-                            continue
-                        else:
-                            self.used_posts.add(post.id)
-                        try:
-                            self._logger.info(f'Get {post.__repr__()}')
-                            post.get(self.browser, **post_get_kwargs)
-                            self.queue_posts.put([post])
-                            self.queue_comments.put(post.comments)
-                            time.sleep(5)
-                        except Exception as E:
-                            self._logger.warning(f'Get post failed: {type(E)}:{E.args}: {post.__repr__()}')
-                            continue
-                else:
-                    self.queue_posts.put(forum.posts[::-1])
-        finally:
-            self.stop_thread = True
+    def persist(self, post: ptt.Post, posts: bool = True) -> list[ptt.Post]:
+        super().persist(post, posts)
+        if self.refresh_comments and self.comments_db_path: self.write_refresh_db(post, self.comments_db_path)
+        return [post]
 
     def notify(self, posts: list[ptt.Post]):
         for post in posts:
             self.notifier.send(tag=['default', 'ptt', f'ptt/{post.forum.name}'], title=f'[PTT] {post.forum.name}', body=f'{post.author.id} ({post.author.name})\n---\n{post.title}\n{post.content}\n---\n{post.time.astimezone(self.notifier.tz).strftime("%Y/%m/%d %H:%M:%S %:z")}\n{post.url}')
 
     def write_posts_db(self, posts: list[ptt.Post], db_path: str):
-        with sqlite3.connect(db_path) as db:
-            for post in posts:
-                try:
-                    db.execute(f'CREATE TABLE IF NOT EXISTS `{post.forum.name}` ("id" TEXT UNIQUE, "time" INTEGER, "author_id" TEXT, "author_name" TEXT, "title" TEXT, "content" TEXT);')
-                    cursor = db.execute(f'SELECT id FROM `{post.forum.name}` WHERE id=?;', [post.id])
-                    if not cursor.fetchall():
-                        db.execute(f'INSERT INTO `{post.forum.name}` VALUES (?,?,?,?,?,?);', [post.id, int(post.time.timestamp()), post.author.id, post.author.name, post.title, post.content])
-                        self._logger.debug(f'Write db: {post.__repr__()}')
-                except Exception as E:
-                    self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {post.__repr__()}')
-                    continue
+        db = database.get_writer(db_path)
+        for post in posts:
+            try:
+                db.create_table(f'{post.forum.name}', '"id" TEXT UNIQUE, "time" INTEGER, "author_id" TEXT, "author_name" TEXT, "title" TEXT, "content" TEXT')
+                db.insert(f'{post.forum.name}', [post.id, int(post.time.timestamp()), post.author.id, post.author.name, post.title, post.content])
+                self._logger.debug(f'Write db: {post.__repr__()}')
+            except Exception as E:
+                self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {post.__repr__()}')
+                continue
 
     def write_comments_db(self, comments: list[ptt.Comment], db_path: str):
+        db = database.get_writer(db_path)
+        for comment in comments:
+            try:
+                database.create_comments_table(db, 'ptt')
+                db.insert('comments', [comment.post.id, comment.floor, int(comment.time.timestamp()), comment.reaction, comment.author.id, comment.content])
+                self._logger.debug(f'Write db: {comment.__repr__()}')
+            except Exception as E:
+                self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {comment.__repr__()}')
+                continue
+
+    def write_refresh_db(self, post: ptt.Post, db_path: str):
+        if not (post.etag or post.content_length): return
+        db = database.get_writer(db_path)
+        try:
+            db.create_table('refresh', '"id" TEXT UNIQUE, "etag" TEXT, "content_length" INTEGER')
+            db.insert('refresh', [post.id, post.etag, post.content_length], conflict='REPLACE')
+        except Exception as E:
+            self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {post.__repr__()}')
+
+    def read_refresh_db(self, posts: list[ptt.Post], db_path: str) -> set[str]:
+        refreshed = set()
         with sqlite3.connect(db_path) as db:
-            for comment in comments:
-                try:
-                    db.execute(f'CREATE TABLE IF NOT EXISTS `{comment.post.id}` ("floor" INTEGER UNIQUE, "time" INTEGER, "reaction" TEXT, "author_id" TEXT, "content" TEXT);')
-                    cursor = db.execute(f'SELECT floor FROM `{comment.post.id}` WHERE floor=?;', [comment.floor])
-                    if not cursor.fetchall():
-                        db.execute(f'INSERT INTO `{comment.post.id}` VALUES (?,?,?,?,?);', [comment.floor, int(comment.time.timestamp()), comment.reaction, comment.author.id, comment.content])
-                        self._logger.debug(f'Write db: {comment.__repr__()}')
-                except Exception as E:
-                    self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {comment.__repr__()}')
-                    continue
+            tables = {row[0] for row in db.execute('SELECT name FROM sqlite_master WHERE type="table";').fetchall()}
+            for post in posts:
+                last_floor = db.execute('SELECT MAX(floor) FROM `comments` WHERE post_id=?;', [post.id]).fetchone()[0] if 'comments' in tables else None
+                row = db.execute('SELECT etag, content_length FROM `refresh` WHERE id=?;', [post.id]).fetchone() if 'refresh' in tables else None
+                if last_floor is None and row is None: continue
+                post.last_floor = last_floor or 0
+                if row: post.etag, post.content_length = row
+                refreshed.add(post.id)
+        return refreshed
 
 
 class Notifier:
@@ -494,6 +533,22 @@ if __name__ == '__main__':
     logger.debug(f'GIL enabled: {sys._is_gil_enabled()}')
     logger.info(f'Config file: {args.f}')
     notifier = Notifier(config['notify']['config'], tz=pytz.timezone(config['notify']['timezone'])) if config['notify']['enable'] else None
+    pool = None
+    if config['webdriver']['pool']['enable']:
+        pool_kwargs = config['webdriver']['pool'].copy()
+        pool_kwargs.pop('enable')
+        pool = BrowserPool(config['webdriver']['chromeprocess'], **pool_kwargs)
+        for site in ('dcard', 'facebook'):
+            profile_kwargs = config['webcrawler'][site]['webdriver']['chromeprocess'].copy()
+            profile_kwargs.pop('remote_debugging_port', None)
+            pool.add_profile(site, **profile_kwargs)
+        logger.info(f'Browser pool: {pool.__repr__()}')
+    database.configure(**config['database'])
+    dedup.configure(**config['dedup'])
+    http_cache = None
+    if config['http_cache']['enable']:
+        http_cache = HTTPCache(config['http_cache']['directory'], config['http_cache']['max_bytes'])
+        logger.info(f'HTTP cache: {http_cache.__repr__()}')
     jobs = []
     if config['webcrawler']['dcard']['enable']:
         try:
@@ -506,6 +561,10 @@ if __name__ == '__main__':
                 do_forum_get=config['webcrawler']['dcard']['do_forum_get'],
                 do_post_get=config['webcrawler']['dcard']['do_post_get'],
                 notifier=notifier if config['webcrawler']['dcard']['notify']['enable'] else None,
+                tabs=config['webcrawler']['dcard']['tabs'],
+                post_rate_limit=config['webcrawler']['dcard']['post_rate_limit'],
+                pool=pool,
+                block=config['webcrawler']['dcard']['block'],
             ).start_thread, args=[
                 forums,
                 config['webcrawler']['dcard']['forum_get'],
@@ -528,6 +587,10 @@ if __name__ == '__main__':
                 do_page_get=config['webcrawler']['facebook']['do_page_get'],
                 do_post_get=config['webcrawler']['facebook']['do_post_get'],
                 notifier=notifier if config['webcrawler']['facebook']['notify']['enable'] else None,
+                tabs=config['webcrawler']['facebook']['tabs'],
+                post_rate_limit=config['webcrawler']['facebook']['post_rate_limit'],
+                pool=pool,
+                block=config['webcrawler']['facebook']['block'],
             ).start_thread, args=[
                 pages,
                 config['webcrawler']['facebook']['page_get'],
@@ -543,10 +606,16 @@ if __name__ == '__main__':
         try:
             searches = config['webcrawler']['plurk']['searches']
             random.shuffle(searches)
+            plurk.user_cache = plurk.UserCache(**config['webcrawler']['plurk']['user_cache'])
             jobs.append(threading.Thread(target=plurk_crawler(
                 do_search_get=config['webcrawler']['plurk']['do_search_get'],
                 do_post_get=config['webcrawler']['plurk']['do_post_get'],
                 notifier=notifier if config['webcrawler']['plurk']['notify']['enable'] else None,
+                http_cache=http_cache,
+                workers=config['webcrawler']['plurk']['workers'],
+                rate_limit=config['webcrawler']['plurk']['rate_limit'],
+                post_workers=config['webcrawler']['plurk']['post_workers'],
+                use_http2=config['webcrawler']['plurk']['http2'],
             ).start_thread, args=[
                 searches,
                 config['webcrawler']['plurk']['search_get'],
@@ -566,6 +635,11 @@ if __name__ == '__main__':
                 do_forum_get=config['webcrawler']['ptt']['do_forum_get'],
                 do_post_get=config['webcrawler']['ptt']['do_post_get'],
                 notifier=notifier if config['webcrawler']['ptt']['notify']['enable'] else None,
+                workers=config['webcrawler']['ptt']['workers'],
+                post_rate_limit=config['webcrawler']['ptt']['post_rate_limit'],
+                refresh_comments=config['webcrawler']['ptt']['refresh_comments'],
+                http_cache=http_cache,
+                use_http2=config['webcrawler']['ptt']['http2'],
             ).start_thread, args=[
                 forums,
                 config['webcrawler']['ptt']['forum_get'],
@@ -581,4 +655,5 @@ if __name__ == '__main__':
         [job.start() for job in jobs]
         [job.join() for job in jobs]
     finally:
+        if pool: pool.stop()
         sys.exit()
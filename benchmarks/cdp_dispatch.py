@@ -0,0 +1,120 @@
+# Micro-benchmark of CDP listener dispatch: messages dispatched per second on the receive thread.
+# Usage: python benchmarks/cdp_dispatch.py [--messages 50000]
+import argparse
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from webcrawler.webdriver import CDP
+
+LISTENERS = [
+    dict(cdp_method='Network.responseReceived', url_contain='https://www.facebook.com/tapcpr'),
+    dict(cdp_method='Network.responseReceived', url_contain='https://www.facebook.com/api/graphql/'),
+    dict(cdp_method='Network.responseReceived', url_contain='https://www.dcard.tw/service/api/v2/forums'),
+    dict(cdp_method='Network.responseReceived', url_contain='https://www.dcard.tw/service/api/v2/globalPaging/page'),
+    dict(cdp_method='Network.responseReceived', resource_type='XHR', url_regex=r'graphql/.+/UserTweets'),
+    dict(cdp_method='Network.responseReceived', resource_type='XHR', url_regex=r'graphql/.+/TweetDetail'),
+    dict(cdp_method='Network.requestWillBeSent', url_exact='https://www.facebook.com/tapcpr'),
+]
+URLS = ['https://scontent.xx.fbcdn.net/v/t39.30808-6/{}.jpg', 'https://static.xx.fbcdn.net/rsrc.php/v4/{}.js', 'https://www.facebook.com/api/graphql/?q={}']
+METHODS = ['Network.requestWillBeSent', 'Network.responseReceived', 'Network.dataReceived', 'Network.dataReceived', 'Network.loadingFinished']
+
+
+def make_messages(n: int):
+    messages = []
+    for i in range(n):
+        method = random.choice(METHODS)
+        url = random.choice(URLS).format(i)
+        data = defaultdict(lambda: None)
+        params = {'requestId': str(i), 'type': 'XHR' if 'graphql' in url else 'Image'}
+        if method == 'Network.requestWillBeSent': params['request'] = {'url': url}
+        elif method == 'Network.responseReceived': params['response'] = {'url': url, 'status': 200}
+        data.update({'method': method, 'params': params})
+        messages.append(data)
+    return messages
+
+
+def legacy_listener(callback, jobs, cdp_method=None, request_id=None, resource_type=None, url_exact=None, url_contain=None, url_regex=None, status_code=None):
+
+    def listener(response: dict):
+        check = []
+        try:
+            if cdp_method: check.append(response['method'] == cdp_method)
+            if request_id: check.append(response['params']['requestId'] == request_id)
+            if resource_type: check.append(response['params']['type'] == resource_type)
+            if status_code: check.append(response['params']['response']['status'] == status_code)
+            url = response['params']['response']['url'] if 'response' in response['params'] else response['params']['request']['url'] if 'request' in response['params'] else ''
+            if url_exact: check.append(url == url_exact)
+            if url_contain: check.append(url_contain in url)
+            if url_regex: check.append(re.search(url_regex, url))
+        except:
+            return
+        if all(check):
+            job = threading.Thread(target=callback, args=(response, ))
+            jobs.append(job)
+            job.start()
+
+    return listener
+
+
+class IdleWebSocket:
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def recv(self):
+        self.closed.wait()
+        raise ConnectionError('closed')
+
+    def send(self, payload):
+        pass
+
+    def close(self):
+        self.closed.set()
+
+
+class BenchCDP(CDP):
+
+    def _connect(self, timeout: float = 10):
+        return IdleWebSocket()
+
+
+def bench_legacy(messages):
+    jobs = []
+    listeners = [legacy_listener(lambda r: None, jobs, **kwargs) for kwargs in LISTENERS]
+    start = time.perf_counter()
+    for data in messages:
+        for listener in listeners:
+            listener(data)
+    elapsed = time.perf_counter() - start
+    for job in jobs:
+        job.join()
+    return len(messages) / elapsed, len(jobs)
+
+
+def bench_dispatch(messages):
+    with BenchCDP() as cdp:
+        names = [cdp.add_listener(lambda r: None, **kwargs) for kwargs in LISTENERS]
+        start = time.perf_counter()
+        matched = sum(cdp._dispatch(data) for data in messages)
+        elapsed = time.perf_counter() - start
+        for name in names:
+            cdp.remove_listener(name)
+        return len(messages) / elapsed, matched
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=50000)
+    args = parser.parse_args()
+    random.seed(0)
+    messages = make_messages(args.messages)
+    rate, callbacks = bench_legacy(messages)
+    print(f'legacy closures + thread per callback: {rate:12,.0f} msg/s ({callbacks} callbacks)')
+    rate, callbacks = bench_dispatch(messages)
+    print(f'method dispatch table + worker pool:   {rate:12,.0f} msg/s ({callbacks} callbacks)')
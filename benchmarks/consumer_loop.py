@@ -0,0 +1,62 @@
+# Benchmark of the crawler consumer loop: the former 10 ms polling loop against a discover -> persist pipeline.Pipeline as run by the crawlers.
+# Reports items consumed per second, latency from production to handling, and CPU time used while the producer is idle.
+# Usage: python benchmarks/consumer_loop.py [--items 2000] [--idle 3]
+import argparse
+import queue
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from webcrawler.pipeline import Pipeline, Stage
+
+
+def polling(produce, handle):
+    state = {'stop': False}
+    queue_posts = queue.Queue()
+
+    def run():
+        try:
+            for item in produce():
+                queue_posts.put(item)
+        finally:
+            state['stop'] = True
+
+    threading.Thread(target=run).start()
+    while (not state['stop']) or len(queue_posts.queue):
+        time.sleep(0.01)
+        if len(queue_posts.queue): handle(queue_posts.get())
+
+
+def pipelined(produce, handle):
+    Pipeline(Stage('discover', lambda _: produce()), Stage('persist', handle)).run([None])
+
+
+def bench(loop, items: int, idle: float, interval: float) -> tuple[float, float, float]:
+    latencies = []
+
+    def produce():
+        time.sleep(idle)
+        for _ in range(items):
+            yield time.perf_counter()
+            if interval: time.sleep(interval)
+
+    cpu, start = time.process_time(), time.perf_counter()
+    loop(produce, lambda sent: latencies.append(time.perf_counter() - sent))
+    elapsed, cpu = time.perf_counter() - start - idle, time.process_time() - cpu
+    return items / elapsed, statistics.mean(latencies) * 1000, cpu
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--idle', type=float, default=3, help='seconds the producer waits before the first item')
+    parser.add_argument('--interval', type=float, default=0.001, help='seconds between items, as crawled posts arrive')
+    args = parser.parse_args()
+    for name, loop in (('polling', polling), ('pipeline', pipelined)):
+        rate, _, _ = bench(loop, args.items, 0, 0)
+        _, latency, _ = bench(loop, args.items // 10, 0, args.interval)
+        _, _, idle_cpu = bench(loop, 1, args.idle, 0)
+        print(f'{name:>10}: {rate:12,.0f} items/s   latency {latency:6.2f} ms   idle cpu {idle_cpu / args.idle * 100:5.2f}%')
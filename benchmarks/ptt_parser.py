@@ -0,0 +1,51 @@
+# Benchmark of the PTT parser backends: index pages and articles parsed per second, full Post objects included.
+# Save pages with: curl -b over18=1 -o article.html https://www.ptt.cc/bbs/<forum>/<id>.html
+# Usage: python benchmarks/ptt_parser.py [--article article.html ...] [--index index.html ...] [--pushes 3000] [--repeat 20]
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from tests.conftest import ptt_index_html, ptt_post_html
+from webcrawler import ptt
+
+
+def bench(fn, pages: list[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            fn(page)
+    return len(pages) * repeat / (time.perf_counter() - start)
+
+
+def parse_post(parser: str):
+
+    def fn(html: str):
+        post = ptt.Post(ptt.Forum('benchmark'), 'M.0.A.000')
+        post._parse(html, parser)
+        return post
+
+    return fn
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--article', nargs='*', default=[])
+    parser.add_argument('--index', nargs='*', default=[])
+    parser.add_argument('--pushes', type=int, default=3000, help='pushes of the synthetic article when no --article is given')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    articles = [Path(path).read_text(encoding='utf-8') for path in args.article] or [ptt_post_html(pushes=args.pushes)]
+    indexes = [Path(path).read_text(encoding='utf-8') for path in args.index] or [ptt_index_html(ids=[f'M.{1700000000 + i}.A.{i:03X}' for i in range(20)])]
+    print(f'{len(articles)} articles ({sum(map(len, articles)):,} chars), {len(indexes)} index pages, x{args.repeat}')
+    for name in ptt.parsers:
+        try:
+            backend = ptt.get_parser(name)
+        except ImportError as E:
+            print(f'{name:>10}: not installed ({E.name})')
+            continue
+        index_rate = bench(backend.parse_index, indexes, args.repeat)
+        article_rate = bench(backend.parse_article, articles, args.repeat)
+        post_rate = bench(parse_post(name), articles, args.repeat)
+        print(f'{name:>10}: index {index_rate:10,.1f}/s   article {article_rate:10,.1f}/s   Post._parse {post_rate:10,.1f}/s')
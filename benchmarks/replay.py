@@ -0,0 +1,50 @@
+# Replay a recorded CDP session into a crawler get() with no chrome and no network, and report listener and parsing throughput.
+# Record: set webdriver.chromeprocess.cdp_kwargs.record_path in config.yaml and run the crawler once.
+# Usage: python benchmarks/replay.py data/cdp-9222-page-1700000000.jsonl.gz dcard.forum trans [--speed 1]
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from webcrawler import dcard, facebook, twitter
+from webcrawler.replay import ReplayBrowser
+
+TARGETS = {
+    'dcard.forum': (lambda arg: dcard.Forum(alias=arg), lambda target: target.posts),
+    'dcard.post': (lambda arg: dcard.Post(dcard.Forum(alias=arg.split('/')[0]), int(arg.split('/')[1])), lambda target: target.comments),
+    'facebook.page': (lambda arg: facebook.Page(alias=arg), lambda target: target.posts),
+    'facebook.post': (lambda arg: facebook.Post(facebook.Page(alias=arg.split('/')[0]), *((int(arg.split('/')[1]), ) if arg.split('/')[1].isdigit() else (None, arg.split('/')[1]))), lambda target: target.comments),
+    'twitter.user': (lambda arg: twitter.User(alias=arg), lambda target: target.tweets),
+}
+
+
+def replay(path: str, kind: str, arg: str, speed: float = None, timeout: float = 600):
+    make_target, get_items = TARGETS[kind]
+    target = make_target(arg)
+    stop_event = threading.Event()
+    with ReplayBrowser(path, speed) as browser:
+
+        def wait_finished():
+            browser.cdp.wait_finished()
+            for listener in tuple(browser.cdp._listeners.values()):
+                listener.join()
+            stop_event.set()
+
+        threading.Thread(target=wait_finished, daemon=True).start()
+        start = time.perf_counter()
+        target.get(browser, min_count=10**9, timeout=timeout, stop_event=stop_event)
+        elapsed = time.perf_counter() - start
+        return len(browser.cdp.websocket.events), len(get_items(target)), elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path')
+    parser.add_argument('target', choices=TARGETS)
+    parser.add_argument('arg', help='forum/page alias or user alias; <alias>/<post id> for posts')
+    parser.add_argument('--speed', type=float, default=None, help='replay at recorded pace times speed; default as fast as possible')
+    args = parser.parse_args()
+    messages, items, elapsed = replay(args.path, args.target, args.arg, args.speed)
+    print(f'{messages} messages, {items} items parsed in {elapsed:.3f}s: {messages / elapsed:12,.0f} msg/s')
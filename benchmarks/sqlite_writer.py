@@ -0,0 +1,59 @@
+# Benchmark of comment writes: the per-row connect/CREATE/SELECT/INSERT path against the batched WAL SQLiteWriter, in rows per second.
+# The second pass re-writes the same backlog, as a crawler refreshing already stored posts does.
+# Usage: python benchmarks/sqlite_writer.py [--posts 200] [--comments 500] [--batch-size 1000]
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from webcrawler.database import SQLiteWriter
+
+COLUMNS = '"floor" INTEGER UNIQUE, "created_time" INTEGER, "author_id" TEXT, "author_ip" TEXT, "content" TEXT'
+
+
+def backlog(posts: int, comments: int) -> list[tuple[str, list]]:
+    return [(f'M.{1700000000 + i}.A.{i:03X}', [[floor, 1700000000 + floor, f'user{floor % 97}', '1.2.3.4', f'push content {floor}'] for floor in range(1, comments + 1)]) for i in range(posts)]
+
+
+def write_per_row(path: str, backlog: list[tuple[str, list]]):
+    for table, rows in backlog:
+        with sqlite3.connect(path) as db:
+            for row in rows:
+                db.execute(f'CREATE TABLE IF NOT EXISTS `{table}` ({COLUMNS});')
+                if not db.execute(f'SELECT floor FROM `{table}` WHERE floor=?;', [row[0]]).fetchall():
+                    db.execute(f'INSERT INTO `{table}` VALUES (?,?,?,?,?);', row)
+
+
+def write_batched(path: str, backlog: list[tuple[str, list]], batch_size: int):
+    db = SQLiteWriter(path, batch_size=batch_size)
+    for table, rows in backlog:
+        for row in rows:
+            db.create_table(table, COLUMNS)
+            db.insert(table, row)
+    db.close()
+
+
+def bench(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=200)
+    parser.add_argument('--comments', type=int, default=500, help='comments per post')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    rows = backlog(args.posts, args.comments)
+    total = args.posts * args.comments
+    print(f'{args.posts} posts x {args.comments} comments = {total:,} rows')
+    with tempfile.TemporaryDirectory() as directory:
+        for name, fn, fn_args in (('per-row', write_per_row, ()), ('batched', write_batched, (args.batch_size, ))):
+            path = str(Path(directory) / f'{name}.db')
+            first = bench(fn, path, rows, *fn_args)
+            second = bench(fn, path, rows, *fn_args)
+            print(f'{name:>10}: new {total / first:12,.0f} rows/s   existing {total / second:12,.0f} rows/s')
@@ -1,3 +1,183 @@
+import hashlib
+import json
+import queue
+import threading
+import time
+import urllib.parse
+
+import pytest
+import requests
+
+
 def pytest_addoption(parser):
     parser.addoption("--chrome", action="store", default="chrome")
-    parser.addoption("--chromedriver", action="store", default="chromedriver")
\ No newline at end of file
+    parser.addoption("--chromedriver", action="store", default="chromedriver")
+
+
+class FakeWebSocket:
+
+    def __init__(self, replies: dict = None):
+        self.replies = replies or {}
+        self.sent = []
+        self.inbox = queue.Queue()
+
+    def send(self, payload: str):
+        message = json.loads(payload)
+        self.sent.append(message)
+        if message['method'] in self.replies:
+            self.push({'id': message['id'], 'result': self.replies[message['method']]})
+
+    def push(self, message: dict):
+        self.inbox.put(json.dumps(message))
+
+    def recv(self):
+        message = self.inbox.get()
+        if message is None:
+            raise ConnectionError('closed')
+        return message
+
+    def close(self):
+        self.inbox.put(None)
+
+
+@pytest.fixture
+def fake_cdp():
+    from webcrawler.webdriver import CDP
+
+    class FakeCDP(CDP):
+
+        def _connect(self, timeout: float = 10):
+            return FakeWebSocket({'Runtime.evaluate': {'result': {'type': 'number', 'value': 3}}})
+
+    with FakeCDP() as cdp:
+        yield cdp
+
+
+def ptt_post_html(forum: str = 'transgender', id: str = 'M.1323013579.A.C29', pushes: int = 3) -> str:
+    push = '<div class="push"><span class="hl push-tag">{tag} </span><span class="f3 hl push-userid">user{i}</span><span class="f3 push-content">: comment {i}</span><span class="push-ipdatetime"> {month:02d}/{day:02d} 12:{minute:02d}\n</span></div>'
+    return ''.join([
+        '<html><body><div id="main-container"><div id="main-content" class="bbs-screen bbs-content">',
+        '<div class="article-metaline"><span class="article-meta-tag">作者</span><span class="article-meta-value">author1 (Author One)</span></div>',
+        f'<div class="article-metaline-right"><span class="article-meta-tag">看板</span><span class="article-meta-value">{forum}</span></div>',
+        '<div class="article-metaline"><span class="article-meta-tag">標題</span><span class="article-meta-value">[閒聊] title</span></div>',
+        '<div class="article-metaline"><span class="article-meta-tag">時間</span><span class="article-meta-value">Mon Dec  5 23:46:17 2011</span></div>',
+        '\nline 1\nline 2\n\n--\n<span class="f2">※ 發信站: 批踢踢實業坊(ptt.cc), 來自: 1.2.3.4 (臺灣)\n</span>',
+        f'<span class="f2">※ 文章網址: <a href="https://www.ptt.cc/bbs/{forum}/{id}.html">https://www.ptt.cc/bbs/{forum}/{id}.html</a>\n</span>',
+        *(push.format(tag='推→噓'[i % 3], i=i, month=(11 + i // 1000) % 12 + 1, day=i % 1000 // 40 + 1, minute=i % 60) for i in range(pushes)),
+        '</div></div></body></html>',
+    ])
+
+
+def ptt_index_html(forum: str = 'transgender', page: int = 2, ids: list[str] = None) -> str:
+    entry = '<div class="r-ent"><div class="nrec"><span class="hl f3">{i}</span></div><div class="title"><a href="/bbs/{forum}/{id}.html">[閒聊] title {i}</a></div><div class="meta"><div class="author">author{i}</div><div class="date">12/05</div></div></div>'
+    previous = f'<a class="btn wide" href="/bbs/{forum}/index{page - 1}.html">‹ 上頁</a>' if page > 1 else '<a class="btn wide disabled">‹ 上頁</a>'
+    return ''.join([
+        '<html><body><div id="action-bar-container"><div class="action-bar"><div class="btn-group btn-group-paging">',
+        f'<a class="btn wide" href="/bbs/{forum}/index1.html">最舊</a>{previous}<a class="btn wide" href="/bbs/{forum}/index.html">最新</a>',
+        '</div></div></div><div class="r-list-container action-bar-margin bbs-screen"><div class="search-bar"></div>',
+        *(entry.format(forum=forum, id=id, i=i) for i, id in enumerate(ids or [])),
+        '<div class="r-list-sep"></div></div></body></html>',
+    ])
+
+
+class FakeAdapter(requests.adapters.BaseAdapter):
+
+    def __init__(self, pages: dict[str, str], delay: float = 0, etag: bool = False):
+        super().__init__()
+        self.pages = pages
+        self.delay = delay
+        self.etag = etag
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.requests.append(request)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            response = requests.Response()
+            response.url = request.url
+            response.request = request
+            response.status_code = 200 if request.url in self.pages else 404
+            response.encoding = 'utf-8'
+            response._content = self.pages.get(request.url, '').encode('utf-8')
+            response._content_consumed = True
+            if self.etag and request.url in self.pages:
+                response.headers['ETag'] = f'"{hashlib.sha1(response._content).hexdigest()}"'
+                if request.headers.get('If-None-Match') == response.headers['ETag']:
+                    response.status_code = 304
+                    response._content = b''
+            return response
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def close(self):
+        pass
+
+
+def plurk_user(id: int) -> dict:
+    return {
+        'id': id, 'nick_name': f'user{id}', 'display_name': f'User {id}', 'avatar': 0, 'premium': False, 'date_of_birth': None, 'status': 'active', 'name_color': None, 'bday_privacy': 0, 'has_profile_image': 1,
+        'timeline_privacy': 0, 'gender': 0, 'karma': 0, 'verified_account': False, 'dateformat': 0, 'default_lang': 'tr_ch', 'friend_list_privacy': 'public', 'show_location': 0, 'full_name': '', 'relationship': '',
+        'location': '', 'timezone': None, 'email_confirmed': True, 'phone_verified': None, 'pinned_plurk_id': None, 'background_id': 0, 'recruited': 0, 'show_ads': False,
+    }
+
+
+def plurk_search_json(ids: list[int], response_count: int = 0) -> dict:
+    plurk = {
+        'qualifier': ':', 'content': 'content', 'content_raw': 'content', 'lang': 'tr_ch', 'response_count': response_count, 'responses_seen': 0, 'limited_to': None, 'excluded': None, 'no_comments': 0, 'plurk_type': 0,
+        'is_unread': 0, 'last_edited': None, 'coins': 0, 'has_gift': False, 'porn': False, 'publish_to_followers': False, 'with_poll': False, 'anonymous': False, 'replurkable': True, 'replurker_id': None,
+        'replurked': False, 'replurkers': [], 'replurkers_count': 0, 'favorers': [], 'favorite_count': 0, 'mentioned': 0, 'responded': 0, 'favorite': False,
+    }
+    return {
+        'users': {str(id % 7): plurk_user(id % 7) for id in ids},
+        'plurks': [plurk | {'id': id, 'user_id': id % 7, 'posted': time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(1700000000 + id))} for id in ids],
+    }
+
+
+def plurk_responses_json(ids: list[int]) -> dict:
+    response = {'qualifier': ':', 'content': 'content', 'content_raw': 'content', 'last_edited': None, 'lang': 'tr_ch', 'coins': 0, 'editability': 0}
+    return {
+        'users': {str(id % 7): plurk_user(id % 7) for id in ids},
+        'responses': [response | {'id': id, 'user_id': id % 7, 'posted': time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(1700000000 + id))} for id in ids],
+    }
+
+
+class FakePlurkAdapter(requests.adapters.BaseAdapter):
+
+    def __init__(self, searches: dict[str, list[int]] = None, responses: dict[int, list[int]] = None, page_size: int = 5, errors: int = 0):
+        super().__init__()
+        self.searches = searches or {}
+        self.responses = responses or {}
+        self.page_size = page_size
+        self.errors = errors
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        body = dict(urllib.parse.parse_qsl(request.body))
+        with self._lock:
+            self.requests.append(body)
+            error = len(self.requests) <= self.errors
+        if request.url.endswith('/Search/search2'):
+            ids = [id for id in self.searches.get(body['query'], []) if 'after_id' not in body or id < int(body['after_id'])]
+            data = plurk_search_json(ids[:self.page_size])
+        else:
+            ids = [id for id in self.responses.get(int(body['plurk_id']), []) if id > int(body.get('from_response_id', 0))]
+            data = plurk_responses_json(ids[:self.page_size])
+        response = requests.Response()
+        response.url = request.url
+        response.request = request
+        response.status_code = 200
+        response.headers['Content-Type'] = 'text/html' if error else 'application/json'
+        response._content = b'<html></html>' if error else json.dumps(data).encode('utf-8')
+        response._content_consumed = True
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+import pytest
+
+from webcrawler.async_webdriver import AsyncCDP
+
+pytest.importorskip('websockets')
+from websockets.asyncio.server import serve
+
+
+async def fake_chrome(websocket):
+    async for message in websocket:
+        message = json.loads(message)
+        if message['method'] == 'Runtime.evaluate':
+            await websocket.send(json.dumps({'id': message['id'], 'result': {'result': {'type': 'number', 'value': 3}}}))
+        elif message['method'] == 'Page.navigate':
+            await websocket.send(json.dumps({'id': message['id'], 'result': {'frameId': '1'}}))
+            await websocket.send(json.dumps({'method': 'Network.requestWillBeSent', 'params': {'requestId': '1000.1', 'request': {'url': message['params']['url']}}}))
+            await websocket.send(json.dumps({'method': 'Network.responseReceived', 'params': {'requestId': '1000.1', 'type': 'Document', 'response': {'url': message['params']['url'], 'status': 200}}}))
+            await websocket.send(json.dumps({'method': 'Network.loadingFinished', 'params': {'requestId': '1000.1'}}))
+        elif message['method'] == 'Network.getResponseBody':
+            await websocket.send(json.dumps({'id': message['id'], 'result': {'body': '<html></html>', 'base64Encoded': False}}))
+
+
+def test_async_cdp():
+
+    async def main():
+        async with serve(fake_chrome, '127.0.0.1', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            async with AsyncCDP(websocket_url=f'ws://127.0.0.1:{port}') as cdp:
+                assert (await cdp.send('Runtime.evaluate', expression='1+2'))['result']['result']['value'] == 3
+                async with cdp.subscribe('Network.responseReceived', url_contain='example.com') as responses:
+                    await cdp.get('https://example.com/', blocking=True, timeout=5)
+                    r = await asyncio.wait_for(anext(responses), 5)
+                    assert await cdp.get_response_body(r['params']['requestId'], timeout=5) == '<html></html>'
+
+    asyncio.run(main())
+
+
+def test_async_cdp_finished_before_wait():
+
+    async def main():
+        async with serve(fake_chrome, '127.0.0.1', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            async with AsyncCDP(websocket_url=f'ws://127.0.0.1:{port}') as cdp:
+                await cdp.get('https://example.com/', timeout=5)
+                await cdp.send('Runtime.evaluate', expression='1+2')
+                assert await cdp.wait_loading_finished('1000.1', timeout=0.1)
+                assert await cdp.get_response_body('1000.1', timeout=5) == '<html></html>'
+
+    asyncio.run(main())
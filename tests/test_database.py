@@ -0,0 +1,65 @@
+import sqlite3
+import time
+
+from webcrawler import database
+from webcrawler.database import SQLiteWriter
+
+
+def test_sqlite_writer(tmp_path):
+    path = str(tmp_path / 'comments.db')
+    with SQLiteWriter(path, batch_size=3, flush_interval=60) as db:
+        assert db.db.execute('PRAGMA journal_mode;').fetchone()[0] == 'wal'
+        db.create_table('post', '"floor" INTEGER UNIQUE, "content" TEXT')
+        db.insert('post', [1, 'a'])
+        db.insert('post', [2, 'b'])
+        with sqlite3.connect(path) as reader:
+            assert reader.execute('SELECT COUNT(*) FROM post;').fetchone()[0] == 0
+        db.insert('post', [1, 'c'])
+        assert db.stats == {'rows_written': 2, 'rows_ignored': 1, 'batches': 1, 'pending': 0}
+        db.insert('post', [3, 'd'])
+        db.insert('responses', [1, 2], conflict='REPLACE')
+        assert db.stats['pending'] == 2
+    with sqlite3.connect(path) as reader:
+        assert reader.execute('SELECT floor, content FROM post ORDER BY floor;').fetchall() == [(1, 'a'), (2, 'b'), (3, 'd')]
+
+
+def test_sqlite_writer_query(tmp_path):
+    with SQLiteWriter(str(tmp_path / 'comments.db'), batch_size=100, flush_interval=60) as db:
+        db.create_table('responses', '"id" INTEGER UNIQUE, "response_count" INTEGER')
+        db.insert('responses', [1, 2])
+        db.insert('responses', [2, 5])
+        assert dict(db.query('SELECT id, response_count FROM `responses` WHERE response_count > ?;', [1])) == {1: 2, 2: 5}
+        assert db.stats['pending'] == 0
+
+
+def test_sqlite_writer_interval(tmp_path):
+    path = str(tmp_path / 'comments.db')
+    with SQLiteWriter(path, batch_size=1000, flush_interval=0.05) as db:
+        db.create_table('responses', '"id" INTEGER UNIQUE, "response_count" INTEGER')
+        assert db.flush_timeout() is None
+        db.insert('responses', [1, 2], conflict='REPLACE')
+        db.maybe_flush()
+        assert db.stats['pending'] == 1
+        assert 0 < db.flush_timeout() <= 0.05
+        time.sleep(0.06)
+        db.maybe_flush()
+        assert db.stats['pending'] == 0
+        db.insert('responses', [1, 5], conflict='REPLACE')
+        db.flush()
+        assert db.db.execute('SELECT * FROM responses;').fetchall() == [(1, 5)]
+
+
+def test_migrate_comments(tmp_path):
+    path = str(tmp_path / 'ptt-comments.db')
+    with sqlite3.connect(path) as db:
+        for i in range(5):
+            db.execute(f'CREATE TABLE `M.{1700000000 + i}.A.{i:03X}` ("floor" INTEGER UNIQUE, "time" INTEGER, "reaction" TEXT, "author_id" TEXT, "content" TEXT);')
+            db.executemany(f'INSERT INTO `M.{1700000000 + i}.A.{i:03X}` VALUES (?,?,?,?,?);', [(floor, 1700000000 + floor, '推', f'user{floor}', f'push {floor}') for floor in range(1, i + 2)])
+        db.execute('CREATE TABLE `refresh` ("id" TEXT UNIQUE, "etag" TEXT, "content_length" INTEGER);')
+    assert database.migrate_comments(path, 'ptt', batch_tables=2) == {'tables': 5, 'rows': 15, 'skipped': 0}
+    with sqlite3.connect(path) as db:
+        assert {row[0] for row in db.execute('SELECT name FROM sqlite_master WHERE type="table";')} == {'comments', 'refresh'}
+        assert {row[0] for row in db.execute('SELECT name FROM sqlite_master WHERE type="index" AND sql IS NOT NULL;')} == {'comments_time', 'comments_author_id'}
+        assert db.execute('SELECT * FROM comments WHERE post_id=? ORDER BY floor;', ['M.1700000001.A.001']).fetchall() == [('M.1700000001.A.001', 1, 1700000001, '推', 'user1', 'push 1'), ('M.1700000001.A.001', 2, 1700000002, '推', 'user2', 'push 2')]
+        assert db.execute('SELECT COUNT(*) FROM comments WHERE author_id="user1";').fetchone()[0] == 5
+    assert database.migrate_comments(path, 'ptt') == {'tables': 0, 'rows': 0, 'skipped': 0}
@@ -0,0 +1,48 @@
+import sqlite3
+
+from webcrawler.dedup import BloomFilter, SeenIndex
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(i)
+    assert all(i in bloom for i in range(1000))
+    count = bloom.count
+    for i in range(1000):
+        bloom.add(i)
+    assert bloom.count == count >= 990
+    assert sum(i in bloom for i in range(1000, 11000)) < 300
+
+
+def test_seen_index(tmp_path):
+    path = str(tmp_path / 'ptt-posts.db')
+    with sqlite3.connect(path) as db:
+        db.execute('CREATE TABLE `Gossiping` ("id" TEXT UNIQUE, "time" INTEGER);')
+        db.executemany('INSERT INTO `Gossiping` VALUES (?,?);', [(f'M.{i}.A.000', i) for i in range(100)])
+    seen = SeenIndex(path, capacity=1000, cache_size=10)
+    assert 'M.1.A.000' in seen and 'M.100.A.000' not in seen
+    seen.add('M.100.A.000')
+    seen.add('M.1.A.000')
+    assert 'M.100.A.000' in seen
+    assert seen.stats['lookups'] == 1 and seen.stats['hits'] == 1
+    with sqlite3.connect(path) as db:
+        db.execute('CREATE TABLE `Stock` ("id" TEXT UNIQUE, "time" INTEGER);')
+        db.execute('INSERT INTO `Stock` VALUES (?,?);', ['M.200.A.000', 200])
+    seen.close()
+    with open(f'{path}.bloom', 'rb') as f:
+        assert b'"Stock": 1' in f.readline()
+
+    seen = SeenIndex(path, capacity=1000, cache_size=10)
+    assert 'M.200.A.000' in seen and 'M.50.A.000' in seen
+    assert 'M.100.A.000' not in seen
+    assert seen.stats['ids'] == 102
+    with sqlite3.connect(path) as db:
+        db.executemany('INSERT INTO `Stock` VALUES (?,?);', [(f'S.{i}', i) for i in range(2000)])
+    seen.close()
+    seen = SeenIndex(path, capacity=1000, cache_size=10)
+    assert seen.filter.capacity >= 4000 and 'S.1999' in seen
+    seen.close()
+    seen = SeenIndex(path, capacity=1000, cache_size=10)
+    assert seen.filter.capacity >= 4000 and seen.rowids == {'Gossiping': 100, 'Stock': 2001}
+    seen.close()
@@ -0,0 +1,50 @@
+import pytest
+import requests
+
+from webcrawler import http2, ptt
+from webcrawler.httpcache import HTTPCache
+
+from .conftest import ptt_post_html
+
+httpx = pytest.importorskip('httpx')
+
+
+def test_http2_session(tmp_path):
+    id = 'M.1700000000.A.000'
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        if request.method == 'HEAD':
+            return httpx.Response(200)
+        if request.url.path.endswith('/missing.html'):
+            return httpx.Response(404)
+        if request.url.path == '/redirect':
+            return httpx.Response(302, headers={'Location': f'https://www.ptt.cc/bbs/transgender/{id}.html'})
+        if request.headers.get('If-None-Match') == '"v1"':
+            return httpx.Response(304, headers={'ETag': '"v1"'})
+        return httpx.Response(200, headers={'Content-Type': 'text/html; charset=utf-8', 'ETag': '"v1"'}, content=ptt_post_html(id=id, pushes=3).encode('utf-8'))
+
+    with http2.new_session(transport=httpx.MockTransport(handler)) as session:
+        session.headers.update({"Cookie": "over18=1"})
+        HTTPCache(str(tmp_path)).wrap(session)
+        assert http2.warm_up(session, 'https://www.ptt.cc/bbs/index.html') == {'www.ptt.cc': 'HTTP/1.1'}
+        post = ptt.Post(ptt.Forum('transgender'), id)
+        assert post.get(session)
+        assert len(post.comments) == 3 and post.etag == '"v1"'
+        assert seen[-1].headers['Cookie'] == 'over18=1'
+        assert session.get('https://www.ptt.cc/redirect').url == post.url
+        assert session.get(post.url).from_cache
+        with pytest.raises(requests.HTTPError):
+            session.get('https://www.ptt.cc/bbs/transgender/missing.html').raise_for_status()
+
+
+def test_http2_settings(caplog):
+    with http2.new_session(transport=httpx.MockTransport(lambda request: httpx.Response(200))) as session:
+        session.trust_env = False
+        session.get('https://www.ptt.cc/')
+        assert 'Ignore' not in caplog.text
+        session.get('https://www.ptt.cc/', verify=False)
+        session.get('https://www.ptt.cc/', verify=False, proxies={'https': 'http://127.0.0.1:8080'})
+    assert caplog.text.count('Ignore verify=False') == 1
+    assert caplog.text.count("Ignore proxy='http://127.0.0.1:8080'") == 1
@@ -0,0 +1,70 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from webcrawler import ptt
+from webcrawler.httpcache import HTTPCache
+
+from .conftest import FakeAdapter, ptt_index_html, ptt_post_html
+
+
+def test_http_cache(tmp_path):
+    id = 'M.1700000000.A.000'
+    url = f'https://www.ptt.cc/bbs/transgender/{id}.html'
+    adapter = FakeAdapter({url: ptt_post_html(id=id, pushes=5)}, etag=True)
+    cache = HTTPCache(str(tmp_path))
+    with ptt.new_session() as session:
+        session.mount('https://www.ptt.cc/', adapter)
+        cache.wrap(session)
+        first = session.get(url)
+        second = session.get(url)
+        assert not getattr(first, 'from_cache', False) and second.from_cache
+        assert second.status_code == 200 and second.text == first.text
+        assert adapter.requests[-1].headers['If-None-Match'] == first.headers['ETag']
+        assert not ptt.Post(ptt.Forum('transgender'), id).get(session)
+        post = ptt.Post(ptt.Forum('transgender'), id)
+        post.last_floor = 5
+        assert not post.get(session)
+        adapter.pages[url] = ptt_post_html(id=id, pushes=6)
+        assert post.get(session)
+        assert [comment.floor for comment in post.comments] == [6]
+    assert cache.stats['hits'] == 3 and cache.stats['misses'] == 2
+    assert HTTPCache(str(tmp_path)).get(url)[1] == adapter.pages[url].encode('utf-8')
+
+
+def test_http_cache_lru(tmp_path):
+    cache = HTTPCache(str(tmp_path), max_bytes=250)
+    for i in range(3):
+        cache.put(f'https://example.com/{i}', {'ETag': str(i)}, b'x' * 100)
+        if i == 1: cache.get('https://example.com/0')
+    assert cache.get('https://example.com/1') is None
+    assert cache.get('https://example.com/0') and cache.get('https://example.com/2')
+    assert cache.stats['evictions'] == 1 and cache.stats['bytes'] == 200
+    assert HTTPCache(str(tmp_path), max_bytes=150).stats['entries'] == 1
+
+
+def test_http_cache_index(tmp_path, monkeypatch):
+    url = 'https://www.ptt.cc/bbs/transgender/index.html'
+    adapter = FakeAdapter({url: ptt_index_html(page=100, ids=[f'M.{1700000000 + i}.A.000' for i in range(3)])}, etag=True)
+    parser, calls = ptt.get_parser('bs4'), []
+    parse_index = parser.parse_index
+
+    def counting_parse_index(html):
+        calls.append(html)
+        return parse_index(html)
+
+    monkeypatch.setattr(parser, 'parse_index', counting_parse_index)
+    with ptt.new_session() as session:
+        session.mount('https://www.ptt.cc/', adapter)
+        HTTPCache(str(tmp_path)).wrap(session)
+        first, _ = ptt.Forum('transgender')._get_page(session, url)
+        second, _ = ptt.Forum('transgender')._get_page(session, url)
+    assert [post.id for post in first] == [post.id for post in second] and len(first) == 3
+    assert len(calls) == 1
+
+
+def test_http_cache_concurrent_put(tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: cache.put('https://example.com/', {'ETag': str(i)}, bytes([i]) * 1000), range(64)))
+    meta, body = cache.get('https://example.com/')
+    assert len(body) == 1000 and not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from webcrawler.pipeline import Pipeline, Stage
+
+
+def test_pipeline():
+    written, lock = [], threading.Lock()
+
+    def discover(target: int):
+        yield from range(target * 10, target * 10 + 5)
+
+    def fetch(item: int):
+        if item == 13: raise ValueError(item)
+        time.sleep(0.01)
+        return [item * 2]
+
+    def persist(item: int):
+        with lock:
+            written.append(item)
+
+    pipeline = Pipeline(Stage('discover', discover), Stage('fetch', fetch, workers=4, maxsize=2), Stage('persist', persist))
+    start = time.perf_counter()
+    pipeline.run(range(4))
+    assert time.perf_counter() - start < 20 * 0.01
+    assert sorted(written) == [item * 2 for target in range(4) for item in range(target * 10, target * 10 + 5) if item != 13]
+    stats = pipeline.stats
+    assert stats['discover'] | {'busy': 0, 'blocked': 0} == {'workers': 1, 'processed': 4, 'emitted': 20, 'errors': 0, 'queued': 0, 'busy': 0, 'blocked': 0}
+    assert stats['fetch']['processed'] == 20 and stats['fetch']['errors'] == 1 and stats['fetch']['emitted'] == 19
+    assert stats['discover']['blocked'] > 0
+    assert stats['persist']['processed'] == 19
+
+
+def test_pipeline_priority_idle():
+    order, idle = [], []
+    gate = threading.Event()
+
+    def fetch(item: int):
+        gate.wait()
+        order.append(item)
+        return [item]
+
+    pipeline = Pipeline(Stage('discover', lambda items: items), Stage('fetch', fetch, priority=lambda item: -item), Stage('persist', lambda item: None, idle_timeout=lambda: 0.01, on_idle=lambda: idle.append(1)))
+    thread = threading.Thread(target=pipeline.run, args=[[[1, 5, 3, 4, 2]]])
+    thread.start()
+    time.sleep(0.05)
+    gate.set()
+    thread.join()
+    assert sorted(order) == [1, 2, 3, 4, 5] and order[1:] == sorted(order[1:], reverse=True)
+    assert idle
+
+
+def test_pipeline_stop():
+    pipeline = Pipeline(Stage('discover', lambda target: range(1000)), Stage('fetch', lambda item: pipeline.stop_event.set() if item == 10 else [item]))
+    pipeline.run([0, 1])
+    assert pipeline.stats['fetch']['processed'] == 11
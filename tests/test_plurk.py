@@ -1,6 +1,13 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
 from webcrawler import plurk
+from webcrawler.ratelimit import AdaptiveTokenBucket, TokenBucket
+
+from .conftest import FakePlurkAdapter, plurk_user
 
 
 def test_plurk_search():
@@ -22,3 +29,82 @@ def test_plurk_post():
     assert comment.author is not None
     assert comment.created_time is not None
     assert comment.content_raw is not None
+
+
+def test_plurk_search_stream():
+    adapter = FakePlurkAdapter(searches={'跨性': list(range(1000, 988, -1))}, page_size=5)
+    search = plurk.Search('跨性')
+    with requests.Session() as session:
+        session.mount('https://www.plurk.com/', adapter)
+        stream = search.stream(session, page_delay=0)
+        assert [next(stream).id for _ in range(5)] == list(range(1000, 995, -1))
+        assert len(adapter.requests) == 1
+        assert [post.id for post in stream] == list(range(995, 988, -1))
+        assert [request.get('after_id') for request in adapter.requests] == [None, '996', '991', '989']
+        search = plurk.Search('跨性')
+        search.get(session, min_count=7, page_delay=0)
+    assert [post.id for post in search.posts] == list(range(1000, 993, -1))
+    assert search.posts[0].author.nickname == 'user6'
+
+
+def test_plurk_post_stream():
+    adapter = FakePlurkAdapter(responses={1: list(range(1, 13))}, page_size=5)
+    post = plurk.Post(1)
+
+    async def collect():
+        with requests.Session() as session:
+            session.mount('https://www.plurk.com/', adapter)
+            return [comment async for comment in post.astream(session, page_delay=0)]
+
+    comments = asyncio.run(collect())
+    assert [comment.id for comment in comments] == list(range(1, 13))
+    assert [comment.floor for comment in comments] == list(range(1, 13))
+
+
+def test_plurk_search_bucket():
+    adapter = FakePlurkAdapter(searches={query: list(range(100 * i + 20, 100 * i, -1)) for i, query in enumerate(('a', 'b', 'c'))}, page_size=10, errors=2)
+    bucket = AdaptiveTokenBucket(rate=200, min_backoff=0.05, max_backoff=1)
+    with requests.Session() as session:
+        session.mount('https://www.plurk.com/', adapter)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(lambda query: [post.id for post in plurk.Search(query).stream(session, bucket=bucket)], ('a', 'b', 'c')))
+    assert results == [list(range(100 * i + 20, 100 * i, -1)) for i in range(3)]
+    assert len(adapter.requests) == 2 + 3 * 3
+    assert bucket.failures == 0
+
+
+def test_plurk_search_deadline(caplog):
+    adapter = FakePlurkAdapter(searches={'a': list(range(30, 0, -1))}, page_size=10)
+    with requests.Session() as session:
+        session.mount('https://www.plurk.com/', adapter)
+        posts = list(plurk.Search('a').stream(session, timeout=0.05, bucket=TokenBucket(rate=10)))
+        assert len(posts) == 30 and len(adapter.requests) == 4
+        caplog.set_level('INFO')
+        posts = list(plurk.Search('a').stream(session, timeout=0, bucket=TokenBucket(rate=10)))
+    assert not posts and 'Stop search after 0s of crawling' in caplog.text
+
+
+def test_plurk_user_cache(monkeypatch):
+    monkeypatch.setattr(plurk, 'user_cache', plurk.UserCache(max_size=10, ttl=60))
+    adapter = FakePlurkAdapter(searches={'a': list(range(30, 0, -1))}, page_size=10)
+    with requests.Session() as session:
+        session.mount('https://www.plurk.com/', adapter)
+        posts = list(plurk.Search('a').stream(session, page_delay=0))
+    assert len(posts) == 30
+    assert posts[0].author is posts[7].author is posts[14].author
+    assert not hasattr(posts[0].author, '__dict__')
+    assert plurk.user_cache.stats['misses'] == 7 and plurk.user_cache.stats['hits'] == 3 * 7 - 7
+    cache = plurk.UserCache(max_size=2, ttl=0.05)
+    u = plurk_user(1)
+    user = cache.update(u, plurk.parse_user)
+    assert cache.update(dict(u), plurk.parse_user) is user and cache.stats['hits'] == 1
+    assert cache.update(u | {'display_name': 'renamed'}, plurk.parse_user) is user and user.display_name == 'renamed'
+    partial = cache.update({'id': 4, 'nick_name': 'user4', 'display_name': 'User 4', 'date_of_birth': '2000-01-02'}, plurk.parse_user)
+    assert partial.full_name is None and partial.birthday.year == 2000
+    cache.update({'id': 4, 'full_name': 'Full Name'}, plurk.parse_user)
+    assert partial.full_name == 'Full Name' and partial.nickname == 'user4'
+    cache.update(plurk_user(3), plurk.parse_user)
+    assert cache.get(1) is None and cache.get(3).id == 3
+    time.sleep(0.06)
+    assert cache.get(3) is None
+    assert cache.stats == {'size': 1, 'hits': 1, 'misses': 3, 'updates': 2, 'evictions': 2}
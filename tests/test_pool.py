@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from webcrawler import pool
+
+
+class FakeChromeProcess:
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.contexts = 0
+        self.tabs = []
+        self.alive = True
+        self.stopped = False
+
+    def new_browser_context(self):
+        self.contexts += 1
+        return f'context-{self.contexts}'
+
+    def new_tab(self, browser_context_id=None):
+        tab = (browser_context_id, len(self.tabs))
+        self.tabs.append(tab)
+        return tab
+
+    def close_tab(self, tab):
+        self.tabs.remove(tab)
+
+    def is_alive(self):
+        return self.alive
+
+    def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def browser_pool(monkeypatch):
+    monkeypatch.setattr(pool, 'ChromeProcess', FakeChromeProcess)
+    with pool.BrowserPool({'headless': True}, size=1, base_port=9300, max_tabs=2, max_leases=3, health_check_interval=0.05) as browser_pool:
+        yield browser_pool
+
+
+def test_pool_lease(browser_pool):
+    browser_pool.add_profile('a')
+    browser_pool.add_profile('b')
+    browser_pool.add_profile('c', user_data_dir='profile-c', remote_debugging_port=9222)
+    with browser_pool.lease('a') as tab_a, browser_pool.lease('b') as tab_b:
+        assert tab_a[0] != tab_b[0]
+        with pytest.raises(TimeoutError):
+            with browser_pool.lease('a', timeout=0.05): pass
+        with browser_pool.lease('c') as tab_c:
+            assert tab_c[0] is None
+            assert browser_pool._dedicated['c'].browser.kwargs['remote_debugging_port'] == 9301
+    shared = browser_pool._shared[0]
+    assert shared.browser is not None and not shared.browser.tabs
+    with browser_pool.lease('a'): pass
+    assert shared.browser is None and shared.recycle is False
+    assert browser_pool.stats['c']['leases'] == 1
+    with browser_pool.lease('a'), browser_pool.lease('b'):
+        assert browser_pool.stats['shared-0']['leases'] == 2
+
+
+def test_pool_health_check(browser_pool):
+    with browser_pool.lease() as tab:
+        browser = browser_pool._shared[0].browser
+    browser.alive = False
+    stopped = threading.Event()
+    for _ in range(100):
+        if browser.stopped: stopped.set(); break
+        stopped.wait(0.01)
+    assert stopped.is_set()
+    assert browser_pool._shared[0].browser is None
+
+
+def test_pool_health_check_in_use(browser_pool):
+    with browser_pool.lease():
+        entry = browser_pool._shared[0]
+        browser = entry.browser
+        browser.alive = False
+        for _ in range(100):
+            if entry.recycle: break
+            threading.Event().wait(0.01)
+        assert entry.recycle and not browser.stopped
+    for _ in range(100):
+        if entry.browser is None: break
+        threading.Event().wait(0.01)
+    assert browser.stopped and entry.browser is None
@@ -1,6 +1,12 @@
+import datetime
+
+import pytest
 import requests
 
 from webcrawler import ptt
+from webcrawler.ratelimit import HostLimiter
+
+from .conftest import FakeAdapter, ptt_index_html, ptt_post_html
 
 
 def test_ptt_forum():
@@ -26,3 +32,69 @@ def test_ptt_post():
     assert comment.author is not None
     assert comment.content is not None
     assert comment.time is not None
+
+
+@pytest.mark.parametrize('parser', ['lxml', 'selectolax'])
+def test_ptt_parsers(parser):
+    pytest.importorskip(parser)
+    ids = [f'M.{1700000000 + i}.A.{i:03X}' for i in range(5)]
+    html = ptt_post_html(id=ids[0], pushes=300)
+    index = ptt_index_html(page=2, ids=ids)
+    assert ptt.get_parser(parser).parse_index(index) == ptt.get_parser('bs4').parse_index(index)
+    assert ptt.get_parser(parser).parse_article(html) == ptt.get_parser('bs4').parse_article(html)
+    forum = ptt.Forum('transgender')
+    posts = [ptt.Post(forum, ids[0]), ptt.Post(forum, ids[0])]
+    posts[0]._parse(html, 'bs4')
+    posts[1]._parse(html, parser)
+
+    def fields(obj):
+        return {key: repr(value) if key in ('author', 'forum', 'post') else value for key, value in vars(obj).items() if key not in ('_logger', 'comments')}
+
+    assert fields(posts[0]) == fields(posts[1])
+    assert [fields(comment) | {'author': comment.author.id} for comment in posts[0].comments] == [fields(comment) | {'author': comment.author.id} for comment in posts[1].comments]
+    assert len(posts[1].comments) == 300
+
+
+def test_ptt_forum_backfill():
+    pages = {page: [f'M.{1700000000 + page * 3600 + i * 60}.A.{i:03X}' for i in range(5)] for page in range(1, 101)}
+    adapter = FakeAdapter({f'https://www.ptt.cc/bbs/transgender/index{page}.html': ptt_index_html(page=page, ids=ids) for page, ids in pages.items()})
+    adapter.pages['https://www.ptt.cc/bbs/transgender/index.html'] = adapter.pages.pop('https://www.ptt.cc/bbs/transgender/index100.html')
+    forum = ptt.Forum('transgender')
+    with ptt.new_session(4) as session:
+        session.mount('https://www.ptt.cc/', adapter)
+        forum.get(session, time_until=datetime.datetime.fromtimestamp(1700000000 + 90 * 3600 + 120, tz=datetime.timezone.utc), backfill=True, limiter=HostLimiter(4, rate=1000))
+    expected = [id for page in range(100, 89, -1) for id in pages[page][::-1]][:-2]
+    assert [post.id for post in forum.posts] == expected
+    assert len(adapter.requests) < 11 + 10
+
+
+def test_ptt_post_refresh():
+    id = 'M.1700000000.A.000'
+    adapter = FakeAdapter({f'https://www.ptt.cc/bbs/transgender/{id}.html': ptt_post_html(id=id, pushes=5)})
+    with ptt.new_session() as session:
+        session.mount('https://www.ptt.cc/', adapter)
+        post = ptt.Post(ptt.Forum('transgender'), id)
+        assert post.get(session)
+        assert [comment.floor for comment in post.comments] == [1, 2, 3, 4, 5]
+        refreshed = ptt.Post(post.forum, id)
+        refreshed.last_floor, refreshed.content_length = post.last_floor, post.content_length
+        assert not refreshed.get(session)
+        adapter.pages[post.url] = ptt_post_html(id=id, pushes=8)
+        assert refreshed.get(session)
+        assert [comment.floor for comment in refreshed.comments] == [6, 7, 8]
+        fresh = ptt.Post(post.forum, id)
+        fresh.get(session)
+        assert [(comment.time, comment.content) for comment in refreshed.comments] == [(comment.time, comment.content) for comment in fresh.comments[5:]]
+        assert refreshed.last_floor == 8
+        send = adapter.send
+
+        def compressed_send(request, **kwargs):
+            response = send(request, **kwargs)
+            response.headers['Content-Length'] = '1000'
+            return response
+
+        adapter.send = compressed_send
+        assert refreshed.get(session) is False
+        adapter.pages[post.url] = ptt_post_html(id=id, pushes=9)
+        assert refreshed.get(session)
+        assert refreshed.content_length == len(adapter.pages[post.url].encode('utf-8'))
@@ -0,0 +1,60 @@
+import threading
+import time
+
+from webcrawler.ratelimit import AdaptiveTokenBucket, HostLimiter, TokenBucket
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=20, capacity=2)
+    start = time.monotonic()
+    for _ in range(6):
+        assert bucket.acquire()
+    assert 0.15 < time.monotonic() - start < 0.5
+    assert not bucket.acquire(tokens=2, timeout=0.01)
+    stop_event = threading.Event()
+    stop_event.set()
+    assert not TokenBucket(rate=0.01).acquire(tokens=2, stop_event=stop_event)
+    assert TokenBucket.from_interval(0).acquire()
+
+
+def test_adaptive_token_bucket():
+    bucket = AdaptiveTokenBucket(rate=1000, min_backoff=0.05, max_backoff=0.1)
+    assert bucket.acquire()
+    assert bucket.backoff() == 0.05 and bucket.backoff() == 0.1 and bucket.backoff() == 0.1
+    assert not bucket.acquire(timeout=0.01)
+    start = time.monotonic()
+    assert bucket.acquire()
+    assert 0.05 < time.monotonic() - start < 0.3
+    bucket.success()
+    assert bucket.failures == 0 and bucket.backoff() == 0.05
+
+
+def test_host_limiter():
+    limiter = HostLimiter(concurrency=2, rate=float('inf'))
+    active = {'a.com': 0, 'b.com': 0}
+    peak = {'a.com': 0, 'b.com': 0}
+    lock = threading.Lock()
+
+    def fetch(host):
+        with limiter.limit(f'https://{host}/x'):
+            with lock:
+                active[host] += 1
+                peak[host] = max(peak[host], active[host])
+            time.sleep(0.02)
+            with lock:
+                active[host] -= 1
+
+    threads = [threading.Thread(target=fetch, args=(host, )) for host in ('a.com', 'b.com') for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak == {'a.com': 2, 'b.com': 2}
+    with limiter.limit('https://a.com/'):
+        with limiter.limit('https://a.com/'):
+            try:
+                with limiter.limit('https://a.com/', timeout=0.01): pass
+            except TimeoutError:
+                pass
+            else:
+                assert False
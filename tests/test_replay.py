@@ -0,0 +1,45 @@
+import threading
+
+from webcrawler.replay import ReplayBrowser
+from webcrawler.webdriver import CDP
+
+from .conftest import FakeWebSocket
+
+
+class RecordingCDP(CDP):
+
+    def _connect(self, timeout: float = 10):
+        return FakeWebSocket({'Network.getResponseBody': {'body': '{"items": [1, 2, 3]}', 'base64Encoded': False}})
+
+
+def test_record_replay(tmp_path):
+    path = str(tmp_path / 'session.jsonl.gz')
+    events = [
+        {'method': 'Network.requestWillBeSent', 'params': {'requestId': '1', 'type': 'Document', 'request': {'url': 'https://example.com/'}}},
+        {'method': 'Network.responseReceived', 'params': {'requestId': '1', 'type': 'Document', 'response': {'url': 'https://example.com/', 'status': 200}}},
+        {'method': 'Network.loadingFinished', 'params': {'requestId': '1'}},
+        {'method': 'Network.responseReceived', 'params': {'requestId': '2', 'type': 'XHR', 'response': {'url': 'https://example.com/api', 'status': 200}}, 'sessionId': 'SESSION-1'},
+        {'method': 'Network.loadingFinished', 'params': {'requestId': '2'}, 'sessionId': 'SESSION-1'},
+    ]
+    with RecordingCDP(record_path=path) as cdp:
+        for event in events:
+            cdp.websocket.push(event)
+        body = cdp.get_received_by_id(cdp._send('Network.getResponseBody', {'requestId': '2'}, 'SESSION-1'))['result']['body']
+        assert body == '{"items": [1, 2, 3]}'
+    assert cdp.recorder.count == len(events) + 1
+
+    bodies = []
+    done = threading.Event()
+
+    def callback(r):
+        assert browser.cdp.check_loading_finished(r['params']['requestId'], blocking=True, timeout=5)
+        bodies.append(browser.cdp.get_received_by_id(browser.cdp.send('Network.getResponseBody', requestId=r['params']['requestId']))['result']['body'])
+        done.set()
+
+    with ReplayBrowser(path) as browser:
+        listener = browser.cdp.add_listener(callback, cdp_method='Network.responseReceived', url_contain='https://example.com/api')
+        browser.get('https://example.com/', blocking=True, timeout=5)
+        assert done.wait(5)
+        assert browser.cdp.wait_finished(5)
+        browser.cdp.remove_listener(listener)
+    assert bodies == ['{"items": [1, 2, 3]}']
@@ -1,3 +1,8 @@
+import threading
+import time
+
+import pytest
+
 from webcrawler import webdriver
 
 
@@ -15,3 +20,195 @@ def test_chromeprocess(request):
         cdp = browser.cdp
         assert browser.process.poll() is None
         assert int(cdp.get_received_by_id(cdp.send('Runtime.evaluate', expression='1+2'))['result']['result']['value']) == 3
+
+
+def test_chromeprocess_tab_context(fake_cdp):
+    fake_cdp.websocket.replies.update({'Target.getTargetInfo': {'targetInfo': {'targetId': 'PAGE', 'browserContextId': 'CONTEXT-1'}}, 'Target.createTarget': {'targetId': 'TAB'}, 'Target.attachToTarget': {'sessionId': 'SESSION-1'}, 'Target.closeTarget': {'success': True}})
+    browser = webdriver.ChromeProcess(use_exist=True, remote_debugging_port=None)
+    browser.cdp = browser.browser_cdp = fake_cdp
+    browser.open_tabs(2)
+    browser.new_tab(browser_context_id='CONTEXT-2')
+    assert [message['params']['browserContextId'] for message in fake_cdp.websocket.sent if message['method'] == 'Target.createTarget'] == ['CONTEXT-1', 'CONTEXT-1', 'CONTEXT-2']
+    assert [message['method'] for message in fake_cdp.websocket.sent].count('Target.getTargetInfo') == 1
+    browser.stop()
+
+
+def test_cdp_reply_lookup(fake_cdp):
+    id = fake_cdp.send('Runtime.evaluate', expression='1+2')
+    assert fake_cdp.get_received_by_id(id)['result']['result']['value'] == 3
+
+
+def test_cdp_reply_evicted_or_consumed(fake_cdp):
+    fake_cdp.max_received = 1
+    first = fake_cdp.send('Runtime.evaluate', expression='1+2')
+    second = fake_cdp.send('Runtime.evaluate', expression='1+2')
+    assert fake_cdp.get_received_by_id(second)['result']['result']['value'] == 3
+    deadline = time.time() + 5
+    while not fake_cdp.retention_stats['evicted_replies'] and time.time() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(KeyError, match='evicted'):
+        fake_cdp.get_received_by_id(first)
+    with pytest.raises(KeyError, match='consumed'):
+        fake_cdp.get_received_by_id(second)
+    fake_cdp.retain_unmatched = True
+    fake_cdp.websocket.push({'method': 'Network.dataReceived', 'params': {'requestId': '1000.1'}})
+    fake_cdp.get_received_by_id(fake_cdp.send('Runtime.evaluate', expression='1+2'))
+    assert fake_cdp.received[-1]['params'] == {'requestId': '1000.1'}
+
+
+def test_cdp_loading_finished(fake_cdp):
+    request_id = '1000.1'
+    assert not fake_cdp.check_loading_finished(request_id)
+    threading.Timer(0.1, fake_cdp.websocket.push, args=[{'method': 'Network.loadingFinished', 'params': {'requestId': request_id}}]).start()
+    assert fake_cdp.check_loading_finished(request_id, blocking=True, timeout=5)
+    assert not fake_cdp.check_loading_finished('1000.2', blocking=True, timeout=0.1)
+
+
+def test_cdp_retention(fake_cdp):
+    fake_cdp.max_received = 5
+    fake_cdp.get_received_by_id(fake_cdp.send('Runtime.evaluate', expression='1+2'))
+    for i in range(10):
+        fake_cdp.websocket.push({'method': 'Network.dataReceived', 'params': {'requestId': f'1000.{i}'}})
+    fake_cdp.check_loading_finished('1000.10')
+    for i in range(10):
+        fake_cdp.websocket.push({'method': 'Network.dataReceived', 'params': {'requestId': '1000.10'}})
+    fake_cdp.get_received_by_id(fake_cdp.send('Runtime.evaluate', expression='1+2'))
+    stats = fake_cdp.retention_stats
+    assert stats['retained_replies'] == 0
+    assert stats['consumed_replies'] == 2
+    assert stats['dropped_events'] == 10
+    assert stats['retained_messages'] == 5
+    assert stats['evicted_messages'] == 5
+
+
+def test_cdp_listener_dispatch(fake_cdp):
+    received = []
+    done = threading.Event()
+
+    def callback(r):
+        received.append(r['params']['requestId'])
+        if len(received) == 2: done.set()
+
+    listener = fake_cdp.add_listener(callback, cdp_method='Network.responseReceived', url_regex=r'graphql/.+/UserTweets')
+    fake_cdp.websocket.push({'method': 'Network.requestWillBeSent', 'params': {'requestId': '1', 'request': {'url': 'https://x.com/i/api/graphql/abc/UserTweets'}}})
+    fake_cdp.websocket.push({'method': 'Network.responseReceived', 'params': {'requestId': '2', 'response': {'url': 'https://x.com/i/api/graphql/abc/UserTweets'}}})
+    fake_cdp.websocket.push({'method': 'Network.responseReceived', 'params': {'requestId': '3', 'response': {'url': 'https://x.com/i/api/graphql/abc/TweetDetail'}}})
+    fake_cdp.websocket.push({'method': 'Network.responseReceived', 'params': {'requestId': '4', 'response': {'url': 'https://x.com/i/api/graphql/def/UserTweets'}}})
+    assert done.wait(5)
+    fake_cdp.remove_listener(listener)
+    assert sorted(received) == ['2', '4']
+
+
+def test_cdp_callback_overflow(fake_cdp):
+    release, calls = threading.Event(), []
+
+    def callback(r):
+        release.wait(5)
+        calls.append(r['params']['requestId'])
+
+    listener = fake_cdp.add_listener(callback, cdp_method='Network.dataReceived')
+    count = len(fake_cdp._callback_workers) + fake_cdp.callback_queue_size + 3
+    for i in range(count):
+        fake_cdp.websocket.push({'method': 'Network.dataReceived', 'params': {'requestId': str(i)}})
+    reply = fake_cdp.get_received_by_id(fake_cdp.send('Runtime.evaluate', expression='1+2'), timeout=1)
+    assert reply['result']['result']['value'] == 3
+    assert fake_cdp.retention_stats['overflow_callbacks'] >= 3
+    threads = threading.active_count()
+    release.set()
+    fake_cdp.remove_listener(listener)
+    assert sorted(calls, key=int) == [str(i) for i in range(count)]
+    assert fake_cdp.retention_stats['callback_backlog'] == 0
+    assert threads <= len(fake_cdp._callback_workers) + 3
+
+
+def test_cdp_session_listeners(fake_cdp):
+    session = webdriver.CDPSession(fake_cdp, 'SESSION-1')
+    received = {'root': [], 'session': []}
+    done = threading.Event()
+
+    def callback(key):
+
+        def fn(r):
+            received[key].append(r['params']['requestId'])
+            if len(received['root']) and len(received['session']): done.set()
+
+        return fn
+
+    root_listener = fake_cdp.add_listener(callback('root'), cdp_method='Network.responseReceived')
+    session_listener = session.add_listener(callback('session'), cdp_method='Network.responseReceived')
+    fake_cdp.websocket.push({'method': 'Network.responseReceived', 'params': {'requestId': '1', 'response': {'url': ''}}})
+    fake_cdp.websocket.push({'method': 'Network.responseReceived', 'sessionId': 'SESSION-1', 'params': {'requestId': '2', 'response': {'url': ''}}})
+    fake_cdp.websocket.push({'method': 'Network.loadingFinished', 'sessionId': 'SESSION-1', 'params': {'requestId': '2'}})
+    assert done.wait(5)
+    assert session.check_loading_finished('2', blocking=True, timeout=5)
+    assert not fake_cdp.check_loading_finished('2')
+    fake_cdp.remove_listener(root_listener)
+    session.remove_listener(session_listener)
+    assert received == {'root': ['1'], 'session': ['2']}
+    id = session.send('Runtime.evaluate', expression='1+2')
+    assert fake_cdp.websocket.sent[-1]['sessionId'] == 'SESSION-1'
+    assert session.get_received_by_id(id)['result']['result']['value'] == 3
+
+
+def test_resource_blocker(fake_cdp):
+    blocker = webdriver.ResourceBlocker(fake_cdp, resource_types=['Image', 'Font'], url_patterns=['*doubleclick.net*'], estimated_bytes={'Image': 100})
+    assert [message['method'] for message in fake_cdp.websocket.sent] == ['Fetch.enable', 'Network.setBlockedURLs']
+    fake_cdp.websocket.push({'method': 'Fetch.requestPaused', 'params': {'requestId': 'interception-1', 'resourceType': 'Image', 'request': {'url': 'https://example.com/a.png'}}})
+    fake_cdp.websocket.push({'method': 'Fetch.requestPaused', 'params': {'requestId': 'interception-2', 'resourceType': 'Image', 'request': {'url': 'https://example.com/b.png'}}})
+    fake_cdp.websocket.push({'method': 'Network.loadingFailed', 'params': {'requestId': '3', 'type': 'Script', 'blockedReason': 'inspector'}})
+    fake_cdp.websocket.push({'method': 'Network.loadingFailed', 'params': {'requestId': '4', 'type': 'Script', 'errorText': 'net::ERR_FAILED'}})
+    for _ in range(100):
+        if blocker.stats['blocked_requests'] == 3: break
+        time.sleep(0.01)
+    blocker.stop()
+    assert blocker.stats == {'blocked_requests': 3, 'blocked_by_type': {'Image': 2, 'Script': 1}, 'estimated_bytes_saved': 200 + webdriver.ResourceBlocker.estimated_bytes['Script']}
+    assert sorted(message['params']['requestId'] for message in fake_cdp.websocket.sent if message['method'] == 'Fetch.failRequest') == ['interception-1', 'interception-2']
+    assert webdriver.ResourceBlocker.sum_stats([blocker, blocker])['blocked_by_type'] == {'Image': 4, 'Script': 2}
+
+
+def test_challenge_detector(fake_cdp):
+    fake_cdp.websocket.replies['Runtime.evaluate'] = {'result': {'type': 'boolean', 'value': False}}
+    challenge = webdriver.ChallengeDetector(fake_cdp, min_backoff=0.01, max_backoff=0.02)
+    assert not challenge.is_challenged()
+    assert not challenge.is_challenged()
+    assert challenge.stats['probes'] == 1
+    fake_cdp.websocket.replies['Runtime.evaluate'] = {'result': {'type': 'boolean', 'value': True}}
+    fake_cdp.websocket.push({'method': 'Network.requestWillBeSent', 'params': {'requestId': '1', 'request': {'url': 'https://challenges.cloudflare.com/turnstile/v0/api.js'}}})
+    for _ in range(100):
+        if challenge.stats['sightings']: break
+        time.sleep(0.01)
+    assert challenge.is_challenged()
+    stop_event = threading.Event()
+    stop_event.set()
+    assert not challenge.wait_cleared(stop_event=stop_event)
+    threading.Timer(0.05, lambda: fake_cdp.websocket.replies.update({'Runtime.evaluate': {'result': {'type': 'boolean', 'value': False}}})).start()
+    assert challenge.wait_cleared(timeout=2)
+    assert challenge.stats['probes'] > 3
+    challenge.stop()
+
+
+def test_cdp_network_requests(fake_cdp):
+    url = 'https://x.com/i/api/graphql/abc/UserTweets?variables=1'
+    events = [
+        {'method': 'Network.requestWillBeSent', 'params': {'requestId': '1', 'type': 'XHR', 'timestamp': 10.0, 'request': {'url': url, 'method': 'GET'}}},
+        {'method': 'Network.responseReceived', 'params': {'requestId': '1', 'type': 'XHR', 'timestamp': 10.25, 'response': {'url': url, 'status': 200, 'mimeType': 'application/json', 'protocol': 'h2'}}},
+        {'method': 'Network.dataReceived', 'params': {'requestId': '1', 'dataLength': 300}},
+        {'method': 'Network.dataReceived', 'params': {'requestId': '1', 'dataLength': 700}},
+        {'method': 'Network.loadingFinished', 'params': {'requestId': '1', 'timestamp': 10.5, 'encodedDataLength': 400}},
+        {'method': 'Network.requestWillBeSent', 'params': {'requestId': '2', 'type': 'XHR', 'timestamp': 11.0, 'request': {'url': 'https://www.facebook.com/api/graphql/', 'method': 'POST', 'headers': {'x-fb-friendly-name': 'ProfileCometTimelineFeedRefetchQuery'}}}},
+        {'method': 'Network.loadingFailed', 'params': {'requestId': '2', 'type': 'XHR', 'timestamp': 12.0, 'errorText': 'net::ERR_FAILED', 'canceled': False}},
+    ]
+    for event in events:
+        fake_cdp.websocket.push(event)
+    request = fake_cdp.wait_request('2', timeout=5)
+    assert not request.finished and request.failure == 'net::ERR_FAILED' and request.operation == 'ProfileCometTimelineFeedRefetchQuery'
+    request = fake_cdp.get_request('1')
+    assert request.wait(0) and (request.status, request.data_size, request.encoded_size, request.ttfb, request.duration, request.operation) == (200, 1000, 400, 0.25, 0.5, 'UserTweets')
+    assert [r.request_id for r in fake_cdp.network_requests(url_regex=r'graphql/.+/UserTweets')] == ['1']
+    assert sorted(r.request_id for r in fake_cdp.network_requests(done=True, resource_type='XHR')) == ['1', '2']
+    assert fake_cdp.network_requests(session_id='SESSION-1') == []
+    stats = fake_cdp.network_stats(group_by='operation')
+    assert list(stats) == ['ProfileCometTimelineFeedRefetchQuery', 'UserTweets']
+    assert stats['UserTweets'] | {'avg_duration': 0.5} == stats['UserTweets'] and stats['UserTweets']['encoded_bytes'] == 400
+    assert fake_cdp.network_stats(group_by='pattern', patterns=[r'facebook\.com/api/graphql'])['other']['requests'] == 1
+    assert fake_cdp.network_stats()['x.com']['finished'] == 1
@@ -0,0 +1,197 @@
+import asyncio
+import base64
+import itertools
+import json
+import logging
+import time
+from collections import OrderedDict, defaultdict
+
+import requests
+
+from .webdriver import Listener
+
+
+# https://chromedevtools.github.io/devtools-protocol
+class AsyncCDP:
+    _logger = logging.getLogger('AsyncCDP')
+
+    def __init__(self, remote_debugging_host: str = '127.0.0.1', remote_debugging_port: int = 9222, websocket_url: str = None, timeout: float = 10, max_tracked_requests: int = 10000):
+        self.remote_debugging_host = remote_debugging_host
+        self.remote_debugging_port = remote_debugging_port
+        self.websocket_url = websocket_url
+        self.timeout = timeout
+        self.max_tracked_requests = max_tracked_requests
+        self.websocket = None
+        self._ids = itertools.count(1)
+        self._replies: dict[int, asyncio.Future] = dict()
+        self._subscriptions: dict[str, dict[int, Subscription]] = defaultdict(dict)
+        self._requests: OrderedDict[str, dict] = OrderedDict()
+        self._recv_task: asyncio.Task = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def connect(self):
+        from websockets.asyncio.client import connect
+        if not self.websocket_url:
+            self.websocket_url = await asyncio.to_thread(self._get_websocket_url)
+        self._logger.debug(f'CDP websocket url: {self.websocket_url}')
+        self.websocket = await connect(self.websocket_url, max_size=None, compression=None, open_timeout=self.timeout)
+        self._recv_task = asyncio.create_task(self._recv())
+        return self
+
+    def _get_websocket_url(self):
+        end_time = time.time() + self.timeout
+        with requests.Session() as session:
+            while time.time() < end_time:
+                try:
+                    time.sleep(0.5)
+                    return session.get(f'http://{self.remote_debugging_host}:{self.remote_debugging_port}/json').json()[0]['webSocketDebuggerUrl']
+                except:
+                    continue
+        raise TimeoutError(f'Failed to connect http://{self.remote_debugging_host}:{self.remote_debugging_port}/json')
+
+    async def close(self):
+        for subscriptions in tuple(self._subscriptions.values()):
+            for subscription in tuple(subscriptions.values()):
+                subscription.close()
+        if self.websocket:
+            await self.websocket.close()
+        if self._recv_task:
+            await asyncio.gather(self._recv_task, return_exceptions=True)
+        for reply in self._replies.values():
+            if not reply.done():
+                reply.set_exception(ConnectionError('CDP connection closed'))
+        self._replies.clear()
+
+    def send(self, method: str, **params) -> asyncio.Future:
+        id = next(self._ids)
+        reply = asyncio.get_running_loop().create_future()
+        self._replies[id] = reply
+        reply.add_done_callback(lambda _: self._replies.pop(id, None))
+        sending = asyncio.ensure_future(self.websocket.send(json.dumps({'id': id, 'method': method, 'params': params})))
+        sending.add_done_callback(lambda task: None if task.cancelled() or task.exception() is None or reply.done() else reply.set_exception(task.exception()))
+        return reply
+
+    async def call(self, method: str, timeout: float = 10, **params) -> dict:
+        reply = await asyncio.wait_for(self.send(method, **params), timeout)
+        if 'error' in reply:
+            raise RuntimeError(f'{method}: {reply["error"]}')
+        return reply['result']
+
+    def subscribe(self, cdp_method: str = None, request_id: str = None, resource_type: str = None, url_exact: str = None, url_contain: str = None, url_regex: str = None, status_code: int = None, maxsize: int = 0):
+        subscription = Subscription(self, Listener(None, f'<AsyncCDP subscription: {cdp_method}>', cdp_method, request_id, resource_type, url_exact, url_contain, url_regex, status_code), maxsize)
+        self._subscriptions[cdp_method][id(subscription)] = subscription
+        return subscription
+
+    async def wait_loading_finished(self, request_id: str, timeout: float = 10) -> bool:
+        request = self._track_request(request_id)
+        try:
+            await asyncio.wait_for(asyncio.shield(request['done']), timeout)
+        except TimeoutError:
+            return False
+        return request['done'].result()
+
+    async def get_response_body(self, request_id: str, timeout: float = 10) -> str:
+        if not await self.wait_loading_finished(request_id, timeout):
+            raise TimeoutError(f'Loading not finished: {request_id}')
+        result = await self.call('Network.getResponseBody', timeout=timeout, requestId=request_id)
+        return base64.b64decode(result['body']).decode() if result['base64Encoded'] else result['body']
+
+    async def get(self, url: str, blocking: bool = False, timeout: float = 10, **params):
+        if blocking:
+            async with self.subscribe('Network.requestWillBeSent', url_exact=url) as requests_sent:
+                await self.call('Page.navigate', timeout=timeout, url=url, **params)
+                try:
+                    async with asyncio.timeout(timeout):
+                        r = await anext(requests_sent)
+                        await self.wait_loading_finished(r['params']['requestId'], timeout)
+                except TimeoutError:
+                    return
+        else:
+            await self.call('Page.navigate', timeout=timeout, url=url, **params)
+
+    async def scroll(self, x: int, y: int, x_distance: int = 0, y_distance: int = 0, speed: int = 800, count: int = 1, repeat_delay: float = 0.25, *, blocking: bool = True, **params):
+        self.send('Input.synthesizeScrollGesture', x=x, y=y, xDistance=x_distance, yDistance=y_distance, speed=speed, repeatCount=count - 1, repeatDelayMs=int(repeat_delay * 1000), **params)
+        if blocking: await asyncio.sleep(max(abs(x_distance), abs(y_distance)) / speed * count + repeat_delay * (count - 1))
+
+    async def page_source(self) -> str:
+        try:
+            nodeId = (await self.call('DOM.getDocument'))['root']['nodeId']
+            return (await self.call('DOM.getOuterHTML', nodeId=nodeId))['outerHTML']
+        except:
+            return ""
+
+    def _track_request(self, request_id: str):
+        if request_id not in self._requests:
+            self._requests[request_id] = {'done': asyncio.get_running_loop().create_future()}
+            while len(self._requests) > self.max_tracked_requests:
+                self._requests.popitem(last=False)
+        return self._requests[request_id]
+
+    async def _recv(self):
+        async for message in self.websocket:
+            try:
+                data = defaultdict(lambda: None)
+                data.update(json.loads(message))
+                if data['id'] is not None:
+                    reply = self._replies.get(data['id'])
+                    if reply and not reply.done():
+                        reply.set_result(data)
+                    continue
+                if data['method'] is None: continue
+                for subscription in (*self._subscriptions[data['method']].values(), *self._subscriptions[None].values()):
+                    if subscription.listener.match(data):
+                        if (data['params'] or {}).get('requestId'): self._track_request(data['params']['requestId'])
+                        subscription.put(data)
+                if data['method'] in ('Network.loadingFinished', 'Network.loadingFailed'):
+                    request = self._track_request(data['params']['requestId'])
+                    if not request['done'].done():
+                        request['done'].set_result(data['method'] == 'Network.loadingFinished')
+            except Exception as E:
+                self._logger.warning(f'Read message failed: {type(E)}:{E.args}')
+                continue
+
+
+class Subscription:
+
+    def __init__(self, cdp: AsyncCDP, listener: Listener, maxsize: int = 0):
+        self.cdp = cdp
+        self.listener = listener
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._dropped = 0
+
+    def __repr__(self):
+        return f'<AsyncCDP subscription: {self.listener.cdp_method}>'
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        try:
+            return await self._queue.get()
+        except asyncio.QueueShutDown:
+            raise StopAsyncIteration
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def put(self, data: dict):
+        try:
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self._dropped += 1
+            self.cdp._logger.warning(f'Subscription queue full, drop message: {self.listener.cdp_method}')
+        except asyncio.QueueShutDown:
+            pass
+
+    def close(self):
+        self.cdp._subscriptions[self.listener.cdp_method].pop(id(self), None)
+        self._queue.shutdown()
@@ -0,0 +1,209 @@
+import argparse
+import atexit
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+
+class SQLiteWriter:
+    _logger = logging.getLogger('SQLiteWriter')
+    pragmas = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'temp_store': 'MEMORY',
+        'cache_size': -65536,
+        'mmap_size': 268435456,
+        'busy_timeout': 5000,
+    }
+
+    def __init__(self, path: str, batch_size: int = 1000, flush_interval: float = 1, pragmas: dict = None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self.rows_ignored = 0
+        self.batches = 0
+        self._tables: set[str] = set()
+        self._pending: dict[tuple[str, int, str], list[tuple]] = {}
+        self._pending_rows = 0
+        self._flushed_time = time.monotonic()
+        self._lock = threading.RLock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        for key, value in (self.pragmas | (pragmas or {})).items():
+            self.db.execute(f'PRAGMA {key}={value};')
+        self._tables.update(row[0] for row in self.db.execute('SELECT name FROM sqlite_master WHERE type="table";'))
+
+    def __repr__(self):
+        return f'<SQLite writer: {self.path}>'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def create_table(self, table: str, columns: str, indexes: tuple[str, ...] = ()):
+        if table in self._tables: return
+        with self._lock:
+            self.db.execute(f'CREATE TABLE IF NOT EXISTS `{table}` ({columns});')
+            for index in indexes:
+                name = f'{table}_' + re.sub(r'\W+', '_', index).strip('_')
+                self.db.execute(f'CREATE INDEX IF NOT EXISTS `{name}` ON `{table}` ({index});')
+            self.db.commit()
+            self._tables.add(table)
+
+    def insert(self, table: str, row: tuple | list, conflict: str = 'IGNORE'):
+        with self._lock:
+            self._pending.setdefault((table, len(row), conflict), []).append(tuple(row))
+            self._pending_rows += 1
+        self.maybe_flush()
+
+    def query(self, sql: str, params: tuple | list = ()) -> list[tuple]:
+        with self._lock:
+            self.flush()
+            return self.db.execute(sql, params).fetchall()
+
+    def maybe_flush(self):
+        if self._pending_rows >= self.batch_size or (self._pending_rows and time.monotonic() - self._flushed_time >= self.flush_interval):
+            self.flush()
+
+    def flush_timeout(self) -> float | None:
+        if not self._pending_rows: return None
+        return max(0, self.flush_interval - (time.monotonic() - self._flushed_time))
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending, self._pending_rows = self._pending, {}, 0
+            self._flushed_time = time.monotonic()
+            if not pending: return
+            for (table, width, conflict), rows in pending.items():
+                sql = f'INSERT OR {conflict} INTO `{table}` VALUES ({",".join("?" * width)});'
+                try:
+                    written = self.db.executemany(sql, rows).rowcount
+                except sqlite3.Error as E:
+                    self._logger.warning(f'Write batch failed: {type(E)}:{E.args}: {table}: {len(rows)} rows, retry row by row')
+                    written = 0
+                    for row in rows:
+                        try:
+                            written += self.db.execute(sql, row).rowcount
+                        except sqlite3.Error as E:
+                            self._logger.warning(f'Write db failed: {type(E)}:{E.args}: {table}: {row[:1]}')
+                self.rows_written += written
+                self.rows_ignored += len(rows) - written
+            self.db.commit()
+            self.batches += 1
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {'rows_written': self.rows_written, 'rows_ignored': self.rows_ignored, 'batches': self.batches, 'pending': self._pending_rows}
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self.db.close()
+
+
+# One comments table per site database, keyed by (post_id, floor) or (post_id, id); the columns after post_id match the old per-post tables.
+comments_schemas = {
+    'dcard': ('"post_id" INTEGER, "floor" INTEGER, "created_time" INTEGER, "author_school" TEXT, "author_department" TEXT, "content" TEXT, UNIQUE ("post_id", "floor")', ('"created_time"', '"author_school", "author_department"')),
+    'facebook': ('"post_id" INTEGER, "id" INTEGER, "created_time" INTEGER, "author_id" INTEGER, "author_alias" TEXT, "author_name" TEXT, "content" TEXT, UNIQUE ("post_id", "id")', ('"created_time"', '"author_id"')),
+    'plurk': ('"post_id" INTEGER, "floor" INTEGER, "id" INTEGER, "time" INTEGER, "author_id" INTEGER, "author_nickname" TEXT, "author_displayname" TEXT, "content" TEXT, UNIQUE ("post_id", "floor")', ('"time"', '"author_id"')),
+    'ptt': ('"post_id" TEXT, "floor" INTEGER, "time" INTEGER, "reaction" TEXT, "author_id" TEXT, "content" TEXT, UNIQUE ("post_id", "floor")', ('"time"', '"author_id"')),
+}
+# Tables of the comments databases that are not per-post comment tables
+comments_db_tables = ('comments', 'responses', 'refresh')
+
+
+def create_comments_table(db: SQLiteWriter, site: str):
+    db.create_table('comments', *comments_schemas[site])
+
+
+def migrate_comments(path: str, site: str, batch_tables: int = 500, keep_tables: bool = False, vacuum: bool = False) -> dict:
+    logger = logging.getLogger('Migrate comments')
+    columns, _ = comments_schemas[site]
+    names = [column.split()[0] for column in columns.split(', UNIQUE')[0].split(', ')]
+    old_names = ', '.join(names[1:])
+    names = ', '.join(names)
+    integer_ids = columns.startswith('"post_id" INTEGER')
+    stats = {'tables': 0, 'rows': 0, 'skipped': 0}
+    with SQLiteWriter(path) as writer:
+        db = writer.db
+        create_comments_table(writer, site)
+        last = ''
+        while True:
+            tables = [row[0] for row in db.execute('SELECT name FROM sqlite_master WHERE type="table" AND name > ? AND name NOT LIKE "sqlite_%" ORDER BY name LIMIT ?;', [last, batch_tables])]
+            if not tables: break
+            last = tables[-1]
+            for table in tables:
+                if table in comments_db_tables: continue
+                if integer_ids and not table.isdigit():
+                    logger.warning(f'Skip table: {table}')
+                    stats['skipped'] += 1
+                    continue
+                try:
+                    stats['rows'] += db.execute(f'INSERT OR IGNORE INTO `comments` ({names}) SELECT ?, {old_names} FROM `{table}`;', [int(table) if integer_ids else table]).rowcount
+                    if not keep_tables: db.execute(f'DROP TABLE `{table}`;')
+                    stats['tables'] += 1
+                except sqlite3.Error as E:
+                    logger.warning(f'Migrate table failed: {type(E)}:{E.args}: {table}')
+                    stats['skipped'] += 1
+            db.commit()
+            logger.info(f'Migrated {stats}')
+        if vacuum: db.execute('VACUUM;')
+    return stats
+
+
+_writers: dict[str, SQLiteWriter] = {}
+_writers_lock = threading.Lock()
+writer_kwargs: dict = {}
+
+
+def configure(**kwargs):
+    writer_kwargs.update(kwargs)
+
+
+def get_writer(path: str) -> SQLiteWriter:
+    with _writers_lock:
+        if path not in _writers:
+            _writers[path] = SQLiteWriter(path, **writer_kwargs)
+        return _writers[path]
+
+
+def flush_writers(force: bool = True):
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        if force: writer.flush()
+        else: writer.maybe_flush()
+
+
+def flush_timeout() -> float | None:
+    with _writers_lock:
+        timeouts = [timeout for timeout in (writer.flush_timeout() for writer in _writers.values()) if timeout is not None]
+    return min(timeouts, default=None)
+
+
+def close_writers():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_writers)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s: %(message)s')
+    parser = argparse.ArgumentParser(description='Move the per-post comment tables of a comments database into one comments table')
+    parser.add_argument('path')
+    parser.add_argument('site', choices=comments_schemas)
+    parser.add_argument('--batch-tables', type=int, default=500, help='tables migrated per transaction')
+    parser.add_argument('--keep-tables', action='store_true', help='keep the per-post tables after copying them')
+    parser.add_argument('--vacuum', action='store_true')
+    args = parser.parse_args()
+    print(migrate_comments(args.path, args.site, args.batch_tables, args.keep_tables, args.vacuum))
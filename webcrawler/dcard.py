@@ -10,7 +10,7 @@ import dateutil
 import pytz
 from bs4 import BeautifulSoup
 
-from .webdriver import ChromeProcess
+from .webdriver import ChallengeDetector, ChromeProcess
 
 
 class Forum:
@@ -35,7 +35,7 @@ class Forum:
             browser.get(self.url, blocking=True, timeout=timeout)
             time.sleep(8)
             while not stop_event.is_set():
-                if 'https://challenges.cloudflare.com/turnstile' in browser.page_source:
+                if not challenge.wait_cleared(stop_event=stop_event):
                     continue
                 browser.scroll(
                     x=browser.window_size[0] // 2 + int(10 * (random.random() - 0.5)),
@@ -166,6 +166,7 @@ class Forum:
                         continue
 
         if stop_event is None: stop_event = threading.Event()
+        challenge = ChallengeDetector(browser.cdp)
         listener1 = browser.cdp.add_listener(on_listener1, name=f'Listener 1: {self.__repr__()}', cdp_method='Network.responseReceived', url_contain=self.url)
         listener2 = browser.cdp.add_listener(on_listener2, name=f'Listener 2: {self.__repr__()}', cdp_method='Network.responseReceived', url_contain='https://www.dcard.tw/service/api/v2/forums')
         listener3 = browser.cdp.add_listener(on_listener3, name=f'Listener 3: {self.__repr__()}', cdp_method='Network.responseReceived', url_contain='https://www.dcard.tw/service/api/v2/popularForums/GetPage')
@@ -189,6 +190,7 @@ class Forum:
             browser.cdp.remove_listener(listener2)
             browser.cdp.remove_listener(listener3)
             browser.cdp.remove_listener(listener4)
+            challenge.stop()
             self._logger.debug(f'#Posts: {len(self.posts)}')
 
     def _parse_forum(self, forum_data: dict):
@@ -269,7 +271,7 @@ class Post:
             browser.get(self.url, blocking=True, timeout=timeout)
             time.sleep(8)
             while not stop_event.is_set():
-                if 'https://challenges.cloudflare.com/turnstile' in browser.page_source:
+                if not challenge.wait_cleared(stop_event=stop_event):
                     continue
                 browser.cdp.send('Runtime.evaluate', expression="document.querySelector('div#comment-list-section button:nth-last-child(2)').click()")
                 browser.scroll(
@@ -437,6 +439,7 @@ class Post:
                 return
 
         if stop_event is None: stop_event = threading.Event()
+        challenge = ChallengeDetector(browser.cdp)
         listener1 = browser.cdp.add_listener(on_listener1, name=f'Listener 1: {self.__repr__()}', cdp_method='Network.responseReceived', url_contain=self.url)
         listener2 = browser.cdp.add_listener(on_listener2, name=f'Listener 2: {self.__repr__()}', cdp_method='Network.responseReceived', url_contain=f'https://www.dcard.tw/service/api/v2/posts/{self.id}?withPreview=true')
         listener3 = browser.cdp.add_listener(on_listener3, name=f'Listener 3: {self.__repr__()}', cdp_method='Network.responseReceived', url_contain=f'https://www.dcard.tw/service/api/v3/posts/{self.id}/comments?sort=oldest')
@@ -456,6 +459,7 @@ class Post:
             browser.cdp.remove_listener(listener1)
             browser.cdp.remove_listener(listener2)
             browser.cdp.remove_listener(listener3)
+            challenge.stop()
             self._logger.debug(f'#Comments: {len(self.comments)}')
 
 
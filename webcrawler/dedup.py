@@ -0,0 +1,154 @@
+import collections
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+
+
+class BloomFilter:
+
+    def __init__(self, capacity: int = 1000000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def __repr__(self):
+        return f'<Bloom filter: {self.count}/{self.capacity}>'
+
+    def _positions(self, item) -> list[int]:
+        digest = hashlib.blake2b(str(item).encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item) -> bool:
+        return all(self.bits[i >> 3] & (1 << (i & 7)) for i in self._positions(item))
+
+    def add(self, item) -> bool:
+        added = False
+        for i in self._positions(item):
+            if not self.bits[i >> 3] & (1 << (i & 7)):
+                self.bits[i >> 3] |= 1 << (i & 7)
+                added = True
+        if added: self.count += 1
+        return added
+
+
+class SeenIndex:
+    _logger = logging.getLogger('SeenIndex')
+
+    def __init__(self, db_path: str, capacity: int = 1000000, error_rate: float = 0.001, cache_size: int = 100000, filter_path: str = None):
+        self.db_path = db_path
+        self.filter_path = filter_path or f'{db_path}.bloom'
+        self.cache_size = cache_size
+        self.hits = 0
+        self.negatives = 0
+        self.lookups = 0
+        self.false_positives = 0
+        self._cache: collections.OrderedDict = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self._load(capacity, error_rate)
+
+    def __repr__(self):
+        return f'<Seen index: {self.db_path}>'
+
+    def _load(self, capacity: int, error_rate: float):
+        self.filter, self.rowids = BloomFilter(capacity, error_rate), {}
+        try:
+            with open(self.filter_path, 'rb') as f:
+                meta = json.loads(f.readline())
+                bits = bytearray(f.read())
+            if meta['capacity'] >= capacity and meta['error_rate'] == error_rate:
+                bloom = BloomFilter(meta['capacity'], error_rate)
+                if len(bits) == len(bloom.bits):
+                    bloom.bits, bloom.count = bits, meta['count']
+                    self.filter, self.rowids, capacity = bloom, meta['rowids'], meta['capacity']
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as E:
+            self._logger.warning(f'Read filter failed: {type(E)}:{E.args}: {self.filter_path}')
+        added = self._catch_up()
+        if self.filter.count > capacity:
+            self._logger.info(f'Resize filter: {self.filter.count} ids over capacity {capacity}')
+            self.filter, self.rowids = BloomFilter(max(2 * capacity, 2 * self.filter.count), error_rate), {}
+            added = self._catch_up()
+        self._logger.debug(f'Load {self.filter}, {added} new ids: {self.filter_path}')
+
+    def _catch_up(self) -> int:
+        added = 0
+        self.tables = [row[0] for row in self.db.execute('SELECT name FROM sqlite_master WHERE type="table" AND name NOT LIKE "sqlite_%";')]
+        for table in self.tables:
+            try:
+                for rowid, id in self.db.execute(f'SELECT rowid, id FROM `{table}` WHERE rowid > ? ORDER BY rowid;', [self.rowids.get(table, 0)]):
+                    self.filter.add(id)
+                    self.rowids[table] = rowid
+                    added += 1
+            except sqlite3.Error as E:
+                self._logger.warning(f'Read table failed: {type(E)}:{E.args}: {table}')
+        return added
+
+    def _lookup(self, id) -> bool:
+        for table in self.tables:
+            try:
+                if self.db.execute(f'SELECT 1 FROM `{table}` WHERE id=? LIMIT 1;', [id]).fetchone(): return True
+            except sqlite3.Error:
+                continue
+        return False
+
+    def _remember(self, id):
+        self._cache[id] = None
+        self._cache.move_to_end(id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def __contains__(self, id) -> bool:
+        with self._lock:
+            if id in self._cache:
+                self._cache.move_to_end(id)
+                self.hits += 1
+                return True
+            if id not in self.filter:
+                self.negatives += 1
+                return False
+            self.lookups += 1
+            if self._lookup(id):
+                self._remember(id)
+                return True
+            self.false_positives += 1
+            return False
+
+    def add(self, id):
+        with self._lock:
+            self._remember(id)
+            self.filter.add(id)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {'ids': self.filter.count, 'cached': len(self._cache), 'hits': self.hits, 'negatives': self.negatives, 'lookups': self.lookups, 'false_positives': self.false_positives}
+
+    def save(self):
+        with self._lock:
+            self._catch_up()
+            meta = {'capacity': self.filter.capacity, 'error_rate': self.filter.error_rate, 'count': self.filter.count, 'rowids': self.rowids}
+            with open(f'{self.filter_path}.tmp', 'wb') as f:
+                f.write(json.dumps(meta).encode('utf-8') + b'\n')
+                f.write(self.filter.bits)
+            os.replace(f'{self.filter_path}.tmp', self.filter_path)
+
+    def close(self):
+        self.save()
+        self.db.close()
+
+
+index_kwargs: dict = {}
+
+
+def configure(**kwargs):
+    index_kwargs.update(kwargs)
@@ -0,0 +1,93 @@
+import datetime
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+
+class HTTP2Adapter(requests.adapters.BaseAdapter):
+    _logger = logging.getLogger('HTTP2Adapter')
+
+    def __init__(self, max_connections: int = 8, verify: bool = True, **client_kwargs):
+        import httpx
+        super().__init__()
+        self._httpx = httpx
+        self.client = httpx.Client(http2=True, limits=httpx.Limits(max_connections=max_connections), verify=verify, follow_redirects=False, **client_kwargs)
+        self.settings = {'verify': verify, 'cert': client_kwargs.get('cert'), 'proxy': client_kwargs.get('proxy')}
+        self.http_versions: dict[str, str] = {}
+        self._ignored: set[tuple[str, str]] = set()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<HTTP2 adapter: {self.http_versions}>'
+
+    def warm_up(self, *urls: str, timeout: float = 10) -> dict[str, str]:
+        for url in urls:
+            origin = '{0.scheme}://{0.netloc}/'.format(urlsplit(url))
+            try:
+                response = self.client.head(origin, timeout=timeout)
+                with self._lock:
+                    self.http_versions[urlsplit(url).netloc] = response.http_version
+                self._logger.debug(f'Warm up {origin}: {response.http_version}')
+            except Exception as E:
+                self._logger.warning(f'Warm up failed: {type(E)}:{E.args}: {origin}')
+        return self.http_versions
+
+    def _timeout(self, timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return self._httpx.Timeout(read, connect=connect)
+        return self._httpx.Timeout(timeout)
+
+    def _check_settings(self, url: str, **settings):
+        for name, value in settings.items():
+            if value == self.settings[name]: continue
+            with self._lock:
+                if (name, str(value)) in self._ignored: continue
+                self._ignored.add((name, str(value)))
+            self._logger.warning(f'Ignore {name}={value!r}, the HTTP/2 client uses {self.settings[name]!r}: {url}')
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, timeout=None, verify=True, cert=None, proxies=None) -> requests.Response:
+        start = time.perf_counter()
+        self._check_settings(request.url, verify=verify, cert=cert, proxy=requests.utils.select_proxy(request.url, proxies or {}))
+        try:
+            reply = self.client.request(request.method, request.url, headers=dict(request.headers), content=request.body, timeout=self._timeout(timeout))
+        except self._httpx.TimeoutException as E:
+            raise requests.exceptions.Timeout(E, request=request)
+        except self._httpx.TransportError as E:
+            raise requests.exceptions.ConnectionError(E, request=request)
+        with self._lock:
+            self.http_versions[urlsplit(request.url).netloc] = reply.http_version
+        response = requests.Response()
+        response.status_code = reply.status_code
+        response.reason = reply.reason_phrase
+        response.headers = requests.structures.CaseInsensitiveDict(reply.headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.elapsed = datetime.timedelta(seconds=time.perf_counter() - start)
+        response.connection = self
+        response._content = reply.content
+        response._content_consumed = True
+        return response
+
+    def close(self):
+        self.client.close()
+
+
+def new_session(max_connections: int = 8, session: requests.Session = None, **client_kwargs) -> requests.Session:
+    session = session or requests.Session()
+    session.mount('https://', HTTP2Adapter(max_connections, **client_kwargs))
+    return session
+
+
+def warm_up(session: requests.Session, *urls: str, timeout: float = 10) -> dict[str, str]:
+    http_versions = {}
+    for adapter in {id(adapter): adapter for adapter in session.adapters.values()}.values():
+        while not isinstance(adapter, HTTP2Adapter) and hasattr(adapter, 'adapter'):
+            adapter = adapter.adapter
+        if isinstance(adapter, HTTP2Adapter):
+            http_versions.update(adapter.warm_up(*urls, timeout=timeout))
+    return http_versions
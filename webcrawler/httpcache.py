@@ -0,0 +1,182 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+
+class HTTPCache:
+    _logger = logging.getLogger('HTTPCache')
+
+    def __init__(self, directory: str = 'data/http-cache', max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        self._entries: collections.OrderedDict[str, int] = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __repr__(self):
+        return f'<HTTP cache: {self.directory}>'
+
+    def _load(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'): continue
+            key = name[:-5]
+            try:
+                entries.append((os.path.getmtime(self._path(key, 'json')), key, os.path.getsize(self._path(key, 'body'))))
+            except OSError:
+                self._remove(key)
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._size += size
+        self._logger.debug(f'Load {len(self._entries)} entries, {self._size} bytes: {self.directory}')
+        with self._lock:
+            self._evict()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, f'{key}.{suffix}')
+
+    def _remove(self, key: str):
+        for suffix in ('json', 'body'):
+            try:
+                os.remove(self._path(key, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            self._remove(key)
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def get(self, url: str) -> tuple[dict, bytes] | None:
+        key = self.key(url)
+        with self._lock:
+            if key not in self._entries: return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key, 'json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(self._path(key, 'body'), 'rb') as f:
+                body = f.read()
+            os.utime(self._path(key, 'json'))
+        except (OSError, ValueError) as E:
+            self._logger.warning(f'Read cache failed: {type(E)}:{E.args}: {url}')
+            self.delete(url)
+            return None
+        return meta, body
+
+    def put(self, url: str, headers: dict, body: bytes):
+        if len(body) > self.max_bytes: return
+        key = self.key(url)
+        for suffix, data in (('body', body), ('json', json.dumps({'url': url, 'headers': headers, 'time': time.time()}).encode('utf-8'))):
+            with tempfile.NamedTemporaryFile(dir=self.directory, prefix=f'{key}.', suffix=f'.{suffix}.tmp', delete=False) as f:
+                f.write(data)
+            try:
+                os.replace(f.name, self._path(key, suffix))
+            except OSError:
+                os.remove(f.name)
+                raise
+        with self._lock:
+            self._size += len(body) - self._entries.pop(key, 0)
+            self._entries[key] = len(body)
+            self.stores += 1
+            self._evict()
+
+    def delete(self, url: str):
+        key = self.key(url)
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+        self._remove(key)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'bytes_saved': self.bytes_saved,
+            }
+
+    def wrap(self, session: requests.Session) -> requests.Session:
+        for prefix, adapter in list(session.adapters.items()):
+            if not isinstance(adapter, CacheAdapter):
+                session.mount(prefix, CacheAdapter(self, adapter))
+        return session
+
+
+class CacheAdapter(requests.adapters.BaseAdapter):
+    _logger = logging.getLogger('CacheAdapter')
+    skip_headers = ('Content-Encoding', 'Transfer-Encoding', 'Connection', 'Keep-Alive')
+
+    def __init__(self, cache: HTTPCache, adapter: requests.adapters.BaseAdapter = None):
+        super().__init__()
+        self.cache = cache
+        self.adapter = adapter or requests.adapters.HTTPAdapter()
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if request.method != 'GET' or 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers:
+            return self.adapter.send(request, **kwargs)
+        cached = self.cache.get(request.url)
+        if cached:
+            meta, body = cached
+            headers = requests.structures.CaseInsensitiveDict(meta['headers'])
+            if 'ETag' in headers: request.headers['If-None-Match'] = headers['ETag']
+            if 'Last-Modified' in headers: request.headers['If-Modified-Since'] = headers['Last-Modified']
+        response = self.adapter.send(request, **kwargs)
+        if response.status_code == 304 and cached:
+            response.close()
+            with self.cache._lock:
+                self.cache.hits += 1
+                self.cache.bytes_saved += len(body)
+            self._logger.debug(f'Hit: {request.url}')
+            return self._build(request, response, meta['headers'], body)
+        with self.cache._lock:
+            self.cache.misses += 1
+        if response.status_code == 200 and ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            headers = {key: value for key, value in response.headers.items() if key not in self.skip_headers}
+            self.cache.put(request.url, headers, response.content)
+        elif cached and response.status_code != 304:
+            self.cache.delete(request.url)
+        return response
+
+    @staticmethod
+    def _build(request: requests.PreparedRequest, not_modified: requests.Response, headers: dict, body: bytes) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.headers = requests.structures.CaseInsensitiveDict(headers)
+        response.headers.update({key: value for key, value in not_modified.headers.items() if key in ('Date', 'Expires', 'Cache-Control')})
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.elapsed = not_modified.elapsed
+        response.from_cache = True
+        response._content = body
+        response._content_consumed = True
+        return response
+
+    def close(self):
+        self.adapter.close()
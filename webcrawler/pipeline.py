@@ -0,0 +1,109 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+_STOP = object()
+
+
+class Stage:
+
+    def __init__(self, name: str, fn: Callable[[Any], Iterable | None], workers: int = 1, maxsize: int = 64, priority: Callable[[Any], float] = None, idle_timeout: Callable[[], float | None] = None, on_idle: Callable[[], Any] = None):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.priority = priority
+        self.idle_timeout = idle_timeout
+        self.on_idle = on_idle
+        self.queue = queue.PriorityQueue(maxsize)
+        self.processed = 0
+        self.emitted = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self._active = self.workers
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<Pipeline stage: {self.name} x{self.workers}>'
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {'workers': self.workers, 'processed': self.processed, 'emitted': self.emitted, 'errors': self.errors, 'queued': self.queue.qsize(), 'busy': round(self.busy, 3), 'blocked': round(self.blocked, 3)}
+
+
+class Pipeline:
+    _logger = logging.getLogger('Pipeline')
+
+    def __init__(self, *stages: Stage, stop_event: threading.Event = None):
+        self.stages = stages
+        self.stop_event = stop_event or threading.Event()
+        self._counter = itertools.count()
+
+    def __repr__(self):
+        return f'<Pipeline: {" -> ".join(f"{stage.name} x{stage.workers}" for stage in self.stages)}>'
+
+    @property
+    def stats(self) -> dict:
+        return {stage.name: stage.stats for stage in self.stages}
+
+    def _put(self, stage: Stage, item):
+        stage.queue.put((stage.priority(item) if stage.priority else 0, next(self._counter), item))
+
+    def _close(self, stage: Stage):
+        for _ in range(stage.workers):
+            stage.queue.put((float('inf'), next(self._counter), _STOP))
+
+    def _get(self, stage: Stage):
+        while True:
+            try:
+                return stage.queue.get(timeout=stage.idle_timeout() if stage.idle_timeout else None)[2]
+            except queue.Empty:
+                if stage.on_idle: stage.on_idle()
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        following = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        try:
+            while (item := self._get(stage)) is not _STOP:
+                if self.stop_event.is_set(): continue
+                start, blocked, emitted = time.perf_counter(), 0.0, 0
+                try:
+                    for output in stage.fn(item) or ():
+                        emitted += 1
+                        if following:
+                            put_start = time.perf_counter()
+                            self._put(following, output)
+                            blocked += time.perf_counter() - put_start
+                        if self.stop_event.is_set(): break
+                except Exception as E:
+                    with stage._lock:
+                        stage.errors += 1
+                    self._logger.warning(f'Stage {stage.name} failed: {type(E)}:{E.args}: {item.__repr__()}')
+                finally:
+                    with stage._lock:
+                        stage.processed += 1
+                        stage.emitted += emitted
+                        stage.busy += time.perf_counter() - start - blocked
+                        stage.blocked += blocked
+        finally:
+            with stage._lock:
+                stage._active -= 1
+                last = not stage._active
+            if last and following: self._close(following)
+
+    def run(self, items: Iterable):
+        threads = [threading.Thread(target=self._work, args=[index], name=f'{stage.name}-{i}', daemon=True) for index, stage in enumerate(self.stages) for i in range(stage.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for item in items:
+                if self.stop_event.is_set(): break
+                self._put(self.stages[0], item)
+        finally:
+            self._close(self.stages[0])
+            for thread in threads:
+                thread.join()
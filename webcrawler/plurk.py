@@ -1,15 +1,20 @@
+import asyncio
+import collections
+import contextlib
 import datetime
 import logging
-import queue
 import threading
 import time
 import traceback
+from typing import AsyncIterator, Callable, Iterator
 
 import base36
 import dateutil
 import pytz
 import requests
 
+from .ratelimit import AdaptiveTokenBucket, TokenBucket
+
 
 def convert_to_id(b36: str):
     return base36.loads(b36)
@@ -19,6 +24,44 @@ def convert_to_b36(id: int):
     return base36.dumps(int(id))
 
 
+def _paginate(session: requests.Session, api_url: str, api_body: dict, timeout: float, stop_event: threading.Event, page_delay: float, bucket: TokenBucket, logger: logging.Logger, name: str, request_timeout: float = 10) -> Iterator[dict]:
+    if stop_event is None: stop_event = threading.Event()
+    end_time = time.time() + timeout
+    while not stop_event.is_set():
+        if time.time() >= end_time:
+            logger.info(f'Stop {name} after {timeout}s of crawling: {api_url} {api_body}')
+            return
+        if bucket:
+            wait_start = time.time()
+            if not bucket.acquire(stop_event=stop_event): return
+            end_time += time.time() - wait_start
+        try:
+            logger.debug(f'Connect: {api_url} {api_body}')
+            response = session.post(api_url, api_body, timeout=request_timeout)
+        except Exception as E:
+            logger.warning(f'Extract {name} failed: {type(E)}:{E.args}')
+            if isinstance(bucket, AdaptiveTokenBucket): bucket.backoff()
+            else: stop_event.wait(min(page_delay, max(0, end_time - time.time())))
+            continue
+        if 'application/json' not in response.headers['Content-Type']:
+            logger.warning(f'Not a json file: {api_url} {api_body}')
+            if not isinstance(bucket, AdaptiveTokenBucket): return
+            logger.info(f'Back off {bucket.backoff()}s: {api_url}')
+            continue
+        if isinstance(bucket, AdaptiveTokenBucket): bucket.success()
+        yield response.json()
+        if not bucket: stop_event.wait(min(page_delay, max(0, end_time - time.time())))
+
+
+async def _aiterate(iterator: Iterator):
+    try:
+        while (item := await asyncio.to_thread(next, iterator, None)) is not None:
+            yield item
+    finally:
+        with contextlib.suppress(ValueError):
+            iterator.close()
+
+
 class Search:
 
     def __init__(self, query: str = ''):
@@ -26,7 +69,6 @@ class Search:
         self.api_url: str = 'https://www.plurk.com/Search/search2'
         self.api_body: dict = {"query": query}
         self.posts: list[Post] = []
-        self.users: dict[int, User] = {}
         self._logger = logging.getLogger(self.__repr__())
 
     def __repr__(self):
@@ -36,142 +78,92 @@ class Search:
     def url(self):
         return f'https://www.plurk.com/search?q={self.query}'
 
-    def get(self, session: requests.Session, min_count: int = 30, time_until: datetime.datetime | str = None, timeout: float = 35, stop_event: threading.Event = None):
-
-        def load_page():
-            while not stop_event.is_set():
-                try:
-                    self._logger.debug(f'Connect: {self.api_url} {self.api_body}')
-                    response = session.post(self.api_url, self.api_body, timeout=timeout)
-                    if 'application/json' not in response.headers['Content-Type']:
-                        self._logger.warning(f'Not a json file: {self.api_url} {self.api_body}')
-                        stop_event.set()
-                        return
-                except Exception as E:
-                    self._logger.warning(f'Extract search failed: {type(E)}:{E.args}')
-                    continue
-                try:
-                    response_queue.put(response.json())
-                    time.sleep(16)
-                    self.api_body.update({'after_id': next_id.get(timeout=timeout)})
-                except queue.ShutDown:
-                    return
-
-        def read_received():
-            while not stop_event.is_set():
-                time.sleep(0.01)
-                if len(response_queue.queue):
-                    response = response_queue.get()
-                    if response['users']:
-                        for u in response['users'].values():
-                            try:
-                                user = User(u['id'])
-                                user.nickname = u['nick_name']
-                                user.display_name = u['display_name']
-                                user.avatar = u['avatar']
-                                user.premium = u['premium']
-                                if u['date_of_birth']:
-                                    user.birthday = dateutil.parser.parse(u['date_of_birth'])
-                                user.status = u['status']
-                                user.name_color = u['name_color']
-                                user.birthday_privacy = u['bday_privacy']
-                                user.has_profile_image = u['has_profile_image']
-                                user.timeline_privacy = u['timeline_privacy']
-                                user.gender = u['gender']
-                                user.karma = u['karma']
-                                user.verified_account = u['verified_account']
-                                user.dateformat = u['dateformat']
-                                user.default_lang = u['default_lang']
-                                user.friend_list_privacy = u['friend_list_privacy']
-                                user.show_location = u['show_location']
-                                user.full_name = u['full_name']
-                                user.relationship = u['relationship']
-                                user.location = u['location']
-                                user.timezone = u['timezone']
-                                user.email_confirmed = u['email_confirmed']
-                                user.phone_verified = u['phone_verified']
-                                user.pinned_plurk_id = u['pinned_plurk_id']
-                                user.background_id = u['background_id']
-                                user.recruited = u['recruited']
-                                user.show_ads = u['show_ads']
-                                self.users.update({user.id: user})
-                            except Exception as E:
-                                self._logger.warning(f'Extract user failed: {type(E)}:{E.args}')
-                                self._logger.debug(traceback.format_exc())
-                                continue
-                    for p in response['plurks']:
-                        if len(self.posts):
-                            if p['id'] == self.posts[-1].id:
-                                stop_event.set()
-                                return
-                        try:
-                            post = Post(p['id'])
-                            post.query = self.query
-                            post.author = self.users[p['user_id']]
-                            post.qualifier = p['qualifier']
-                            post.content = p['content']
-                            post.content_raw = p['content_raw']
-                            post.lang = p['lang']
-                            post.response_count = p['response_count']
-                            post.responses_seen = p['responses_seen']
-                            post.limited_to = p['limited_to']
-                            post.excluded = p['excluded']
-                            post.no_comments = p['no_comments']
-                            post.plurk_type = p['plurk_type']
-                            post.is_unread = p['is_unread']
-                            post.created_time = dateutil.parser.parse(p['posted'])
-                            if p['last_edited']:
-                                post.modified_time = dateutil.parser.parse(p['last_edited'])
-                            post.coins = p['coins']
-                            post.has_gift = p['has_gift']
-                            post.porn = p['porn']
-                            post.publish_to_followers = p['publish_to_followers']
-                            post.with_poll = p['with_poll']
-                            post.anonymous = p['anonymous']
-                            post.replurkable = p['replurkable']
-                            post.replurker_id = p['replurker_id']
-                            post.replurked = p['replurked']
-                            post.replurkers = [self.users[uid] if uid in self.users else User(uid) for uid in p['replurkers']]
-                            post.replurkers_count = p['replurkers_count']
-                            post.favorers = [self.users[uid] if uid in self.users else User(uid) for uid in p['favorers']]
-                            post.favorite_count = p['favorite_count']
-                            post.mentioned = p['mentioned']
-                            post.responded = p['responded']
-                            post.favorite = p['favorite']
-                            self.posts.append(post)
-                            self._logger.debug(f'Extract post: {post.__repr__()}')
-                        except Exception as E:
-                            self._logger.warning(f'Extract post failed: {type(E)}:{E.args}')
-                            self._logger.debug(traceback.format_exc())
-                            continue
-                    try:
-                        next_id.put(self.posts[-1].id)
-                    except queue.ShutDown:
-                        return
-
-        if stop_event is None: stop_event = threading.Event()
-        end_time = time.time() + timeout
-        if isinstance(time_until, str): time_until = dateutil.parser.parse(time_until)
-        response_queue = queue.Queue()
-        next_id = queue.Queue()
-        threading.Thread(target=load_page).start()
-        threading.Thread(target=read_received).start()
+    def get(self, session: requests.Session, min_count: int = 30, time_until: datetime.datetime | str = None, timeout: float = 35, stop_event: threading.Event = None, page_delay: float = 16, bucket: TokenBucket = None, request_timeout: float = 10):
         try:
-            while time.time() < end_time:
-                time.sleep(0.01)
-                if all([
-                        True if min_count is None else True if len(self.posts) >= min_count else False,
-                        True if time_until is None else False if len(self.posts) == 0 else True if self.posts[-1].created_time.timestamp() <= time_until.timestamp() else False,
-                ]):
-                    return
-                if stop_event.is_set():
-                    return
+            for post in self.stream(session, min_count, time_until, timeout, stop_event, page_delay, bucket, request_timeout):
+                self.posts.append(post)
         finally:
-            stop_event.set()
-            response_queue.shutdown(immediate=True)
-            next_id.shutdown(immediate=True)
             self._logger.debug(f'#Posts: {len(self.posts)}')
 
+    def stream(self, session: requests.Session, min_count: int = None, time_until: datetime.datetime | str = None, timeout: float = 35, stop_event: threading.Event = None, page_delay: float = 16, bucket: TokenBucket = None, request_timeout: float = 10) -> Iterator['Post']:
+        if isinstance(time_until, str): time_until = dateutil.parser.parse(time_until)
+        last_id, count = self.api_body.get('after_id'), 0
+        for page in _paginate(session, self.api_url, self.api_body, timeout, stop_event, page_delay, bucket, self._logger, 'search', request_timeout):
+            posts = self._parse_page(page, last_id)
+            if not posts: return
+            for post in posts:
+                yield post
+                count += 1
+                if self._satisfied(count, post, min_count, time_until): return
+            last_id = posts[-1].id
+            self.api_body.update({'after_id': last_id})
+
+    def astream(self, session: requests.Session, min_count: int = None, time_until: datetime.datetime | str = None, timeout: float = 35, stop_event: threading.Event = None, page_delay: float = 16, bucket: TokenBucket = None, request_timeout: float = 10) -> AsyncIterator['Post']:
+        return _aiterate(self.stream(session, min_count, time_until, timeout, stop_event, page_delay, bucket, request_timeout))
+
+    @staticmethod
+    def _satisfied(count: int, post: 'Post', min_count: int = None, time_until: datetime.datetime = None) -> bool:
+        if min_count is None and time_until is None: return False
+        return all([
+            True if min_count is None else True if count >= min_count else False,
+            True if time_until is None else True if post.created_time.timestamp() <= time_until.timestamp() else False,
+        ])
+
+    def _parse_page(self, response: dict, last_id: int = None) -> list['Post']:
+        users = {}
+        for u in (response['users'] or {}).values():
+            try:
+                user = user_cache.update(u, parse_user)
+                users.update({user.id: user})
+            except Exception as E:
+                self._logger.warning(f'Extract user failed: {type(E)}:{E.args}')
+                self._logger.debug(traceback.format_exc())
+                continue
+        posts = []
+        for p in response['plurks']:
+            if p['id'] == last_id: break
+            try:
+                post = Post(p['id'])
+                post.query = self.query
+                post.author = users[p['user_id']]
+                post.qualifier = p['qualifier']
+                post.content = p['content']
+                post.content_raw = p['content_raw']
+                post.lang = p['lang']
+                post.response_count = p['response_count']
+                post.responses_seen = p['responses_seen']
+                post.limited_to = p['limited_to']
+                post.excluded = p['excluded']
+                post.no_comments = p['no_comments']
+                post.plurk_type = p['plurk_type']
+                post.is_unread = p['is_unread']
+                post.created_time = dateutil.parser.parse(p['posted'])
+                if p['last_edited']:
+                    post.modified_time = dateutil.parser.parse(p['last_edited'])
+                post.coins = p['coins']
+                post.has_gift = p['has_gift']
+                post.porn = p['porn']
+                post.publish_to_followers = p['publish_to_followers']
+                post.with_poll = p['with_poll']
+                post.anonymous = p['anonymous']
+                post.replurkable = p['replurkable']
+                post.replurker_id = p['replurker_id']
+                post.replurked = p['replurked']
+                post.replurkers = [users.get(uid) or user_cache.get(uid) or User(uid) for uid in p['replurkers']]
+                post.replurkers_count = p['replurkers_count']
+                post.favorers = [users.get(uid) or user_cache.get(uid) or User(uid) for uid in p['favorers']]
+                post.favorite_count = p['favorite_count']
+                post.mentioned = p['mentioned']
+                post.responded = p['responded']
+                post.favorite = p['favorite']
+                posts.append(post)
+                self._logger.debug(f'Extract post: {post.__repr__()}')
+            except Exception as E:
+                self._logger.warning(f'Extract post failed: {type(E)}:{E.args}')
+                self._logger.debug(traceback.format_exc())
+                continue
+        return posts
+
 
 class Post:
 
@@ -185,8 +177,9 @@ class Post:
         self.content: str = ''
         self.content_raw: str = ''
         self.query: str = ''
+        self.response_count: int = 0
         self.comments: list[Comment] = []
-        self.users: dict[int, User] = {}
+        self.users: dict[str, User] = {}
         self._logger = logging.getLogger(self.__repr__())
 
     def __repr__(self):
@@ -200,123 +193,72 @@ class Post:
     def url(self):
         return f'https://www.plurk.com/p/{self.b36}'
 
-    def get(self, session: requests.Session, min_count: int = 30, timeout: float = 35, stop_event: threading.Event = None):
-
-        def load_page():
-            while not stop_event.is_set():
-                try:
-                    self._logger.debug(f'Connect: {self.api_url} {self.api_body}')
-                    response = session.post(self.api_url, self.api_body, timeout=timeout)
-                    if response.headers['Content-Type'] != 'application/json':
-                        self._logger.warning(f'Not a json file: {self.api_url} {self.api_body}')
-                        stop_event.set()
-                        return
-                except Exception as E:
-                    self._logger.warning(f'Extract post failed: {type(E)}:{E.args}')
-                    continue
-                try:
-                    response_queue.put(response.json())
-                    time.sleep(16)
-                    self.api_body.update({'from_response_id': next_id.get(timeout=timeout)})
-                except queue.ShutDown:
-                    return
-
-        def read_received():
-            floor = 1
-            while not stop_event.is_set():
-                time.sleep(0.01)
-                if len(response_queue.queue):
-                    response = response_queue.get()
-                    if response['users']:
-                        for u in response['users'].values():
-                            try:
-                                user = User(u['id'])
-                                user.nickname = u['nick_name']
-                                user.display_name = u['display_name']
-                                user.avatar = u['avatar']
-                                user.premium = u['premium']
-                                if u['date_of_birth']:
-                                    user.birthday = dateutil.parser.parse(u['date_of_birth'])
-                                user.status = u['status']
-                                user.name_color = u['name_color']
-                                user.birthday_privacy = u['bday_privacy']
-                                user.has_profile_image = u['has_profile_image']
-                                user.timeline_privacy = u['timeline_privacy']
-                                user.gender = u['gender']
-                                user.karma = u['karma']
-                                user.verified_account = u['verified_account']
-                                user.dateformat = u['dateformat']
-                                user.default_lang = u['default_lang']
-                                user.friend_list_privacy = u['friend_list_privacy']
-                                user.show_location = u['show_location']
-                                self.users.update({user.id: user})
-                            except Exception as E:
-                                self._logger.warning(f'Extract user failed: {type(E)}:{E.args}')
-                                self._logger.debug(traceback.format_exc())
-                                continue
-                    for c in response['responses']:
-                        if len(self.comments):
-                            if c['id'] == self.comments[-1].id:
-                                stop_event.set()
-                                return
-                        try:
-                            comment = Comment(self, c['id'], floor)
-                            if len(response['users']) == 0:
-                                if c['handle'] in self.users:
-                                    comment.author = self.users[c['handle']]
-                                else:
-                                    comment.author = User(99999)
-                                    comment.author.handle = c['handle']
-                                    comment.author.nickname = c['handle']
-                                    self.users.update({comment.author.handle: comment.author})
-                            else:
-                                comment.author = self.users[c['user_id']]
-                            comment.content = c['content']
-                            comment.content_raw = c['content_raw']
-                            comment.qualifier = c['qualifier']
-                            comment.created_time = dateutil.parser.parse(c['posted'])
-                            if c['last_edited']:
-                                comment.modified_time = dateutil.parser.parse(c['last_edited'])
-                            comment.lang = c['lang']
-                            comment.coins = c['coins']
-                            comment.editability = c['editability']
-                            self.comments.append(comment)
-                            self._logger.debug(f'Extract comment: {comment.__repr__()}')
-                        except Exception as E:
-                            self._logger.warning(f'Extract comment failed: {type(E)}:{E.args}')
-                            self._logger.debug(traceback.format_exc())
-                            continue
-                        finally:
-                            floor += 1
-                    try:
-                        if len(self.comments):
-                            next_id.put(self.comments[-1].id)
-                        else:
-                            stop_event.set()
-                            return
-                    except queue.ShutDown:
-                        return
-
-        if stop_event is None: stop_event = threading.Event()
-        end_time = time.time() + timeout
-        response_queue = queue.Queue()
-        next_id = queue.Queue()
-        threading.Thread(target=load_page).start()
-        threading.Thread(target=read_received).start()
+    def get(self, session: requests.Session, min_count: int = 30, timeout: float = 35, stop_event: threading.Event = None, page_delay: float = 16, bucket: TokenBucket = None, request_timeout: float = 10):
         try:
-            while time.time() < end_time:
-                time.sleep(0.01)
-                if all([
-                        True if min_count is None else True if len(self.comments) >= min_count else False,
-                ]):
-                    return
-                if stop_event.is_set():
-                    return
+            for comment in self.stream(session, min_count, timeout, stop_event, page_delay, bucket, request_timeout):
+                self.comments.append(comment)
         finally:
-            stop_event.set()
-            next_id.shutdown(immediate=True)
             self._logger.debug(f'#Comments: {len(self.comments)}')
 
+    def stream(self, session: requests.Session, min_count: int = None, timeout: float = 35, stop_event: threading.Event = None, page_delay: float = 16, bucket: TokenBucket = None, request_timeout: float = 10) -> Iterator['Comment']:
+        last_id, floor, count = self.api_body.get('from_response_id') or None, len(self.comments) + 1, 0
+        for page in _paginate(session, self.api_url, self.api_body, timeout, stop_event, page_delay, bucket, self._logger, 'post', request_timeout):
+            comments, floor = self._parse_page(page, last_id, floor)
+            if not comments: return
+            for comment in comments:
+                yield comment
+                count += 1
+                if min_count is not None and count >= min_count: return
+            last_id = comments[-1].id
+            self.api_body.update({'from_response_id': last_id})
+
+    def astream(self, session: requests.Session, min_count: int = None, timeout: float = 35, stop_event: threading.Event = None, page_delay: float = 16, bucket: TokenBucket = None, request_timeout: float = 10) -> AsyncIterator['Comment']:
+        return _aiterate(self.stream(session, min_count, timeout, stop_event, page_delay, bucket, request_timeout))
+
+    def _parse_page(self, response: dict, last_id: int = None, floor: int = 1) -> tuple[list['Comment'], int]:
+        users = {}
+        for u in (response['users'] or {}).values():
+            try:
+                user = user_cache.update(u, parse_user)
+                users.update({user.id: user})
+            except Exception as E:
+                self._logger.warning(f'Extract user failed: {type(E)}:{E.args}')
+                self._logger.debug(traceback.format_exc())
+                continue
+        comments = []
+        for c in response['responses']:
+            if c['id'] == last_id: break
+            try:
+                comment = Comment(self, c['id'], floor)
+                if len(response['users']) == 0:
+                    if c['handle'] in self.users:
+                        comment.author = self.users[c['handle']]
+                    else:
+                        comment.author = User(99999)
+                        comment.author.handle = c['handle']
+                        comment.author.nickname = c['handle']
+                        self.users.update({comment.author.handle: comment.author})
+                else:
+                    comment.author = users[c['user_id']]
+                comment.content = c['content']
+                comment.content_raw = c['content_raw']
+                comment.qualifier = c['qualifier']
+                comment.created_time = dateutil.parser.parse(c['posted'])
+                if c['last_edited']:
+                    comment.modified_time = dateutil.parser.parse(c['last_edited'])
+                comment.lang = c['lang']
+                comment.coins = c['coins']
+                comment.editability = c['editability']
+                comments.append(comment)
+                self._logger.debug(f'Extract comment: {comment.__repr__()}')
+            except Exception as E:
+                self._logger.warning(f'Extract comment failed: {type(E)}:{E.args}')
+                self._logger.debug(traceback.format_exc())
+                continue
+            finally:
+                floor += 1
+        return comments, floor
+
 
 class Comment:
 
@@ -335,11 +277,92 @@ class Comment:
 
 
 class User:
+    __slots__ = (
+        'id', 'nickname', 'display_name', 'handle', 'avatar', 'premium', 'birthday', 'status', 'name_color', 'birthday_privacy', 'has_profile_image', 'timeline_privacy', 'gender', 'karma', 'verified_account', 'dateformat',
+        'default_lang', 'friend_list_privacy', 'show_location', 'full_name', 'relationship', 'location', 'timezone', 'email_confirmed', 'phone_verified', 'pinned_plurk_id', 'background_id', 'recruited', 'show_ads'
+    )
 
     def __init__(self, id: int = None):
+        for slot in self.__slots__:
+            setattr(self, slot, None)
         self.id: int = id
         self.nickname: str = ''
         self.display_name: str = ''
 
     def __repr__(self):
         return f'<Plurk user: {self.nickname}({self.display_name})>'
+
+
+# Payload keys of plurk users whose User slot has another name; other keys matching a slot are copied as is
+user_keys = {'nick_name': 'nickname', 'date_of_birth': 'birthday', 'bday_privacy': 'birthday_privacy'}
+
+
+def parse_user(user: User, u: dict):
+    for key, value in u.items():
+        slot = user_keys.get(key, key)
+        if slot == 'id' or slot not in User.__slots__: continue
+        if slot == 'birthday': value = dateutil.parser.parse(value) if value else None
+        setattr(user, slot, value)
+
+
+class UserCache:
+    _logger = logging.getLogger('UserCache')
+
+    def __init__(self, max_size: int = 100000, ttl: float = 86400):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+        self.evictions = 0
+        self._users: collections.OrderedDict[int, tuple[User, int, float]] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<Plurk user cache: {len(self._users)}/{self.max_size}>'
+
+    def __len__(self):
+        return len(self._users)
+
+    def get(self, id: int) -> User | None:
+        with self._lock:
+            entry = self._users.get(id)
+            if entry is None: return None
+            if time.monotonic() >= entry[2]:
+                del self._users[id]
+                self.evictions += 1
+                return None
+            self._users.move_to_end(id)
+            return entry[0]
+
+    def update(self, u: dict, parse: Callable[[User, dict], None]) -> User:
+        fingerprint = hash(repr(u))
+        with self._lock:
+            entry = self._users.get(u['id'])
+            if entry and entry[1] == fingerprint and time.monotonic() < entry[2]:
+                self._users.move_to_end(u['id'])
+                self.hits += 1
+                return entry[0]
+        user = entry[0] if entry else User(u['id'])
+        parse(user, u)
+        with self._lock:
+            if entry: self.updates += 1
+            else: self.misses += 1
+            self._users[u['id']] = (user, fingerprint, time.monotonic() + self.ttl)
+            self._users.move_to_end(u['id'])
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+                self.evictions += 1
+        return user
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {'size': len(self._users), 'hits': self.hits, 'misses': self.misses, 'updates': self.updates, 'evictions': self.evictions}
+
+
+user_cache = UserCache()
@@ -0,0 +1,164 @@
+import atexit
+import contextlib
+import logging
+import threading
+import time
+
+from .webdriver import ChromeProcess
+
+
+class PoolEntry:
+
+    def __init__(self, name: str, chromeprocess_kwargs: dict, dedicated: bool = False):
+        self.name = name
+        self.chromeprocess_kwargs = chromeprocess_kwargs
+        self.dedicated = dedicated
+        self.browser: ChromeProcess = None
+        self.started_time = 0.0
+        self.lease_count = 0
+        self.active = 0
+        self.contexts: dict[str, str] = {}
+        self.recycle = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<Pool entry: {self.name}:{self.chromeprocess_kwargs.get("remote_debugging_port")}>'
+
+    def new_tab(self, profile: str):
+        with self._lock:
+            if self.browser is None:
+                self.browser = ChromeProcess(**self.chromeprocess_kwargs)
+                self.started_time = time.time()
+                self.contexts = {}
+            if not self.dedicated and profile not in self.contexts:
+                self.contexts[profile] = self.browser.new_browser_context()
+            browser = self.browser
+        return browser, browser.new_tab(browser_context_id=self.contexts.get(profile))
+
+    def stop(self):
+        with self._lock:
+            if self.browser:
+                self.browser.stop()
+                self.browser = None
+
+
+class BrowserPool:
+    _logger = logging.getLogger('BrowserPool')
+
+    def __init__(self, chromeprocess_kwargs: dict = None, size: int = 1, base_port: int = 9300, max_tabs: int = 4, max_leases: int = 200, max_age: float = 21600, health_check_interval: float = 60):
+        self.chromeprocess_kwargs = chromeprocess_kwargs or {}
+        self.max_tabs = max_tabs
+        self.max_leases = max_leases
+        self.max_age = max_age
+        self.health_check_interval = health_check_interval
+        self._next_port = base_port
+        self._shared = [PoolEntry(f'shared-{i}', self._with_port(self.chromeprocess_kwargs)) for i in range(size)]
+        self._dedicated: dict[str, PoolEntry] = {}
+        self._profiles: dict[str, dict] = {}
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._health_thread = threading.Thread(target=self._health_check, daemon=True)
+        self._health_thread.start()
+        atexit.register(self.stop)
+
+    def __repr__(self):
+        return f'<Browser pool: {len(self._shared)} shared, {len(self._dedicated)} dedicated>'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def add_profile(self, name: str, **chromeprocess_kwargs):
+        with self._condition:
+            self._profiles[name] = chromeprocess_kwargs
+            if chromeprocess_kwargs.get('user_data_dir'):
+                kwargs = self.chromeprocess_kwargs | chromeprocess_kwargs
+                kwargs.pop('remote_debugging_port', None)
+                self._dedicated[name] = PoolEntry(name, self._with_port(kwargs), dedicated=True)
+        self._logger.debug(f'Add profile: {name}: {"dedicated" if name in self._dedicated else "shared"}')
+
+    @contextlib.contextmanager
+    def lease(self, profile: str = 'default', timeout: float = None):
+        entry = self._acquire(profile, timeout)
+        browser, tab = None, None
+        try:
+            browser, tab = entry.new_tab(profile)
+            self._logger.debug(f'Lease {entry.__repr__()} to {profile}')
+            yield tab
+        finally:
+            if tab:
+                browser.close_tab(tab)
+            self._release(entry)
+
+    @property
+    def stats(self) -> dict:
+        with self._condition:
+            return {entry.name: {'running': entry.browser is not None, 'active': entry.active, 'leases': entry.lease_count, 'age': time.time() - entry.started_time if entry.browser else 0} for entry in (*self._shared, *self._dedicated.values())}
+
+    def stop(self):
+        self._stop_event.set()
+        with self._condition:
+            entries = (*self._shared, *self._dedicated.values())
+        for entry in entries:
+            entry.stop()
+
+    def _with_port(self, chromeprocess_kwargs: dict) -> dict:
+        kwargs = chromeprocess_kwargs.copy()
+        kwargs['remote_debugging_port'] = self._next_port
+        self._next_port += 1
+        return kwargs
+
+    def _acquire(self, profile: str, timeout: float = None) -> PoolEntry:
+        end_time = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while True:
+                if profile in self._dedicated:
+                    candidates = [self._dedicated[profile]]
+                else:
+                    candidates = self._shared
+                candidates = [entry for entry in candidates if entry.active < self.max_tabs and not entry.recycle]
+                if candidates:
+                    entry = min(candidates, key=lambda entry: entry.active)
+                    entry.active += 1
+                    entry.lease_count += 1
+                    return entry
+                if end_time is None:
+                    self._condition.wait()
+                elif not self._condition.wait(end_time - time.time()):
+                    raise TimeoutError(f'No browser available for {profile}')
+
+    def _release(self, entry: PoolEntry):
+        with self._condition:
+            entry.active -= 1
+            if (self.max_leases and entry.lease_count >= self.max_leases) or (self.max_age and entry.browser and time.time() - entry.started_time >= self.max_age):
+                entry.recycle = True
+            recycle = entry.recycle and entry.active == 0
+        if recycle:
+            self._recycle(entry)
+        with self._condition:
+            self._condition.notify_all()
+
+    def _recycle(self, entry: PoolEntry):
+        self._logger.info(f'Recycle {entry.__repr__()}')
+        entry.stop()
+        with self._condition:
+            entry.recycle = False
+            entry.lease_count = 0
+            self._condition.notify_all()
+
+    def _health_check(self):
+        while not self._stop_event.wait(self.health_check_interval):
+            with self._condition:
+                entries = [entry for entry in (*self._shared, *self._dedicated.values()) if entry.browser and not entry.recycle]
+                for entry in entries:
+                    entry.active += 1
+            for entry in entries:
+                try:
+                    if not entry.browser.is_alive():
+                        self._logger.warning(f'Health check failed: {entry.__repr__()}')
+                        with self._condition:
+                            entry.recycle = True
+                finally:
+                    self._release(entry)
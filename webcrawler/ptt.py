@@ -1,14 +1,150 @@
+import collections
 import datetime
 import logging
 import re
+import threading
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import dateutil
 import pytz
 import requests
 from bs4 import BeautifulSoup
 
+from .http2 import HTTP2Adapter
+from .ratelimit import HostLimiter
+
+
+def new_session(pool_maxsize: int = 8, http2: bool = False) -> requests.Session:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize)
+    session.mount('https://', HTTP2Adapter(pool_maxsize) if http2 else adapter)
+    session.mount('http://', adapter)
+    session.headers.update({"Cookie": "over18=1"})
+    return session
+
+
+class BeautifulSoupParser:
+
+    def parse_index(self, html: str) -> tuple[list[tuple], str]:
+        response = BeautifulSoup(html, features="html.parser")
+        entries = []
+        for p in response.select('div.r-list-container > div'):
+            kind = (p.get('class') or [''])[0]
+            if kind == 'search-bar':
+                continue
+            elif kind == 'r-list-sep':
+                break
+            elif kind == 'r-ent':
+                links = p.select('div.title a')
+                if len(links) == 0: continue
+                authors, reactions = p.select('div.author'), p.select('div.nrec')
+                entries.append((links[0].get('href'), links[0].text, authors[0].text if authors else None, reactions[0].text if reactions else None))
+        paging = response.select('div#action-bar-container > div.action-bar > div.btn-group-paging')
+        previous = paging[0].find('a', string='‹ 上頁') if paging else None
+        return entries, previous.get('href') if previous else None
+
+    def parse_article(self, html: str) -> tuple[list[str], str, list[tuple]]:
+        response = BeautifulSoup(html, features="html.parser")
+        meta = [next((span.text for span in header.select('span.article-meta-value')), None) for header in response.select('div#main-content > div.article-metaline')]
+        main = response.select('div#main-content')
+        pushes = [tuple(next((span.text for span in c.select(f'span.{name}')), None) for name in ('push-tag', 'push-userid', 'push-content', 'push-ipdatetime')) for c in response.select('div#main-content > div.push')]
+        return meta, main[0].text if main else None, pushes
+
+
+class LxmlParser:
+
+    def __init__(self):
+        from lxml import etree, html
+        self._html = html
+
+        def has_class(name: str) -> str:
+            return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+        self._entries = etree.XPath(f'//div[{has_class("r-list-container")}]/div')
+        self._title = etree.XPath(f'.//div[{has_class("title")}]//a')
+        self._author = etree.XPath(f'.//div[{has_class("author")}]')
+        self._reaction = etree.XPath(f'.//div[{has_class("nrec")}]')
+        self._previous = etree.XPath(f'//div[@id="action-bar-container"]/div[{has_class("action-bar")}]/div[{has_class("btn-group-paging")}][1]//a[text()="‹ 上頁"]')
+        self._main = etree.XPath('//div[@id="main-content"]')
+        self._meta = etree.XPath(f'//div[@id="main-content"]/div[{has_class("article-metaline")}]')
+        self._meta_value = etree.XPath(f'.//span[{has_class("article-meta-value")}]')
+        self._pushes = etree.XPath(f'//div[@id="main-content"]/div[{has_class("push")}]')
+        self._push_fields = [etree.XPath(f'.//span[{has_class(name)}]') for name in ('push-tag', 'push-userid', 'push-content', 'push-ipdatetime')]
+
+    def parse_index(self, html: str) -> tuple[list[tuple], str]:
+        response = self._html.document_fromstring(html)
+        entries = []
+        for p in self._entries(response):
+            kind = (p.get('class') or '').split(' ')[0]
+            if kind == 'search-bar':
+                continue
+            elif kind == 'r-list-sep':
+                break
+            elif kind == 'r-ent':
+                links = self._title(p)
+                if len(links) == 0: continue
+                authors, reactions = self._author(p), self._reaction(p)
+                entries.append((links[0].get('href'), links[0].text_content(), authors[0].text_content() if authors else None, reactions[0].text_content() if reactions else None))
+        previous = self._previous(response)
+        return entries, previous[0].get('href') if previous else None
+
+    def parse_article(self, html: str) -> tuple[list[str], str, list[tuple]]:
+        response = self._html.document_fromstring(html)
+        meta = [next((span.text_content() for span in self._meta_value(header)), None) for header in self._meta(response)]
+        main = self._main(response)
+        pushes = [tuple(next((span.text_content() for span in field(c)), None) for field in self._push_fields) for c in self._pushes(response)]
+        return meta, main[0].text_content() if main else None, pushes
+
+
+class SelectolaxParser:
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._html = LexborHTMLParser
+
+    def parse_index(self, html: str) -> tuple[list[tuple], str]:
+        response = self._html(html)
+        entries = []
+        for p in response.css('div.r-list-container > div'):
+            kind = (p.attributes.get('class') or '').split(' ')[0]
+            if kind == 'search-bar':
+                continue
+            elif kind == 'r-list-sep':
+                break
+            elif kind == 'r-ent':
+                link = p.css_first('div.title a')
+                if link is None: continue
+                author, reaction = p.css_first('div.author'), p.css_first('div.nrec')
+                entries.append((link.attributes.get('href'), link.text(), author.text() if author else None, reaction.text() if reaction else None))
+        paging = response.css_first('div#action-bar-container > div.action-bar > div.btn-group-paging')
+        previous = next((a for a in paging.css('a') if a.text() == '‹ 上頁'), None) if paging else None
+        return entries, previous.attributes.get('href') if previous else None
+
+    def parse_article(self, html: str) -> tuple[list[str], str, list[tuple]]:
+        response = self._html(html)
+        meta = [(lambda span: span.text() if span else None)(header.css_first('span.article-meta-value')) for header in response.css('div#main-content > div.article-metaline')]
+        main = response.css_first('div#main-content')
+        pushes = [tuple((lambda span: span.text() if span else None)(c.css_first(f'span.{name}')) for name in ('push-tag', 'push-userid', 'push-content', 'push-ipdatetime')) for c in response.css('div#main-content > div.push')]
+        return meta, main.text() if main else None, pushes
+
+
+parsers = {'bs4': BeautifulSoupParser, 'lxml': LxmlParser, 'selectolax': SelectolaxParser}
+_parsers = {}
+
+
+def get_parser(name: str = 'bs4'):
+    if name not in _parsers:
+        _parsers[name] = parsers[name]()
+    return _parsers[name]
+
+
+# Parsed index pages by (parser, url, validator), reused when the HTTP cache answers an index page unchanged
+max_parsed_indexes = 1000
+_parsed_indexes: collections.OrderedDict[tuple[str, str, str], tuple[list, str]] = collections.OrderedDict()
+_parsed_indexes_lock = threading.Lock()
+
 
 class Forum:
 
@@ -24,56 +160,110 @@ class Forum:
     def url(self):
         return f'https://www.ptt.cc/bbs/{self.name}/index.html'
 
-    def get(self, session: requests.Session, min_count: int = 10, timeout: float = 30, start_page: int = None):
+    def get(self, session: requests.Session, min_count: int = 10, timeout: float = 30, start_page: int = None, parser: str = 'bs4', time_until: datetime.datetime | str = None, backfill: bool = False, workers: int = 4, limiter: HostLimiter = None):
+        if isinstance(time_until, str): time_until = dateutil.parser.parse(time_until)
+        if time_until and time_until.tzinfo is None: time_until = time_until.replace(tzinfo=pytz.timezone('Asia/Taipei'))
+        if backfill and time_until:
+            return self.backfill(session, time_until, timeout=timeout, parser=parser, workers=workers, limiter=limiter)
         url = f'https://www.ptt.cc/bbs/{self.name}/index{start_page}.html' if start_page else f'https://www.ptt.cc/bbs/{self.name}/index.html'
         session.headers.update({"Cookie": "over18=1"})
         end_time = time.time() + timeout
-        while (time.time() < end_time) and (len(self.posts) < min_count):
+        while time.time() < end_time:
+            if all([
+                    True if min_count is None else True if len(self.posts) >= min_count else False,
+                    True if time_until is None else False if len(self.posts) == 0 else True if (self.posts[-1].id_time or time_until) <= time_until else False,
+            ]):
+                break
             try:
                 self._logger.debug(f'Connect: {url}')
-                response = BeautifulSoup(session.get(url, timeout=timeout).text, features="html.parser")
+                posts, next_url = self._get_page(session, url, timeout, parser)
             except Exception as E:
                 self._logger.warning(f'Extract forum failed: {type(E)}:{E.args}')
                 continue
-            posts = []
-            for p in response.select('div.r-list-container > div'):
-                try:
-                    if p.get('class')[0] == 'search-bar':
-                        continue
-                    elif p.get('class')[0] == 'r-list-sep':
-                        break
-                    elif p.get('class')[0] == 'r-ent':
-                        if len(p.select('div.title a')) == 0: continue
-                        post = Post(self, p.select('div.title a')[0].get('href').rstrip('.html').split('/')[-1])
-                        post.author.id = p.select('div.author')[0].text
-                        post.title = p.select('div.title a')[0].text
-                        post.content = None
-                        reaction_count = p.select('div.nrec')[0].text
-                        if reaction_count:
-                            if reaction_count == '爆':
-                                reaction_count = 100
-                            elif reaction_count == 'XX':
-                                reaction_count = -10
-                            elif 'X' in reaction_count:
-                                reaction_count = reaction_count.replace('X', '-')
-                        else:
-                            reaction_count = 0
-                        post.reaction_count = int(reaction_count)
-                        posts.append(post)
-                        self._logger.debug(f'Extract post: {post.__repr__()}')
-                except Exception as E:
-                    self._logger.warning(f'Extract post failed: {type(E)}:{E.args}')
-                    self._logger.debug(traceback.format_exc())
-                    continue
-            self.posts.extend(posts[::-1])
-            next_url = response.select('div#action-bar-container > div.action-bar > div.btn-group-paging')[0].find('a', string='‹ 上頁').get('href')
+            self.posts.extend(posts)
             if next_url:
                 url = f'https://www.ptt.cc{next_url}'
                 time.sleep(5)
             else:
                 return
-        else:
-            self._logger.debug(f'#Posts: {len(self.posts)}')
+        self._logger.debug(f'#Posts: {len(self.posts)}')
+
+    def backfill(self, session: requests.Session, time_until: datetime.datetime | str, timeout: float = 30, parser: str = 'bs4', workers: int = 4, limiter: HostLimiter = None) -> list['Post']:
+        if isinstance(time_until, str): time_until = dateutil.parser.parse(time_until)
+        if time_until.tzinfo is None: time_until = time_until.replace(tzinfo=pytz.timezone('Asia/Taipei'))
+        session.headers.update({"Cookie": "over18=1"})
+        limiter = limiter or HostLimiter(workers, 1)
+
+        def get_page(page: int) -> list[Post]:
+            with limiter.limit(self.url):
+                self._logger.debug(f'Connect: index{page}.html')
+                return self._get_page(session, f'https://www.ptt.cc/bbs/{self.name}/index{page}.html', timeout, parser)[0]
+
+        with limiter.limit(self.url):
+            latest_posts, next_url = self._get_page(session, self.url, timeout, parser)
+        last_page = int(re.search(r'index(\d+)\.html', next_url).group(1)) + 1 if next_url else 1
+        pages = {last_page: latest_posts}
+        low, high = 1, last_page
+        while low < high:
+            middle = (low + high) // 2
+            pages[middle] = get_page(middle)
+            times = [post.id_time for post in pages[middle] if post.id_time]
+            if times and max(times) >= time_until:
+                high = middle
+            else:
+                low = middle + 1
+        self._logger.info(f'Backfill {self.__repr__()} until {time_until}: index{low}.html - index{last_page}.html')
+        pages = {page: posts for page, posts in pages.items() if page >= low}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(get_page, page): page for page in range(low, last_page) if page not in pages}
+            for future in as_completed(futures):
+                try:
+                    pages[futures[future]] = future.result()
+                except Exception as E:
+                    self._logger.warning(f'Extract forum failed: {type(E)}:{E.args}: index{futures[future]}.html')
+        for page in sorted(pages, reverse=True):
+            self.posts.extend(post for post in pages[page] if post.id_time is None or post.id_time >= time_until)
+        self._logger.debug(f'#Posts: {len(self.posts)}')
+        return self.posts
+
+    def _get_page(self, session: requests.Session, url: str, timeout: float = 30, parser: str = 'bs4') -> tuple[list['Post'], str]:
+        response = session.get(url, timeout=timeout)
+        key = (parser, url, response.headers.get('ETag') or response.headers.get('Last-Modified'))
+        with _parsed_indexes_lock:
+            parsed = _parsed_indexes.get(key) if getattr(response, 'from_cache', False) else None
+        if parsed is None:
+            parsed = get_parser(parser).parse_index(response.text)
+            if key[2]:
+                with _parsed_indexes_lock:
+                    _parsed_indexes[key] = parsed
+                    while len(_parsed_indexes) > max_parsed_indexes:
+                        _parsed_indexes.popitem(last=False)
+        entries, next_url = parsed
+        posts = []
+        for href, title, author, reaction_count in entries:
+            try:
+                if None in (author, reaction_count): raise ValueError(f'Incomplete entry: {href}')
+                post = Post(self, href.rstrip('.html').split('/')[-1])
+                post.author.id = author
+                post.title = title
+                post.content = None
+                if reaction_count:
+                    if reaction_count == '爆':
+                        reaction_count = 100
+                    elif reaction_count == 'XX':
+                        reaction_count = -10
+                    elif 'X' in reaction_count:
+                        reaction_count = reaction_count.replace('X', '-')
+                else:
+                    reaction_count = 0
+                post.reaction_count = int(reaction_count)
+                posts.append(post)
+                self._logger.debug(f'Extract post: {post.__repr__()}')
+            except Exception as E:
+                self._logger.warning(f'Extract post failed: {type(E)}:{E.args}')
+                self._logger.debug(traceback.format_exc())
+                continue
+        return posts[::-1], next_url
 
 
 class Post:
@@ -86,6 +276,9 @@ class Post:
         self.title: str = ''
         self.content: str = ''
         self.comments: list[Post] = []
+        self.etag: str = ''
+        self.content_length: int = 0
+        self.last_floor: int = 0
         self._logger = logging.getLogger(self.__repr__())
 
     def __repr__(self):
@@ -95,28 +288,54 @@ class Post:
     def url(self):
         return f'https://www.ptt.cc/bbs/{self.forum.name}/{self.id}.html'
 
-    def get(self, session: requests.Session, timeout: float = 10):
+    @property
+    def id_time(self) -> datetime.datetime:
+        match = re.match(r'[MG]\.(\d+)\.A\.', self.id)
+        return datetime.datetime.fromtimestamp(int(match.group(1)), tz=pytz.UTC) if match else None
+
+    def get(self, session: requests.Session, timeout: float = 10, parser: str = 'bs4') -> bool:
         session.headers.update({"Cookie": "over18=1"})
         self._logger.debug(f'Connect: {self.url}')
-        response = BeautifulSoup(session.get(self.url, timeout=timeout).text, features="html.parser")
-        header = response.select('div#main-content > div.article-metaline')
-        self.author.id, self.author.name = header[0].select('span.article-meta-value')[0].text.split(' ', maxsplit=1)
+        with session.get(self.url, timeout=timeout, headers={'If-None-Match': self.etag} if self.etag else None, stream=True) as response:
+            etag = response.headers.get('ETag', '')
+            if response.status_code == 304 or getattr(response, 'from_cache', False) or (etag and etag == self.etag):
+                self._logger.debug(f'Not modified: {self.url}')
+                return False
+            response.raise_for_status()
+            html = response.text
+        content_length = len(response.content)
+        if content_length == self.content_length:
+            self._logger.debug(f'Not modified: {self.url}')
+            return False
+        self._parse(html, parser, self.last_floor)
+        self.etag, self.content_length = etag, content_length
+        if self.comments: self.last_floor = self.comments[-1].floor
+        return True
+
+    def _parse(self, html: str, parser: str = 'bs4', last_floor: int = 0):
+        header, text, pushes = get_parser(parser).parse_article(html)
+        self.author.id, self.author.name = header[0].split(' ', maxsplit=1)
         self.author.name = self.author.name[1:-1]
-        self.title = header[1].select('span.article-meta-value')[0].text
-        self.time = dateutil.parser.parse(header[2].select('span.article-meta-value')[0].text + ' +08:00')
-        text = response.select('div#main-content')[0].text
+        self.title = header[1]
+        self.time = dateutil.parser.parse(header[2] + ' +08:00')
         self.content = text.split('\n', maxsplit=1)[1].split('\n\n--\n※ 發信站: 批踢踢實業坊(ptt.cc)', maxsplit=1)[0]
         location = re.search(r'※ 發信站: 批踢踢實業坊\(ptt\.cc\), 來自: (.+) \((.+)\)\s※ 文章網址', text)
         if location:
             self.ip, self.country = location.groups()
         last_comment_year, last_comment_month = self.time.year, self.time.month
-        for floor, c in enumerate(response.select('div#main-content > div.push'), 1):
+        for floor, (reaction, author_id, content, month_day) in enumerate(pushes, 1):
+            if floor <= last_floor:
+                if month_day and month_day.strip()[:2].isdigit():
+                    if int(month_day.strip()[:2]) < last_comment_month: last_comment_year += 1
+                    last_comment_month = int(month_day.strip()[:2])
+                continue
             try:
+                if None in (reaction, author_id, content, month_day): raise ValueError(f'Incomplete push: b{floor}')
                 comment = Comment(self.forum, self, floor)
-                comment.reaction = c.select('span.push-tag')[0].text.strip()
-                comment.author.id = c.select('span.push-userid')[0].text
-                comment.content = c.select('span.push-content')[0].text.lstrip(': ')
-                month_day = c.select('span.push-ipdatetime')[0].text.strip()
+                comment.reaction = reaction.strip()
+                comment.author.id = author_id
+                comment.content = content.lstrip(': ')
+                month_day = month_day.strip()
                 if int(month_day[:2]) < last_comment_month: last_comment_year += 1
                 comment.time = dateutil.parser.parse(f'{last_comment_year}/{month_day} +08:00')
                 last_comment_month = comment.time.month
@@ -0,0 +1,106 @@
+import contextlib
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<TokenBucket: {self.rate}/s>'
+
+    @classmethod
+    def from_interval(cls, interval: float, capacity: float = 1):
+        return cls(1 / interval if interval else float('inf'), capacity)
+
+    def acquire(self, tokens: float = 1, timeout: float = None, stop_event: threading.Event = None) -> bool:
+        if self.rate == float('inf'): return True
+        end_time = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if end_time is not None:
+                if now >= end_time: return False
+                wait = min(wait, end_time - now)
+            if stop_event is None: time.sleep(wait)
+            elif stop_event.wait(wait): return False
+
+
+class AdaptiveTokenBucket(TokenBucket):
+
+    def __init__(self, rate: float, capacity: float = 1, min_backoff: float = 16, max_backoff: float = 600):
+        super().__init__(rate, capacity)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self._paused_until = 0.0
+
+    def __repr__(self):
+        return f'<AdaptiveTokenBucket: {self.rate}/s, {self.failures} failures>'
+
+    def backoff(self) -> float:
+        with self._lock:
+            delay = min(self.max_backoff, self.min_backoff * 2 ** self.failures)
+            self.failures += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._tokens = 0
+            self._updated = time.monotonic()
+        return delay
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+
+    def acquire(self, tokens: float = 1, timeout: float = None, stop_event: threading.Event = None) -> bool:
+        end_time = None if timeout is None else time.monotonic() + timeout
+        while (wait := self._paused_until - time.monotonic()) > 0:
+            if end_time is not None:
+                if time.monotonic() >= end_time: return False
+                wait = min(wait, end_time - time.monotonic())
+            if stop_event is None: time.sleep(wait)
+            elif stop_event.wait(wait): return False
+        return super().acquire(tokens, None if end_time is None else max(0, end_time - time.monotonic()), stop_event)
+
+
+class HostLimiter:
+
+    def __init__(self, concurrency: int = 4, rate: float = float('inf'), capacity: float = 1):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.capacity = capacity
+        self._hosts: dict[str, tuple[threading.BoundedSemaphore, TokenBucket]] = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<HostLimiter: {self.concurrency} concurrent, {self.rate}/s per host>'
+
+    def _get(self, host: str) -> tuple[threading.BoundedSemaphore, TokenBucket]:
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (threading.BoundedSemaphore(self.concurrency), TokenBucket(self.rate, self.capacity))
+            return self._hosts[host]
+
+    @contextlib.contextmanager
+    def limit(self, url: str, timeout: float = None, stop_event: threading.Event = None):
+        semaphore, bucket = self._get(urlsplit(url).netloc)
+        if not semaphore.acquire(timeout=timeout):
+            raise TimeoutError(f'Host busy: {url}')
+        try:
+            if not bucket.acquire(timeout=timeout, stop_event=stop_event):
+                raise TimeoutError(f'Host rate limited: {url}')
+            yield
+        finally:
+            semaphore.release()
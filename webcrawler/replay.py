@@ -0,0 +1,138 @@
+import gzip
+import json
+import logging
+import queue
+import threading
+import time
+
+from .webdriver import CDP
+
+
+class ReplayWebSocket:
+    _logger = logging.getLogger('ReplayWebSocket')
+
+    def __init__(self, path: str, speed: float = None):
+        self.path = path
+        self.speed = speed
+        self.events: list[tuple[float, str]] = []
+        self.bodies: dict[str, dict] = {}
+        self.finished = threading.Event()
+        self._inbox = queue.Queue()
+        self._started = threading.Event()
+        self._closed = threading.Event()
+        self._load()
+        self._feed_thread = threading.Thread(target=self._feed, daemon=True)
+        self._feed_thread.start()
+
+    def __repr__(self):
+        return f'<Replay websocket: {self.path}>'
+
+    def _load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if 'body' in record:
+                    self.bodies[record['body'][1]] = record['result']
+                    continue
+                message = record['m']
+                message.pop('sessionId', None)
+                self.events.append((record['t'], json.dumps(message)))
+        self._logger.debug(f'Load {len(self.events)} events, {len(self.bodies)} bodies: {self.path}')
+
+    def play(self):
+        self._started.set()
+
+    def _feed(self):
+        self._started.wait()
+        start_time = time.time()
+        first_time = self.events[0][0] if self.events else 0
+        for t, message in self.events:
+            if self._closed.is_set(): return
+            if self.speed:
+                wait = (t - first_time) / self.speed - (time.time() - start_time)
+                if wait > 0 and self._closed.wait(wait): return
+            self._inbox.put(message)
+        self.finished.set()
+
+    def send(self, payload: str):
+        message = json.loads(payload)
+        method, params = message['method'], message['params']
+        if method == 'Network.getResponseBody':
+            result = self.bodies.get(params['requestId'])
+            reply = {'id': message['id'], 'result': result} if result else {'id': message['id'], 'error': {'code': -32000, 'message': 'No resource with given identifier found'}}
+        elif method == 'Runtime.evaluate':
+            reply = {'id': message['id'], 'result': {'result': {'type': 'undefined'}}}
+        else:
+            reply = {'id': message['id'], 'result': {}}
+        if 'sessionId' in message: reply['sessionId'] = message['sessionId']
+        self._inbox.put(json.dumps(reply))
+        if method == 'Page.navigate': self.play()
+
+    def recv(self):
+        message = self._inbox.get()
+        if message is None:
+            raise ConnectionError('Replay websocket closed')
+        return message
+
+    def close(self):
+        self._closed.set()
+        self._started.set()
+        self._inbox.put(None)
+
+
+class ReplayCDP(CDP):
+    _logger = logging.getLogger('ReplayCDP')
+
+    def __init__(self, path: str, speed: float = None, **cdp_kwargs):
+        self.path = path
+        self.speed = speed
+        super().__init__(**cdp_kwargs)
+
+    def __repr__(self):
+        return f'<Replay CDP: {self.path}>'
+
+    def _connect(self, timeout: float = 10):
+        self.websocket_url = self.path
+        return ReplayWebSocket(self.path, self.speed)
+
+    def play(self):
+        self.websocket.play()
+
+    def wait_finished(self, timeout: float = None) -> bool:
+        return self.websocket.finished.wait(timeout)
+
+
+class ReplayBrowser:
+    _logger = logging.getLogger('ReplayBrowser')
+
+    def __init__(self, path: str, speed: float = None, window_size: tuple = (1280, 720), cdp_kwargs: dict = None):
+        self.window_size = window_size
+        self.cdp = ReplayCDP(path, speed, **(cdp_kwargs or {}))
+
+    def __repr__(self):
+        return f'<Replay browser: {self.cdp.path}>'
+
+    @property
+    def page_source(self) -> str:
+        return self.cdp.page_source
+
+    def get(self, url: str, blocking: bool = False, timeout: float = 10, **params):
+        self.cdp.get(url, blocking=blocking, timeout=timeout, **params)
+
+    def scroll(self, x: int, y: int, x_distance: int = 0, y_distance: int = 0, speed: int = 800, count: int = 1, repeat_delay: float = 0.25, *, blocking: bool = True, **params):
+        self.cdp.scroll(x, y, x_distance, y_distance, speed, count, repeat_delay, blocking=blocking, **params)
+
+    def clear_cache(self):
+        self.cdp.clear_cache()
+
+    def clear_cookies(self):
+        self.cdp.clear_cookies()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def stop(self):
+        self.cdp.stop()
@@ -1,13 +1,18 @@
 import atexit
+import gzip
 import json
 import logging
+import queue
 import random
 import re
 import subprocess
 import threading
 import time
 import uuid
-from collections import defaultdict
+from urllib.parse import urlsplit
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 import requests
 import websocket
@@ -29,6 +34,7 @@ class ChromeDriver(webdriver.Chrome):
             service_kwargs: dict = None,
             chrome_options: list = None,
             experimental_options: dict = None,
+            cdp_kwargs: dict = None,
     ):
         self.window_size = window_size
         service_kwargs = service_kwargs or {},
@@ -55,7 +61,7 @@ class ChromeDriver(webdriver.Chrome):
         super().__init__(options=self.options, service=self.service)
         self._logger.debug(f'ChromeDriver process: {" ".join(self.service.process.args)}')
         if remote_debugging_port:
-            self.cdp = CDP(remote_debugging_port=remote_debugging_port)
+            self.cdp = CDP(remote_debugging_port=remote_debugging_port, **(cdp_kwargs or {}))
             self.cdp.send('Network.enable')
         atexit.register(self.stop)
 
@@ -92,9 +98,18 @@ class ChromeProcess:
             log_level: int = 3,
             chrome_options: list = None,
             use_exist: bool = False,
+            cdp_kwargs: dict = None,
     ):
         self.use_exist = use_exist
         self.window_size = window_size
+        self.remote_debugging_host = remote_debugging_host
+        self.remote_debugging_port = remote_debugging_port
+        self.cdp_kwargs = cdp_kwargs or {}
+        self.browser_cdp: CDP = None
+        self.browser_context_id: str = None
+        self.blocker: ResourceBlocker = None
+        self.tabs: list[Tab] = []
+        self._lock = threading.Lock()
         chrome_options = chrome_options or []
         self.options = [chrome_path, '--disable-popup-blocking', f'--window-size={self.window_size[0]},{self.window_size[1]}']
         if incognito:
@@ -116,7 +131,7 @@ class ChromeProcess:
             self.process = subprocess.Popen(args=self.options, start_new_session=True)
             self._logger.debug(f'Chrome process: {" ".join(self.process.args)}')
         if remote_debugging_port:
-            self.cdp = CDP(remote_debugging_host=remote_debugging_host, remote_debugging_port=remote_debugging_port)
+            self.cdp = CDP(remote_debugging_host=remote_debugging_host, remote_debugging_port=remote_debugging_port, **self.cdp_kwargs)
             self.cdp.send('Network.enable')
         atexit.register(self.stop)
 
@@ -124,6 +139,44 @@ class ChromeProcess:
     def page_source(self) -> str:
         return self.cdp.page_source
 
+    def is_alive(self, timeout: float = 5) -> bool:
+        if not self.use_exist and self.process.poll() is not None:
+            return False
+        try:
+            return self.cdp.get_received_by_id(self.cdp.send('Runtime.evaluate', expression='1'), timeout=timeout)['result']['result']['value'] == 1
+        except Exception:
+            return False
+
+    def new_browser_context(self) -> str:
+        return self._get_browser_cdp().get_received_by_id(self.browser_cdp.send('Target.createBrowserContext', disposeOnDetach=False))['result']['browserContextId']
+
+    def main_browser_context(self) -> str:
+        with self._lock:
+            if self.browser_context_id is None:
+                self.browser_context_id = self.cdp.get_received_by_id(self.cdp.send('Target.getTargetInfo'))['result']['targetInfo']['browserContextId']
+            return self.browser_context_id
+
+    def new_tab(self, url: str = 'about:blank', new_window: bool = False, browser_context_id: str = None) -> 'Tab':
+        tab = Tab(self._get_browser_cdp(), url, new_window, browser_context_id or self.main_browser_context(), self.window_size)
+        with self._lock:
+            self.tabs.append(tab)
+        return tab
+
+    def _get_browser_cdp(self) -> 'CDP':
+        with self._lock:
+            if self.browser_cdp is None:
+                self.browser_cdp = CDP(remote_debugging_host=self.remote_debugging_host, remote_debugging_port=self.remote_debugging_port, target='browser', **self.cdp_kwargs)
+            return self.browser_cdp
+
+    def open_tabs(self, count: int, **kwargs) -> list['Tab']:
+        return [self.new_tab(**kwargs) for _ in range(count)]
+
+    def close_tab(self, tab: 'Tab'):
+        with self._lock:
+            if tab in self.tabs:
+                self.tabs.remove(tab)
+        tab.stop()
+
     def get(self, url: str, blocking: bool = False, timeout: float = 10, **params):
         self.cdp.get(url, blocking=blocking, timeout=timeout, **params)
 
@@ -136,6 +189,11 @@ class ChromeProcess:
     def clear_cookies(self):
         self.cdp.clear_cookies()
 
+    def block_resources(self, resource_types: list[str] = None, url_patterns: list[str] = None, estimated_bytes: dict = None) -> 'ResourceBlocker':
+        if self.blocker: self.blocker.stop()
+        self.blocker = ResourceBlocker(self.cdp, resource_types, url_patterns, estimated_bytes)
+        return self.blocker
+
     def __enter__(self):
         return self
 
@@ -143,6 +201,12 @@ class ChromeProcess:
         self.stop()
 
     def stop(self):
+        with self._lock:
+            tabs, self.tabs = self.tabs, []
+        for tab in tabs:
+            tab.stop()
+        if self.browser_cdp:
+            self.browser_cdp.stop()
         if hasattr(self, 'cdp'):
             self.cdp.stop()
         if not self.use_exist:
@@ -150,33 +214,464 @@ class ChromeProcess:
                 self.process.terminate()
 
 
+class Tab:
+    _logger = logging.getLogger('Tab')
+
+    def __init__(self, browser_cdp: 'CDP', url: str = 'about:blank', new_window: bool = False, browser_context_id: str = None, window_size: tuple = (1280, 720)):
+        self.window_size = window_size
+        self.browser_context_id = browser_context_id
+        self.blocker: ResourceBlocker = None
+        self._closed = False
+        params = {'url': url, 'newWindow': new_window, 'width': window_size[0], 'height': window_size[1]}
+        if browser_context_id: params['browserContextId'] = browser_context_id
+        target_id = browser_cdp.get_received_by_id(browser_cdp.send('Target.createTarget', **params))['result']['targetId']
+        session_id = browser_cdp.get_received_by_id(browser_cdp.send('Target.attachToTarget', targetId=target_id, flatten=True))['result']['sessionId']
+        self.cdp = CDPSession(browser_cdp, session_id, target_id)
+        self.cdp.send('Network.enable')
+        self.cdp.send('Emulation.setFocusEmulationEnabled', enabled=True)
+        self._logger.debug(f'Open tab: {target_id}')
+
+    def __repr__(self):
+        return f'<Tab: {self.cdp.target_id}>'
+
+    @property
+    def page_source(self) -> str:
+        return self.cdp.page_source
+
+    def get(self, url: str, blocking: bool = False, timeout: float = 10, **params):
+        self.cdp.get(url, blocking=blocking, timeout=timeout, **params)
+
+    def scroll(self, x: int, y: int, x_distance: int = 0, y_distance: int = 0, speed: int = 800, count: int = 1, repeat_delay: float = 0.25, *, blocking: bool = True, **params):
+        self.cdp.scroll(x, y, x_distance, y_distance, speed, count, repeat_delay, blocking=blocking, **params)
+
+    def clear_cache(self):
+        self.cdp.clear_cache()
+
+    def clear_cookies(self):
+        self.cdp.clear_cookies()
+
+    def block_resources(self, resource_types: list[str] = None, url_patterns: list[str] = None, estimated_bytes: dict = None) -> 'ResourceBlocker':
+        if self.blocker: self.blocker.stop()
+        self.blocker = ResourceBlocker(self.cdp, resource_types, url_patterns, estimated_bytes)
+        return self.blocker
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def stop(self):
+        if not self._closed:
+            self._closed = True
+            self.cdp.stop()
+
+
+class ResourceBlocker:
+    _logger = logging.getLogger('ResourceBlocker')
+    estimated_bytes = {'Image': 40000, 'Media': 500000, 'Font': 30000, 'Stylesheet': 20000, 'Script': 40000, 'Other': 5000}
+
+    def __init__(self, cdp: 'CDP', resource_types: list[str] = None, url_patterns: list[str] = None, estimated_bytes: dict = None):
+        self.cdp = cdp
+        self.resource_types = resource_types or []
+        self.url_patterns = url_patterns or []
+        self.estimated_bytes = self.estimated_bytes | (estimated_bytes or {})
+        self._counters = Counter()
+        self._lock = threading.Lock()
+        self._listeners = []
+        if self.resource_types:
+            self._listeners.append(self.cdp.add_listener(self._fail_request, cdp_method='Fetch.requestPaused'))
+            self.cdp.send('Fetch.enable', patterns=[{'urlPattern': '*', 'resourceType': resource_type, 'requestStage': 'Request'} for resource_type in self.resource_types])
+        if self.url_patterns:
+            self._listeners.append(self.cdp.add_listener(self._count_blocked_url, cdp_method='Network.loadingFailed'))
+            self.cdp.send('Network.setBlockedURLs', urls=self.url_patterns)
+        self._logger.debug(f'Block resources: {self.resource_types}: {self.url_patterns}')
+
+    def __repr__(self):
+        return f'<Resource blocker: {self.resource_types}: {self.url_patterns}>'
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'blocked_requests': sum(self._counters.values()),
+                'blocked_by_type': dict(self._counters),
+                'estimated_bytes_saved': sum(self.estimated_bytes.get(resource_type, self.estimated_bytes['Other']) * count for resource_type, count in self._counters.items()),
+            }
+
+    @staticmethod
+    def sum_stats(blockers: list['ResourceBlocker']) -> dict:
+        stats = {'blocked_requests': 0, 'blocked_by_type': Counter(), 'estimated_bytes_saved': 0}
+        for blocker in blockers:
+            blocker_stats = blocker.stats
+            stats['blocked_requests'] += blocker_stats['blocked_requests']
+            stats['blocked_by_type'].update(blocker_stats['blocked_by_type'])
+            stats['estimated_bytes_saved'] += blocker_stats['estimated_bytes_saved']
+        stats['blocked_by_type'] = dict(stats['blocked_by_type'])
+        return stats
+
+    def _count(self, resource_type: str):
+        with self._lock:
+            self._counters[resource_type or 'Other'] += 1
+
+    def _fail_request(self, r: dict):
+        self.cdp.send('Fetch.failRequest', requestId=r['params']['requestId'], errorReason='BlockedByClient')
+        self._count(r['params'].get('resourceType'))
+
+    def _count_blocked_url(self, r: dict):
+        if r['params'].get('blockedReason') == 'inspector' and r['params'].get('type') not in self.resource_types:
+            self._count(r['params'].get('type'))
+
+    def stop(self):
+        for listener in self._listeners:
+            self.cdp.remove_listener(listener)
+        self._listeners = []
+        if self.resource_types: self.cdp.send('Fetch.disable')
+        if self.url_patterns: self.cdp.send('Network.setBlockedURLs', urls=[])
+
+
+class ChallengeDetector:
+    _logger = logging.getLogger('ChallengeDetector')
+    probe = """!!document.querySelector('[src*="challenges.cloudflare.com/turnstile"]') || document.title == 'Just a moment...' || Array.from(document.scripts).some(script => !script.src && script.text.includes('challenges.cloudflare.com/turnstile'))"""
+
+    def __init__(self, cdp: 'CDP', url_contain: str = 'https://challenges.cloudflare.com/turnstile', min_backoff: float = 0.5, max_backoff: float = 8, timeout: float = 5):
+        self.cdp = cdp
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._counters = Counter()
+        self._lock = threading.Lock()
+        self._sightings = 1
+        self._cleared_sightings = 0
+        self._listener = self.cdp.add_listener(self._on_request, cdp_method='Network.requestWillBeSent', url_contain=url_contain)
+
+    def __repr__(self):
+        return f'<Challenge detector: {self.cdp.__repr__()}>'
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {'probes': self._counters['probes'], 'sightings': self._counters['sightings'], 'challenged': self._counters['challenged']}
+
+    def _on_request(self, r: dict):
+        with self._lock:
+            self._sightings += 1
+            self._counters['sightings'] += 1
+
+    def is_challenged(self) -> bool:
+        with self._lock:
+            sightings = self._sightings
+            if sightings == self._cleared_sightings: return False
+            self._counters['probes'] += 1
+        try:
+            challenged = self.cdp.get_received_by_id(self.cdp.send('Runtime.evaluate', expression=self.probe, returnByValue=True), timeout=self.timeout)['result']['result']['value']
+        except Exception as E:
+            self._logger.debug(f'Probe failed: {type(E)}:{E.args}')
+            return False
+        with self._lock:
+            if challenged:
+                self._counters['challenged'] += 1
+            else:
+                self._cleared_sightings = max(self._cleared_sightings, sightings)
+        return challenged
+
+    def wait_cleared(self, timeout: float = None, stop_event: threading.Event = None) -> bool:
+        end_time = None if timeout is None else time.time() + timeout
+        backoff = self.min_backoff
+        while self.is_challenged():
+            self._logger.info(f'Cloudflare challenge, retry in {backoff:.1f}s')
+            wait = backoff * (0.75 + random.random() / 2)
+            if end_time is not None:
+                if time.time() >= end_time: return False
+                wait = min(wait, end_time - time.time())
+            if stop_event is None: time.sleep(wait)
+            elif stop_event.wait(wait): return False
+            backoff = min(backoff * 2, self.max_backoff)
+        return True
+
+    def stop(self):
+        if self._listener:
+            self.cdp.remove_listener(self._listener)
+            self._listener = None
+
+
+class Listener:
+
+    def __init__(self, callback, name: str, cdp_method: str = None, request_id: str = None, resource_type: str = None, url_exact: str = None, url_contain: str = None, url_regex: str = None, status_code: int = None, session_id: str = None):
+        self.callback = callback
+        self.name = name
+        self.session_id = session_id
+        self.cdp_method = cdp_method
+        self.request_id = request_id
+        self.resource_type = resource_type
+        self.status_code = status_code
+        self.url_exact = url_exact
+        self.url_contain = url_contain
+        self.url_regex = re.compile(url_regex) if url_regex else None
+        self._check_url = any((url_exact, url_contain, url_regex))
+        self._pending = 0
+        self._idle = threading.Condition()
+
+    def __repr__(self):
+        return f'<CDP listener: {self.name}>'
+
+    def match(self, response: dict) -> bool:
+        params = response['params']
+        if response['sessionId'] != self.session_id: return False
+        try:
+            if self.cdp_method and response['method'] != self.cdp_method: return False
+            if self.request_id and params['requestId'] != self.request_id: return False
+            if self.resource_type and params['type'] != self.resource_type: return False
+            if self.status_code and params['response']['status'] != self.status_code: return False
+            if self._check_url:
+                url = params['response']['url'] if 'response' in params else params['request']['url'] if 'request' in params else ''
+                if self.url_exact and url != self.url_exact: return False
+                if self.url_contain and self.url_contain not in url: return False
+                if self.url_regex and not self.url_regex.search(url): return False
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def run(self, response: dict):
+        try:
+            self.callback(response)
+        except Exception as E:
+            logging.getLogger('CDP').warning(f'Listener callback failed: {self.name}: {type(E)}:{E.args}')
+        finally:
+            self.release()
+
+    def release(self):
+        with self._idle:
+            self._pending -= 1
+            self._idle.notify_all()
+
+    def join(self, timeout: float = None) -> bool:
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+
+class CDPRecorder:
+    _logger = logging.getLogger('CDPRecorder')
+
+    def __init__(self, path: str, compresslevel: int = 6):
+        self.path = path
+        self.file = gzip.open(path, 'wt', encoding='utf-8', compresslevel=compresslevel)
+        self.start_time = time.time()
+        self.count = 0
+        self._bodies: dict[int, tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        self._logger.debug(f'Record CDP messages: {path}')
+
+    def __repr__(self):
+        return f'<CDP recorder: {self.path}>'
+
+    def expect_body(self, id: int, session_id: str, request_id: str):
+        with self._lock:
+            self._bodies[id] = (session_id, request_id)
+
+    def record(self, data: dict, message: str):
+        with self._lock:
+            if self.file.closed: return
+            t = time.time() - self.start_time
+            if data['id'] is not None:
+                key = self._bodies.pop(data['id'], None)
+                if key is None or 'result' not in data: return
+                self.file.write(json.dumps({'t': round(t, 3), 'body': key, 'result': data['result']}, separators=(',', ':'), ensure_ascii=False) + '\n')
+            else:
+                self.file.write(f'{{"t":{t:.3f},"m":{message}}}\n')
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if not self.file.closed:
+                self.file.close()
+                self._logger.debug(f'Recorded {self.count} CDP messages: {self.path}')
+
+
+class NetworkRequest:
+    graphql_regex = re.compile(r'graphql/[^/]+/(\w+)')
+
+    def __init__(self, session_id: str = None, request_id: str = None):
+        self.session_id = session_id
+        self.request_id = request_id
+        self.time = time.time()
+        self.url = ''
+        self.method = ''
+        self.resource_type = ''
+        self.operation = ''
+        self.status: int = None
+        self.mime_type = ''
+        self.protocol = ''
+        self.from_cache = False
+        self.redirects = 0
+        self.data_size = 0
+        self.encoded_size = 0
+        self.start_time: float = None
+        self.response_time: float = None
+        self.end_time: float = None
+        self.failure = ''
+        self.blocked_reason = ''
+        self.canceled = False
+        self.finished = False
+        self.done = threading.Event()
+
+    def __repr__(self):
+        return f'<Network request: {self.request_id}: {self.status} {self.url}>'
+
+    @property
+    def site(self) -> str:
+        return urlsplit(self.url).netloc
+
+    @property
+    def duration(self) -> float:
+        return self.end_time - self.start_time if self.end_time is not None and self.start_time is not None else None
+
+    @property
+    def ttfb(self) -> float:
+        return self.response_time - self.start_time if self.response_time is not None and self.start_time is not None else None
+
+    def wait(self, timeout: float = None) -> bool:
+        self.done.wait(timeout)
+        return self.finished
+
+    def as_dict(self) -> dict:
+        return {
+            'session_id': self.session_id,
+            'request_id': self.request_id,
+            'url': self.url,
+            'method': self.method,
+            'resource_type': self.resource_type,
+            'operation': self.operation,
+            'status': self.status,
+            'mime_type': self.mime_type,
+            'protocol': self.protocol,
+            'from_cache': self.from_cache,
+            'redirects': self.redirects,
+            'data_size': self.data_size,
+            'encoded_size': self.encoded_size,
+            'ttfb': self.ttfb,
+            'duration': self.duration,
+            'failure': self.failure,
+            'blocked_reason': self.blocked_reason,
+            'canceled': self.canceled,
+            'finished': self.finished,
+        }
+
+    def update(self, method: str, params: dict):
+        if method == 'Network.requestWillBeSent':
+            request = params['request']
+            if 'redirectResponse' in params: self.redirects += 1
+            self.url = request['url']
+            self.method = request.get('method', '')
+            self.resource_type = params.get('type', self.resource_type)
+            if self.start_time is None: self.start_time = params.get('timestamp')
+            operation = request.get('headers', {}).get('x-fb-friendly-name') or self.graphql_regex.search(self.url)
+            self.operation = operation if isinstance(operation, str) else operation.group(1) if operation else ''
+        elif method == 'Network.responseReceived':
+            response = params['response']
+            self.url = self.url or response['url']
+            self.resource_type = params.get('type', self.resource_type)
+            self.status = response.get('status')
+            self.mime_type = response.get('mimeType', '')
+            self.protocol = response.get('protocol', '')
+            self.from_cache = response.get('fromDiskCache', False) or response.get('fromPrefetchCache', False)
+            self.response_time = params.get('timestamp')
+        elif method == 'Network.dataReceived':
+            self.data_size += params.get('dataLength', 0)
+        elif method == 'Network.loadingFinished':
+            self.encoded_size = params.get('encodedDataLength', 0)
+            self.end_time = params.get('timestamp')
+            self.finished = True
+            self.done.set()
+        elif method == 'Network.loadingFailed':
+            self.resource_type = params.get('type', self.resource_type)
+            self.failure = params.get('errorText', '')
+            self.blocked_reason = params.get('blockedReason', '')
+            self.canceled = params.get('canceled', False)
+            self.end_time = params.get('timestamp')
+            self.finished = False
+            self.done.set()
+
+    @staticmethod
+    def aggregate(requests: list['NetworkRequest'], group_by: str = 'site', patterns: list[str] = None) -> dict[str, dict]:
+        patterns = [re.compile(pattern) for pattern in patterns or []]
+
+        def key(request: NetworkRequest) -> str:
+            if group_by == 'pattern':
+                return next((pattern.pattern for pattern in patterns if pattern.search(request.url)), 'other')
+            if group_by == 'url':
+                url = urlsplit(request.url)
+                return f'{url.scheme}://{url.netloc}{url.path}'
+            return getattr(request, group_by)
+
+        stats = {}
+        for request in requests:
+            group = stats.setdefault(key(request), {'requests': 0, 'finished': 0, 'failed': 0, 'encoded_bytes': 0, 'data_bytes': 0, 'total_duration': 0.0, 'max_duration': 0.0, 'total_ttfb': 0.0})
+            group['requests'] += 1
+            group['finished'] += request.finished
+            group['failed'] += bool(request.done.is_set() and not request.finished)
+            group['encoded_bytes'] += request.encoded_size
+            group['data_bytes'] += request.data_size
+            if request.duration is not None:
+                group['total_duration'] += request.duration
+                group['max_duration'] = max(group['max_duration'], request.duration)
+            if request.ttfb is not None:
+                group['total_ttfb'] += request.ttfb
+        for group in stats.values():
+            group['avg_duration'] = group['total_duration'] / group['finished'] if group['finished'] else None
+        return dict(sorted(stats.items(), key=lambda item: item[1]['total_duration'], reverse=True))
+
+
 # https://chromedevtools.github.io/devtools-protocol
 class CDP:
     _logger = logging.getLogger('CDP')
 
-    def __init__(self, remote_debugging_host: str = '127.0.0.1', remote_debugging_port: str = 9222, timeout: float = 10):
+    def __init__(self, remote_debugging_host: str = '127.0.0.1', remote_debugging_port: str = 9222, timeout: float = 10, max_received: int = 10000, max_received_age: float = 600, retain_unmatched: bool = False, callback_workers: int = 8, callback_queue_size: int = 256, target: str = 'page', record_path: str = None):
         self.remote_debugging_host = remote_debugging_host
         self.remote_debugging_port = remote_debugging_port
+        self.target = target
+        self.max_received = max_received
+        self.max_received_age = max_received_age
+        self.retain_unmatched = retain_unmatched
+        self.callback_queue_size = callback_queue_size
+        self.recorder = CDPRecorder(record_path.format(port=remote_debugging_port, target=target, time=int(time.time()))) if record_path else None
+        self.websocket = self._connect(timeout)
+        self.received: deque[dict] = deque()
+        self._received_times: deque[float] = deque()
+        self._used_id = set()
+        self._listeners: dict[str, Listener] = dict()
+        self._dispatch_table: dict[str, dict[str, Listener]] = defaultdict(dict)
+        self._lock = threading.Lock()
+        self._replies: OrderedDict[int, tuple[float, Future]] = OrderedDict()
+        self._requests: OrderedDict[tuple[str, str], NetworkRequest] = OrderedDict()
+        self._tracked: OrderedDict[tuple[str, str], NetworkRequest] = OrderedDict()
+        self._counters = Counter()
+        self._callback_queue = queue.Queue()
+        self._callback_workers = [threading.Thread(target=self._run_callbacks, daemon=True) for _ in range(callback_workers)]
+        for worker in self._callback_workers:
+            worker.start()
+        self._running = True
+        self._recv_thread = threading.Thread(target=self._recv)
+        self._recv_thread.start()
+        atexit.register(self.stop)
+
+    def _connect(self, timeout: float = 10):
         end_time = time.time() + timeout
         with requests.Session() as session:
             while time.time() < end_time:
                 try:
                     time.sleep(0.5)
-                    self.websocket_url = session.get(f'http://{self.remote_debugging_host}:{self.remote_debugging_port}/json').json()[0]['webSocketDebuggerUrl']
+                    if self.target == 'browser':
+                        self.websocket_url = session.get(f'http://{self.remote_debugging_host}:{self.remote_debugging_port}/json/version').json()['webSocketDebuggerUrl']
+                    else:
+                        self.websocket_url = session.get(f'http://{self.remote_debugging_host}:{self.remote_debugging_port}/json').json()[0]['webSocketDebuggerUrl']
                     break
                 except:
                     continue
             else:
                 raise TimeoutError(f'Failed to connect http://{self.remote_debugging_host}:{self.remote_debugging_port}/json')
         self._logger.debug(f'CDP websocket url: {self.websocket_url}')
-        self.websocket = websocket.create_connection(self.websocket_url)
-        self.received = list()
-        self._used_id = set()
-        self._listeners: dict = dict()
-        self._running = True
-        self._recv_thread = threading.Thread(target=self._recv)
-        self._recv_thread.start()
-        atexit.register(self.stop)
+        return websocket.create_connection(self.websocket_url)
 
     @property
     def page_source(self) -> str:
@@ -206,9 +701,16 @@ class CDP:
         if blocking: time.sleep(max(abs(x_distance), abs(y_distance)) / speed * count + repeat_delay * (count - 1))
 
     def send(self, method: str, **params):
-        id = self._generate_cdp_request_id()
-        payload = json.dumps({'id': id, 'method': method, 'params': params})
-        self.websocket.send(payload)
+        return self._send(method, params)
+
+    def _send(self, method: str, params: dict, session_id: str = None):
+        with self._lock:
+            id = self._generate_cdp_request_id()
+            self._replies[id] = (time.time(), Future())
+        payload = {'id': id, 'method': method, 'params': params}
+        if session_id: payload['sessionId'] = session_id
+        if self.recorder and method == 'Network.getResponseBody': self.recorder.expect_body(id, session_id, params['requestId'])
+        self.websocket.send(json.dumps(payload))
         return id
 
     def clear_cache(self):
@@ -217,93 +719,191 @@ class CDP:
     def clear_cookies(self):
         self.send('Network.clearBrowserCookies')
 
-    def get_received_by_id(self, id: int, timeout=10):
-        start_idx = 0
-        end_time = time.time() + timeout
-        while time.time() < end_time:
-            try:
-                r = self.received[start_idx]
-                if r['id'] == id: return r
-                else: start_idx += 1
-            except:
-                time.sleep(0.1)
-                continue
-        else:
+    def get_received_by_id(self, id: int, timeout=10) -> dict:
+        with self._lock:
+            if id not in self._replies:
+                raise KeyError(f'{id = } evicted or already consumed')
+            reply = self._replies[id][1]
+        try:
+            return reply.result(timeout)
+        except FutureTimeoutError:
             raise ValueError(f'{id = } not found')
-
-    def check_loading_finished(self, request_id: str, blocking: bool = False, timeout: float = 10):
+        finally:
+            with self._lock:
+                if reply.done() and self._replies.pop(id, None):
+                    self._used_id.discard(id)
+                    self._counters['consumed_replies'] += 1
+
+    def check_loading_finished(self, request_id: str, blocking: bool = False, timeout: float = 10, session_id: str = None):
+        request = self._track_request(request_id, session_id)
         if blocking:
-            start_idx = 0
-            end_time = time.time() + timeout
-            while time.time() < end_time:
-                try:
-                    r = self.received[start_idx]
-                    if r['method'] == 'Network.loadingFinished':
-                        if r['params']['requestId'] == request_id:
-                            return True
-                    start_idx += 1
-                except:
-                    time.sleep(0.1)
-                    continue
-            else:
-                return False
-        else:
-            for r in self.received:
-                if r['method'] == 'Network.loadingFinished':
-                    if r['params']['requestId'] == request_id:
-                        return True
-            else:
-                return False
-
-    def add_listener(self, callback, name: str = None, cdp_method: str = None, request_id: str = None, resource_type: str = None, url_exact: str = None, url_contain: str = None, url_regex: str = None, status_code: int = None):
-
-        def listener(response: dict):
-            check = []
-            try:
-                if cdp_method: check.append(response['method'] == cdp_method)
-                if request_id: check.append(response['params']['requestId'] == request_id)
-                if resource_type: check.append(response['params']['type'] == resource_type)
-                if status_code: check.append(response['params']['response']['status'] == status_code)
-                url = response['params']['response']['url'] if 'response' in response['params'] else response['params']['request']['url'] if 'request' in response['params'] else ''
-                if url_exact: check.append(url == url_exact)
-                if url_contain: check.append(url_contain in url)
-                if url_regex: check.append(re.search(url_regex, url))
-            except:
-                return
-            if all(check):
-                self._logger.debug(f'Run listener callback: {name}')
-                job = threading.Thread(target=callback, args=(response, ))
-                self._listeners[name]['jobs'].append(job)
-                job.start()
+            request.done.wait(timeout)
+        return request.finished
+
+    def get_request(self, request_id: str, session_id: str = None) -> NetworkRequest:
+        with self._lock:
+            return self._requests.get((session_id, request_id))
+
+    def wait_request(self, request_id: str, timeout: float = 10, session_id: str = None) -> NetworkRequest:
+        request = self._track_request(request_id, session_id)
+        request.done.wait(timeout)
+        return request
+
+    def network_requests(self, url_contain: str = None, url_regex: str = None, resource_type: str = None, status_code: int = None, done: bool = None, session_id: str = None, all_sessions: bool = False) -> list[NetworkRequest]:
+        url_regex = re.compile(url_regex) if url_regex else None
+        with self._lock:
+            requests = tuple(self._requests.values())
+        return [
+            request for request in requests
+            if (all_sessions or request.session_id == session_id)
+            and (url_contain is None or url_contain in request.url)
+            and (url_regex is None or url_regex.search(request.url))
+            and (resource_type is None or request.resource_type == resource_type)
+            and (status_code is None or request.status == status_code)
+            and (done is None or request.done.is_set() == done)
+        ]
+
+    def network_stats(self, group_by: str = 'site', patterns: list[str] = None, **filters) -> dict[str, dict]:
+        return NetworkRequest.aggregate(self.network_requests(**filters), group_by, patterns)
 
+    @property
+    def retention_stats(self) -> dict:
+        with self._lock:
+            return {
+                'retained_messages': len(self.received),
+                'retained_replies': len(self._replies),
+                'tracked_requests': len(self._tracked),
+                'network_records': len(self._requests),
+                'evicted_messages': self._counters['evicted_messages'],
+                'evicted_replies': self._counters['evicted_replies'],
+                'evicted_requests': self._counters['evicted_requests'],
+                'evicted_records': self._counters['evicted_records'],
+                'consumed_replies': self._counters['consumed_replies'],
+                'dropped_events': self._counters['dropped_events'],
+                'overflow_callbacks': self._counters['overflow_callbacks'],
+                'callback_backlog': self._callback_queue.qsize(),
+            }
+
+    def _track_request(self, request_id: str, session_id: str = None) -> NetworkRequest:
+        with self._lock:
+            request = self._tracked.get((session_id, request_id))
+            if request is None:
+                request = self._requests.get((session_id, request_id))
+                if request is None:
+                    request = self._requests[(session_id, request_id)] = NetworkRequest(session_id, request_id)
+                self._tracked[(session_id, request_id)] = request
+            return request
+
+    def add_listener(self, callback, name: str = None, cdp_method: str = None, request_id: str = None, resource_type: str = None, url_exact: str = None, url_contain: str = None, url_regex: str = None, status_code: int = None, session_id: str = None):
         name = name or str(uuid.uuid4())
-        self._listeners[name] = {'fn': listener, 'jobs': []}
+        listener = Listener(callback, name, cdp_method, request_id, resource_type, url_exact, url_contain, url_regex, status_code, session_id)
+        with self._lock:
+            self._listeners[name] = listener
+            self._dispatch_table[cdp_method][name] = listener
         self._logger.debug(f'Add network listener: {name}')
         return name
 
     def remove_listener(self, name: str, timeout: float = 10):
-        if name in self._listeners:
-            for job in self._listeners[name]['jobs']:
-                job.join(timeout)
-            self._listeners.pop(name)
+        with self._lock:
+            listener = self._listeners.pop(name, None)
+            if listener:
+                self._dispatch_table[listener.cdp_method].pop(name, None)
+        if listener:
+            listener.join(timeout)
             self._logger.debug(f'Remove network listener: {name}')
         else:
             self._logger.warning(f'Network listener not found: {name}')
 
+    def _dispatch(self, data: dict) -> bool:
+        if data['method'] is None: return False
+        with self._lock:
+            listeners = (*self._dispatch_table[data['method']].values(), *self._dispatch_table[None].values())
+        matched = False
+        for listener in listeners:
+            if listener.match(data):
+                matched = True
+                self._logger.debug(f'Run listener callback: {listener.name}')
+                with listener._idle:
+                    listener._pending += 1
+                self._callback_queue.put_nowait((listener, data))
+                if self.callback_queue_size and self._callback_queue.qsize() > self.callback_queue_size:
+                    with self._lock:
+                        self._counters['overflow_callbacks'] += 1
+        return matched
+
+    def _run_callbacks(self):
+        while True:
+            try:
+                listener, data = self._callback_queue.get()
+            except queue.ShutDown:
+                return
+            listener.run(data)
+
     def _recv(self):
         while self._running:
             try:
+                message = self.websocket.recv()
                 data = defaultdict(lambda: None)
-                data.update(json.loads(self.websocket.recv()))
-                self.received.append(data)
-                for listener in self._listeners.values():
-                    listener['fn'](data)
+                data.update(json.loads(message))
+                if self.recorder: self.recorder.record(data, message)
+                if data['method'] and data['method'].startswith('Network.') and 'requestId' in (data['params'] or {}):
+                    with self._lock:
+                        tracked = (data['sessionId'], data['params']['requestId']) in self._tracked
+                else:
+                    tracked = False
+                matched = self._dispatch(data)
+                if matched and (data['params'] or {}).get('requestId'): self._track_request(data['params']['requestId'], data['sessionId'])
+                self._index(data, matched or tracked)
+                self._evict()
             except:
                 if self._running:
                     continue
                 else:
                     return
 
+    def _index(self, data: dict, retain: bool = False):
+        with self._lock:
+            if data['id'] is not None:
+                reply = self._replies.get(data['id'])
+                if reply is None:
+                    self._counters['dropped_events'] += 1
+                elif not reply[1].done():
+                    reply[1].set_result(data)
+                return
+            if retain or self.retain_unmatched:
+                self.received.append(data)
+                self._received_times.append(time.time())
+            else:
+                self._counters['dropped_events'] += 1
+            if not (data['method'] and data['method'].startswith('Network.')): return
+            request_id = (data['params'] or {}).get('requestId')
+            if request_id is None: return
+            request = self._tracked.get((data['sessionId'], request_id)) or self._requests.get((data['sessionId'], request_id))
+            if request is None:
+                request = self._requests[(data['sessionId'], request_id)] = NetworkRequest(data['sessionId'], request_id)
+            try:
+                request.update(data['method'], data['params'])
+            except (KeyError, TypeError, AttributeError) as E:
+                self._logger.debug(f'Update network request failed: {type(E)}:{E.args}: {request_id}')
+
+    def _evict(self):
+        expire_time = time.time() - self.max_received_age if self.max_received_age else None
+        with self._lock:
+            while self.received and ((self.max_received and len(self.received) > self.max_received) or (expire_time and self._received_times[0] < expire_time)):
+                self.received.popleft()
+                self._received_times.popleft()
+                self._counters['evicted_messages'] += 1
+            while self._replies and ((self.max_received and len(self._replies) > self.max_received) or (expire_time and next(iter(self._replies.values()))[0] < expire_time)):
+                id, _ = self._replies.popitem(last=False)
+                self._used_id.discard(id)
+                self._counters['evicted_replies'] += 1
+            while self._tracked and ((self.max_received and len(self._tracked) > self.max_received) or (expire_time and next(iter(self._tracked.values())).time < expire_time)):
+                self._tracked.popitem(last=False)
+                self._counters['evicted_requests'] += 1
+            while self._requests and ((self.max_received and len(self._requests) > self.max_received) or (expire_time and next(iter(self._requests.values())).time < expire_time)):
+                self._requests.popitem(last=False)
+                self._counters['evicted_records'] += 1
+
     def _generate_cdp_request_id(self):
         i = random.randint(0, 2**16 - 1)
         if i in self._used_id:
@@ -324,3 +924,58 @@ class CDP:
         while len(self._listeners) > 0:
             for listener in tuple(self._listeners.keys()):
                 self.remove_listener(listener)
+        self._callback_queue.shutdown()
+        if self.recorder: self.recorder.close()
+
+
+class CDPSession(CDP):
+    _logger = logging.getLogger('CDPSession')
+
+    def __init__(self, cdp: CDP, session_id: str, target_id: str = None):
+        self.cdp = cdp
+        self.session_id = session_id
+        self.target_id = target_id
+        self._listener_names = set()
+
+    def __repr__(self):
+        return f'<CDP session: {self.session_id}>'
+
+    @property
+    def retention_stats(self) -> dict:
+        return self.cdp.retention_stats
+
+    def send(self, method: str, **params):
+        return self.cdp._send(method, params, self.session_id)
+
+    def get_received_by_id(self, id: int, timeout=10):
+        return self.cdp.get_received_by_id(id, timeout)
+
+    def check_loading_finished(self, request_id: str, blocking: bool = False, timeout: float = 10):
+        return self.cdp.check_loading_finished(request_id, blocking, timeout, session_id=self.session_id)
+
+    def get_request(self, request_id: str) -> NetworkRequest:
+        return self.cdp.get_request(request_id, self.session_id)
+
+    def wait_request(self, request_id: str, timeout: float = 10) -> NetworkRequest:
+        return self.cdp.wait_request(request_id, timeout, self.session_id)
+
+    def network_requests(self, **filters) -> list[NetworkRequest]:
+        return self.cdp.network_requests(session_id=self.session_id, **filters)
+
+    def add_listener(self, callback, name: str = None, **filters):
+        name = self.cdp.add_listener(callback, name, session_id=self.session_id, **filters)
+        self._listener_names.add(name)
+        return name
+
+    def remove_listener(self, name: str, timeout: float = 10):
+        self._listener_names.discard(name)
+        self.cdp.remove_listener(name, timeout)
+
+    def stop(self):
+        for name in tuple(self._listener_names):
+            self.remove_listener(name)
+        if self.target_id:
+            try:
+                self.cdp.get_received_by_id(self.cdp.send('Target.closeTarget', targetId=self.target_id), timeout=5)
+            except Exception as E:
+                self._logger.warning(f'Close target failed: {type(E)}:{E.args}: {self.target_id}')